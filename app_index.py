@@ -0,0 +1,601 @@
+import os
+import re
+import sys
+import json
+import time
+import shlex
+import random
+import shutil
+import argparse
+import threading
+import subprocess
+import collections
+import numpy as np
+
+DEFAULT_PATH = "app_index.json"
+INDEX_VERSION = 1
+# Spoken names that are not the application's own, each tried in order
+ALIASES = {
+    "vs code": ["visual studio code", "code"],
+    "vscode": ["visual studio code", "code"],
+    "chrome": ["google chrome", "chromium"],
+    "terminal": ["terminal", "gnome terminal", "konsole", "xfce4 terminal", "xterm", "command prompt"],
+    "command prompt": ["command prompt", "cmd"],
+    "file manager": ["files", "nautilus", "dolphin", "thunar", "nemo", "file explorer", "finder"],
+    "files": ["files", "nautilus", "dolphin", "thunar", "nemo", "file explorer", "finder"],
+    "calculator": ["calculator", "gnome calculator", "kcalc", "galculator", "calc"],
+    "text editor": ["text editor", "gedit", "kate", "mousepad", "notepad", "textedit"],
+    "notepad": ["notepad", "text editor", "gedit"],
+    "word": ["libreoffice writer", "microsoft word", "word"],
+    "excel": ["libreoffice calc", "microsoft excel", "excel"],
+    "settings": ["settings", "system settings", "gnome control center", "system preferences"],
+}
+# Words around the name in "open the calculator app"
+LEADING_FILLER = {"the", "my", "up", "a"}
+TRAILING_FILLER = {"app", "application", "program", "please", "for", "me"}
+# Trigram similarity (Dice) a fuzzy match needs
+FUZZY_THRESHOLD = 0.6
+# Sound-alike keys shorter than this match too many names
+MIN_SOUND_KEY = 3
+# Never started by voice, however closely a phrase matches them
+NEVER_LAUNCH = {"shutdown", "reboot", "poweroff", "halt", "rm"}
+# Programs that start something else; their name says nothing about the app
+LAUNCHERS = {"env", "sh", "bash", "flatpak", "snap", "gtk-launch", "xdg-open", "java", "python",
+             "python3", "wine", "steam"}
+# Desktop Entry field codes (%f, %U, ...) are for files the app is opened with
+_FIELD_CODE = re.compile(r"%[fFuUdDnNickvm]")
+_NON_WORD = re.compile(r"[^a-z0-9]+")
+
+class App:
+    __slots__ = ("name", "names", "command", "source", "id", "terminal", "hidden")
+
+    def __init__(self, name, names, command, source, id=None, terminal=False, hidden=False):
+        self.name = name
+        self.names = names
+        self.command = command
+        self.source = source
+        # Desktop file id or executable name; the first entry with an id wins
+        self.id = id or name
+        self.terminal = terminal
+        # A hidden desktop entry only masks same-id entries in later directories
+        self.hidden = hidden
+
+    def __repr__(self):
+        return f"App({self.name!r}, {self.source})"
+
+    def to_json(self):
+        entry = {"name": self.name, "names": self.names, "command": self.command, "source": self.source}
+        if self.id != self.name:
+            entry["id"] = self.id
+        if self.terminal:
+            entry["terminal"] = True
+        if self.hidden:
+            entry["hidden"] = True
+        return entry
+
+    @classmethod
+    def from_json(cls, entry):
+        return cls(entry["name"], entry["names"], entry["command"], entry["source"], entry.get("id"),
+                   entry.get("terminal", False), entry.get("hidden", False))
+
+def normalize_name(text):
+    return " ".join(_NON_WORD.sub(" ", text.lower()).split())
+
+def clean_query(text):
+    words = normalize_name(text).split()
+    while len(words) > 1 and words[0] in LEADING_FILLER:
+        words.pop(0)
+    while len(words) > 1 and words[-1] in TRAILING_FILLER:
+        words.pop()
+    return " ".join(words)
+
+# Consonants that sound alike share a digit, as in Soundex; vowels, h, w and y
+# carry no code
+_SOUND_CODES = {}
+for _digit, _letters in enumerate(("bfpv", "cgjkqsxz", "dt", "l", "mn", "r"), 1):
+    for _letter in _letters:
+        _SOUND_CODES[_letter] = str(_digit)
+
+def sound_key(compact):
+    # Soundex without the length cap and without keeping the first letter:
+    # "chrome" / "crome", "okular" / "ocular" and "kalkulator" / "calculator"
+    # share a key. Digits are kept as they are.
+    key = []
+    last = None
+    for ch in compact:
+        code = ch if ch.isdigit() else _SOUND_CODES.get(ch)
+        if code is not None and code != last:
+            key.append(code)
+        last = code
+    return "".join(key)
+
+def _trigrams(compact):
+    padded = f"#{compact}#"
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+class AppMatcher:
+    # Resolves a spoken name against a fixed list of apps (earlier apps win
+    # ties): exact and space-free names through dicts, then trigram Dice
+    # similarity, then a sound-alike key. Trigram postings are numpy arrays,
+    # so scoring every name is one bincount over the query's postings.
+    # Programs on PATH only match exactly: "open settings" must not run
+    # gsettings, nor "open a file" run file.
+    def __init__(self, apps, threshold=FUZZY_THRESHOLD):
+        self.apps = apps
+        self.threshold = threshold
+        self.exact = {}
+        self.compact = {}
+        self.sounds = collections.defaultdict(list)
+        # key (one per distinct space-free name) -> index into apps
+        keys = []
+        sizes = []
+        postings = collections.defaultdict(list)
+        for index, app in enumerate(apps):
+            for name in app.names:
+                name = normalize_name(name)
+                if not name:
+                    continue
+                compact = name.replace(" ", "")
+                self.exact.setdefault(name, index)
+                if compact in self.compact:
+                    continue
+                self.compact[compact] = index
+                if app.source == "path":
+                    continue
+                key = len(keys)
+                grams = _trigrams(compact)
+                keys.append(index)
+                sizes.append(len(grams))
+                for gram in grams:
+                    postings[gram].append(key)
+                sound = sound_key(compact)
+                if len(sound) >= MIN_SOUND_KEY:
+                    self.sounds[sound].append(key)
+        self.keys = keys
+        self.sizes = np.array(sizes, dtype=np.float32)
+        self.postings = {gram: np.array(ids, dtype=np.int32) for gram, ids in postings.items()}
+
+    def __len__(self):
+        return len(self.apps)
+
+    def exact_match(self, query):
+        index = self.exact.get(query)
+        if index is None:
+            index = self.compact.get(query.replace(" ", ""))
+        return None if index is None else self.apps[index]
+
+    def match(self, query):
+        # query is already cleaned (see clean_query)
+        app = self.exact_match(query)
+        if app is not None or not query or not self.keys:
+            return app
+        compact = query.replace(" ", "")
+        grams = _trigrams(compact)
+        hits = [self.postings[gram] for gram in grams if gram in self.postings]
+        if hits:
+            shared = np.bincount(np.concatenate(hits), minlength=len(self.keys))
+        else:
+            shared = np.zeros(len(self.keys), dtype=np.int64)
+        scores = 2.0 * shared / (len(grams) + self.sizes)
+        # argmax takes the first of equal scores, i.e. the earlier app
+        best = int(np.argmax(scores))
+        if scores[best] >= self.threshold:
+            return self.apps[self.keys[best]]
+        # Misheard spellings: among names that sound the same, the closest
+        # one, as long as the spelling is not entirely different
+        candidates = self.sounds.get(sound_key(compact))
+        if not candidates:
+            return None
+        best = candidates[int(np.argmax(scores[candidates]))]
+        if scores[best] < self.threshold / 2:
+            return None
+        return self.apps[self.keys[best]]
+
+def parse_desktop_entry(path):
+    # The [Desktop Entry] group of a .desktop file, unlocalized keys only
+    fields = {}
+    in_entry = False
+    with open(path, 'r', encoding='utf-8', errors='replace') as f:
+        for line in f:
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            if line.startswith("["):
+                if in_entry:
+                    break
+                in_entry = line == "[Desktop Entry]"
+                continue
+            if in_entry:
+                key, sep, value = line.partition("=")
+                if sep:
+                    fields.setdefault(key.strip(), value.strip())
+    return fields
+
+def desktop_app(path, desktop_id):
+    fields = parse_desktop_entry(path)
+    if fields.get("Type", "Application") != "Application" or not fields.get("Name"):
+        return None
+    hidden = fields.get("Hidden") == "true" or fields.get("NoDisplay") == "true"
+    command = []
+    if not hidden:
+        try:
+            command = [arg for arg in shlex.split(_FIELD_CODE.sub("", fields.get("Exec", "")))
+                       if arg]
+        except ValueError:
+            return None
+        if not command:
+            return None
+    names = [fields["Name"]]
+    if fields.get("GenericName"):
+        names.append(fields["GenericName"])
+    if command and os.path.basename(command[0]) not in LAUNCHERS:
+        names.append(os.path.basename(command[0]))
+    return App(fields["Name"], names, [arg.replace("%%", "%") for arg in command], "desktop",
+               desktop_id, fields.get("Terminal") == "true", hidden)
+
+def _executable_suffixes():
+    if os.name != "nt":
+        return None
+    return tuple(ext.lower() for ext in os.environ.get("PATHEXT", ".EXE;.BAT;.CMD").split(";") if ext)
+
+def scan_directory(kind, directory, prefix=""):
+    # (apps, subdirectories to track) for one directory of one kind
+    apps, subdirs = [], []
+    suffixes = _executable_suffixes() if kind == "path" else None
+    with os.scandir(directory) as entries:
+        for entry in sorted(entries, key=lambda e: e.name):
+            try:
+                if kind == "desktop":
+                    if entry.is_dir():
+                        subdirs.append(entry.path)
+                    elif entry.name.endswith(".desktop"):
+                        app = desktop_app(entry.path, prefix + entry.name)
+                        if app is not None:
+                            apps.append(app)
+                elif kind == "bundle":
+                    if entry.name.endswith(".app"):
+                        name = entry.name[:-len(".app")]
+                        apps.append(App(name, [name], ["open", "-a", entry.path], "bundle"))
+                    elif entry.is_dir():
+                        subdirs.append(entry.path)
+                elif kind == "shortcut":
+                    if entry.is_dir():
+                        subdirs.append(entry.path)
+                    elif entry.name.lower().endswith(".lnk"):
+                        name = entry.name[:-len(".lnk")]
+                        apps.append(App(name, [name], [entry.path], "shortcut"))
+                elif kind == "path":
+                    name = entry.name
+                    if suffixes is not None:
+                        stem, ext = os.path.splitext(name)
+                        if ext.lower() not in suffixes:
+                            continue
+                        name = stem
+                    if entry.is_file() and os.access(entry.path, os.X_OK):
+                        apps.append(App(name, [name], [entry.path], "path", name))
+            except (OSError, UnicodeDecodeError):
+                # Broken symlinks and unreadable entries are skipped
+                continue
+    return apps, subdirs
+
+def default_roots():
+    # (kind, directory) in priority order: user desktop entries shadow system
+    # ones, and PATH comes last so "firefox" opens the menu entry
+    home = os.path.expanduser("~")
+    data_home = os.environ.get("XDG_DATA_HOME") or os.path.join(home, ".local", "share")
+    data_dirs = (os.environ.get("XDG_DATA_DIRS") or "/usr/local/share:/usr/share").split(os.pathsep)
+    data_dirs += [os.path.join(data_home, "flatpak", "exports", "share"),
+                  "/var/lib/flatpak/exports/share", "/var/lib/snapd/desktop"]
+    roots = [("desktop", os.path.join(d, "applications")) for d in [data_home] + data_dirs if d]
+    if sys.platform == "darwin":
+        roots += [("bundle", d) for d in (os.path.join(home, "Applications"), "/Applications",
+                                          "/System/Applications")]
+    if os.name == "nt":
+        for base in (os.environ.get("APPDATA"), os.environ.get("ProgramData")):
+            if base:
+                roots.append(("shortcut", os.path.join(base, "Microsoft", "Windows", "Start Menu", "Programs")))
+    roots += [("path", d) for d in os.environ.get("PATH", "").split(os.pathsep) if d]
+    seen = set()
+    return [(kind, d) for kind, d in roots if not (d in seen or seen.add(d))]
+
+class AppIndex:
+    # Installed applications for "open <app>". Every scanned directory is
+    # stored in a JSON file with its mtime and entries, so a refresh only
+    # stats the directories and rescans the ones that changed (an app was
+    # installed or removed). The saved index is loaded and refreshed on a
+    # background thread (the first resolve() waits up to startup_wait seconds
+    # for it) and checked again on a background thread at most every
+    # refresh_interval seconds, so an app installed since is found by a later
+    # request. A request never waits for a rescan.
+    def __init__(self, path=DEFAULT_PATH, aliases=None, roots=None, refresh_interval=60.0,
+                 background=True, startup_wait=2.0):
+        self.path = path
+        self.roots = roots
+        self.refresh_interval = refresh_interval
+        self.startup_wait = startup_wait
+        self.lock = threading.Lock()
+        # directory -> {"kind", "mtime", "apps", "subdirs"}
+        self.dirs = {}
+        # Aliases added with add_alias(), saved with the index
+        self.user_aliases = {}
+        self.aliases = dict(ALIASES)
+        self.aliases.update(aliases or {})
+        self.matcher = AppMatcher([])
+        self.checked = 0.0
+        # At most one background check at a time; a lock of its own because
+        # refresh() holds self.lock for the whole rescan
+        self.checking = False
+        self.check_lock = threading.Lock()
+        self.stats = collections.Counter()
+        self.ready = threading.Event()
+        if background:
+            self._check_in_background(self._start)
+        else:
+            self._start()
+            self.ready.set()
+
+    def _start(self):
+        self.load()
+        self.refresh(rebuild=True)
+
+    def load(self):
+        if not self.path or not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                saved = json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"Could not read app index {self.path}: {e}", file=sys.stderr)
+            return
+        if saved.get("version") != INDEX_VERSION:
+            return
+        for directory, info in saved.get("dirs", {}).items():
+            info["apps"] = [App.from_json(entry) for entry in info["apps"]]
+            self.dirs[directory] = info
+        self.user_aliases = saved.get("aliases", {})
+        self.aliases.update(self.user_aliases)
+
+    def save(self):
+        if not self.path:
+            return
+        data = {"version": INDEX_VERSION, "aliases": self.user_aliases, "dirs": {}}
+        for directory, info in self.dirs.items():
+            data["dirs"][directory] = dict(info, apps=[app.to_json() for app in info["apps"]])
+        tmp = self.path + ".tmp"
+        try:
+            with open(tmp, 'w', encoding='utf-8') as f:
+                json.dump(data, f, separators=(",", ":"))
+            os.replace(tmp, self.path)
+        except OSError as e:
+            print(f"Could not save app index {self.path}: {e}", file=sys.stderr)
+
+    def refresh(self, rebuild=False):
+        # Rescans directories whose mtime changed; True if anything did
+        with self.lock:
+            dirs = {}
+            changed = False
+            for kind, root in (self.roots if self.roots is not None else default_roots()):
+                changed |= self._visit(kind, root, "", dirs)
+            changed |= set(dirs) != set(self.dirs)
+            self.dirs = dirs
+            self.checked = time.monotonic()
+            if changed or rebuild:
+                self.matcher = AppMatcher(self._collect())
+            if changed:
+                self.save()
+        return changed
+
+    def _visit(self, kind, directory, prefix, dirs):
+        try:
+            mtime = os.stat(directory).st_mtime_ns
+        except OSError:
+            return False
+        info = self.dirs.get(directory)
+        changed = False
+        if info is None or info["mtime"] != mtime or info["kind"] != kind:
+            try:
+                apps, subdirs = scan_directory(kind, directory, prefix)
+            except OSError:
+                return False
+            info = {"kind": kind, "mtime": mtime, "apps": apps, "subdirs": subdirs}
+            self.stats["scanned"] += 1
+            changed = True
+        else:
+            self.stats["reused"] += 1
+        dirs[directory] = info
+        for subdir in info["subdirs"]:
+            # Desktop file ids of subdirectories are prefixed with the path
+            sub_prefix = prefix + os.path.basename(subdir) + "-" if kind == "desktop" else ""
+            changed |= self._visit(kind, subdir, sub_prefix, dirs)
+        return changed
+
+    def _collect(self):
+        # Apps in priority order, the first of each id only
+        apps = []
+        seen = set()
+        for info in self.dirs.values():
+            for app in info["apps"]:
+                key = (app.source == "path", app.id)
+                if key in seen:
+                    continue
+                seen.add(key)
+                if not app.hidden and not _never_launch(app):
+                    apps.append(app)
+        # Desktop entries and bundles before PATH executables
+        apps.sort(key=lambda app: app.source == "path")
+        return apps
+
+    def _check_in_background(self, work=None):
+        with self.check_lock:
+            if self.checking:
+                return
+            self.checking = True
+
+        def check():
+            try:
+                (work or self.refresh)()
+            except Exception as e:
+                print(f"App index refresh failed: {e}", file=sys.stderr)
+            finally:
+                with self.check_lock:
+                    self.checking = False
+                self.ready.set()
+
+        threading.Thread(target=check, name="app-index", daemon=True).start()
+
+    def add_alias(self, spoken, name):
+        spoken = clean_query(spoken)
+        self.user_aliases[spoken] = [normalize_name(name)]
+        self.aliases[spoken] = self.user_aliases[spoken]
+        with self.lock:
+            self.save()
+
+    def _resolve(self, query, spoken):
+        matcher = self.matcher
+        for target in self.aliases.get(query, ()):
+            app = matcher.exact_match(target)
+            if app is not None:
+                return app
+        app = matcher.match(query)
+        if app is not None and app.source == "path" and normalize_name(spoken) != query:
+            # Filler is only dropped around menu entries: "open a file" is
+            # not a request to run file
+            return None
+        return app
+
+    def resolve(self, spoken):
+        # The App a spoken name refers to, or None
+        query = clean_query(spoken)
+        if not query:
+            return None
+        self.ready.wait(self.startup_wait)
+        app = self._resolve(query, spoken)
+        if time.monotonic() - self.checked > self.refresh_interval:
+            self._check_in_background()
+        return app
+
+    def __len__(self):
+        return len(self.matcher)
+
+def _never_launch(app):
+    if not app.command:
+        return False
+    program = os.path.basename(app.command[0]).lower()
+    if os.name == "nt":
+        program = os.path.splitext(program)[0]
+    return program in NEVER_LAUNCH
+
+def launch(app):
+    # Starts the app detached from the assistant and returns without waiting
+    # for it; raises OSError if it cannot be started
+    if app.source == "shortcut":
+        os.startfile(app.command[0])
+        return None
+    command = list(app.command)
+    if app.terminal:
+        terminal = os.environ.get("TERMINAL") or shutil.which("x-terminal-emulator") or shutil.which("xterm")
+        if not terminal:
+            raise OSError(f"{app.name} needs a terminal emulator")
+        command = [terminal, "-e"] + command
+    if os.name == "nt":
+        detach = {"creationflags": subprocess.DETACHED_PROCESS | subprocess.CREATE_NEW_PROCESS_GROUP}
+    else:
+        detach = {"start_new_session": True}
+    process = subprocess.Popen(command, stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL,
+                               stderr=subprocess.DEVNULL, close_fds=True, **detach)
+    # Collected when it exits, so it does not linger as a zombie
+    threading.Thread(target=process.wait, name="app-reaper", daemon=True).start()
+    return process
+
+SYLLABLES = ["ka", "lo", "mi", "ster", "vo", "tra", "zen", "pix", "nor", "del", "quo", "fen", "bri",
+             "sol", "ux", "ra", "chi", "mon", "gra", "tel", "vi", "dex", "or", "pha"]
+
+def _typo(word, rng):
+    i = rng.randrange(len(word))
+    kind = rng.randrange(3)
+    if kind == 0:
+        return word[:i] + word[i + 1:]
+    if kind == 1:
+        return word[:i] + rng.choice("aeiou") + word[i:]
+    return word[:i] + rng.choice("aeiourst") + word[i + 1:]
+
+def benchmark(entries=5000, queries=2000, seed=7):
+    # Resolution latency and accuracy on a synthetic index of `entries` apps,
+    # for exact names, names run together, one-letter typos and sound-alikes
+    rng = random.Random(seed)
+    names = set()
+    while len(names) < entries:
+        words = ["".join(rng.choice(SYLLABLES) for _ in range(rng.randint(2, 3)))
+                 for _ in range(rng.randint(1, 3))]
+        names.add(" ".join(words))
+    names = sorted(names)
+    apps = [App(name.title(), [name], [name.replace(" ", "-")], "desktop" if i % 3 else "path")
+            for i, name in enumerate(names)]
+    matcher = AppMatcher(apps)
+    # PATH programs are found by their exact name only
+    menu = [app for app in apps if app.source != "path"]
+    variants = {
+        "exact": lambda name: name,
+        "joined": lambda name: name.replace(" ", ""),
+        "typo": lambda name: _typo(name, rng) if len(name) > 5 else name,
+        "sound": lambda name: name.replace("c", "k").replace("ph", "f").replace("x", "ks"),
+    }
+    results = {}
+    for label, variant in variants.items():
+        sample = [rng.choice(apps if label in ("exact", "joined") else menu) for _ in range(queries)]
+        spoken = [clean_query(variant(app.names[0])) for app in sample]
+        hits = 0
+        timings = []
+        for app, query in zip(sample, spoken):
+            started = time.perf_counter()
+            found = matcher.match(query)
+            timings.append(time.perf_counter() - started)
+            hits += found is app
+        timings.sort()
+        results[label] = {"hit_rate": hits / len(sample),
+                          "p50_us": timings[len(timings) // 2] * 1e6,
+                          "p99_us": timings[int(len(timings) * 0.99)] * 1e6}
+    return results
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Find installed applications by their spoken name")
+    parser.add_argument("--index", default=DEFAULT_PATH, help="where the index is kept")
+    sub = parser.add_subparsers(dest="command", required=True)
+    resolve = sub.add_parser("resolve", help="show what each name would open")
+    resolve.add_argument("names", nargs="+")
+    sub.add_parser("refresh", help="update the index and report what was rescanned")
+    alias = sub.add_parser("alias", help="make a spoken name open an application")
+    alias.add_argument("spoken")
+    alias.add_argument("name")
+    bench = sub.add_parser("bench", help="resolution latency and accuracy on a synthetic index")
+    bench.add_argument("--entries", type=int, default=5000)
+    bench.add_argument("--queries", type=int, default=2000)
+    args = parser.parse_args(argv)
+
+    if args.command == "bench":
+        print(f"{args.entries} apps, {args.queries} queries per kind")
+        for label, r in benchmark(args.entries, args.queries).items():
+            print(f"{label:>7}: hit rate {r['hit_rate']:.1%}, p50 {r['p50_us']:.0f} us, "
+                  f"p99 {r['p99_us']:.0f} us")
+        return
+    started = time.perf_counter()
+    index = AppIndex(args.index, background=False)
+    elapsed = time.perf_counter() - started
+    if args.command == "refresh":
+        print(f"{len(index)} apps from {len(index.dirs)} directories in {elapsed * 1000:.0f} ms "
+              f"({index.stats['scanned']} scanned, {index.stats['reused']} unchanged)")
+    elif args.command == "alias":
+        index.add_alias(args.spoken, args.name)
+        print(f"\"{clean_query(args.spoken)}\" now opens {index.resolve(args.spoken) or args.name}")
+    else:
+        for name in args.names:
+            started = time.perf_counter()
+            app = index.resolve(name)
+            elapsed = (time.perf_counter() - started) * 1e6
+            if app is None:
+                print(f"{name}: not found ({elapsed:.0f} us)")
+            else:
+                print(f"{name}: {app.name} [{app.source}] {' '.join(app.command)} ({elapsed:.0f} us)")
+
+if __name__ == '__main__':
+    sys.exit(main())
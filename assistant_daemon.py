@@ -0,0 +1,222 @@
+import os
+import sys
+import json
+import stat
+import socket
+import argparse
+import tempfile
+import threading
+import subprocess
+
+MAIN_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "main.py")
+
+def runtime_dir():
+    base = os.environ.get("XDG_RUNTIME_DIR")
+    if base:
+        os.makedirs(base, mode=0o700, exist_ok=True)
+        return base
+    uid = os.getuid() if hasattr(os, "getuid") else os.environ.get("USERNAME", "user")
+    base = os.path.join(tempfile.gettempdir(), f"jarvis-{uid}")
+    os.makedirs(base, mode=0o700, exist_ok=True)
+    if hasattr(os, "getuid"):
+        # Anyone can create this name in /tmp first; a directory we do not
+        # own outright would let them take over the pidfile and the socket
+        info = os.lstat(base)
+        if stat.S_ISLNK(info.st_mode) or info.st_uid != os.getuid() or info.st_mode & 0o077:
+            raise PermissionError(f"Refusing to use {base}: it must be a directory owned by you "
+                                  f"with mode 0700")
+    return base
+
+def socket_path():
+    return os.path.join(runtime_dir(), "jarvis.sock")
+
+def pid_path():
+    return os.path.join(runtime_dir(), "jarvis.pid")
+
+class InstanceLock:
+    # Exclusive lock on the pidfile, held for the life of the daemon. The
+    # kernel drops it if the process dies, so a stale pidfile never blocks a
+    # new instance.
+    def __init__(self, path=None):
+        self.path = path or pid_path()
+        self.file = None
+
+    def acquire(self):
+        self.file = open(self.path, "a+")
+        try:
+            if sys.platform == "win32":
+                import msvcrt
+                self.file.seek(0)
+                msvcrt.locking(self.file.fileno(), msvcrt.LK_NBLCK, 1)
+            else:
+                import fcntl
+                fcntl.flock(self.file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            self.file.close()
+            self.file = None
+            return False
+        self.file.seek(0)
+        self.file.truncate()
+        self.file.write(str(os.getpid()))
+        self.file.flush()
+        return True
+
+    def release(self):
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+def _endpoint():
+    # Unix domain socket where available, otherwise a loopback TCP port whose
+    # number is kept next to the pidfile
+    if hasattr(socket, "AF_UNIX"):
+        return socket.AF_UNIX, socket_path()
+    port_file = os.path.join(runtime_dir(), "jarvis.port")
+    try:
+        with open(port_file) as f:
+            return socket.AF_INET, ("127.0.0.1", int(f.read().strip()))
+    except (OSError, ValueError):
+        return socket.AF_INET, None
+
+class DaemonServer:
+    # Accepts one JSON request per connection and answers with one JSON line.
+    # handler(message) runs on a per-connection thread and returns a dict.
+    def __init__(self, handler):
+        self.handler = handler
+        self.sock = None
+        self.thread = None
+        self.running = False
+
+    def start(self):
+        family, address = _endpoint()
+        self.sock = socket.socket(family, socket.SOCK_STREAM)
+        if family == getattr(socket, "AF_UNIX", None):
+            # Only reached while holding the instance lock, so any socket file is stale
+            if os.path.exists(address):
+                os.unlink(address)
+            # Created owner-only, so there is no moment another user can connect
+            umask = os.umask(0o177)
+            try:
+                self.sock.bind(address)
+            finally:
+                os.umask(umask)
+        else:
+            self.sock.bind(("127.0.0.1", 0))
+            with open(os.path.join(runtime_dir(), "jarvis.port"), "w") as f:
+                f.write(str(self.sock.getsockname()[1]))
+        self.sock.listen(8)
+        self.running = True
+        self.thread = threading.Thread(target=self._serve, name="daemon-server", daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.running = False
+        if self.sock is not None:
+            self.sock.close()
+            self.sock = None
+        if hasattr(socket, "AF_UNIX") and os.path.exists(socket_path()):
+            os.unlink(socket_path())
+
+    def _serve(self):
+        while self.running:
+            try:
+                conn, _ = self.sock.accept()
+            except OSError:
+                break
+            threading.Thread(target=self._handle, args=(conn,), daemon=True).start()
+
+    def _handle(self, conn):
+        with conn:
+            try:
+                message = json.loads(_read_line(conn))
+                reply = self.handler(message) or {"ok": True}
+            except Exception as e:
+                reply = {"ok": False, "error": str(e)}
+            conn.sendall((json.dumps(reply) + "\n").encode("utf-8"))
+
+def _read_line(conn):
+    data = b""
+    while not data.endswith(b"\n"):
+        chunk = conn.recv(4096)
+        if not chunk:
+            break
+        data += chunk
+    return data.decode("utf-8")
+
+def send(message, timeout=30.0):
+    # Raises ConnectionError when no daemon is listening
+    family, address = _endpoint()
+    if address is None:
+        raise ConnectionError("Jarvis is not running")
+    sock = socket.socket(family, socket.SOCK_STREAM)
+    sock.settimeout(timeout)
+    try:
+        sock.connect(address)
+    except OSError as e:
+        sock.close()
+        raise ConnectionError(f"Jarvis is not running ({e})")
+    with sock:
+        sock.sendall((json.dumps(message) + "\n").encode("utf-8"))
+        return json.loads(_read_line(sock) or "{}")
+
+def is_running():
+    # One connect() instead of walking the process table
+    try:
+        return send({"cmd": "ping"}, timeout=1.0).get("ok", False)
+    except (ConnectionError, OSError, ValueError):
+        return False
+
+def activate(launch=True, wait=20.0):
+    # Bring up the resident assistant, starting it once (in resident mode,
+    # so it stays up after its window is closed) if nothing is listening
+    try:
+        return send({"cmd": "activate"})
+    except ConnectionError:
+        if not launch:
+            raise
+    subprocess.Popen([sys.executable, MAIN_SCRIPT, "--resident"], start_new_session=True,
+                     stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    import time
+    deadline = time.monotonic() + wait
+    while time.monotonic() < deadline:
+        time.sleep(0.1)
+        if is_running():
+            return send({"cmd": "activate"})
+    raise ConnectionError("Jarvis did not start in time")
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Talk to the resident Jarvis assistant")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    sub.add_parser("status", help="report whether the assistant is running")
+    sub.add_parser("activate", help="show the assistant, starting it if needed")
+    sub.add_parser("hide", help="hide the window but keep the assistant resident")
+    sub.add_parser("quit", help="shut the assistant down")
+    command = sub.add_parser("command", help="run a command and print the reply")
+    command.add_argument("text", nargs="+")
+    command.add_argument("--speak", action="store_true", help="also speak the reply")
+    args = parser.parse_args(argv)
+
+    try:
+        if args.cmd == "status":
+            print("running" if is_running() else "not running")
+            return 0
+        if args.cmd == "activate":
+            reply = activate()
+        elif args.cmd == "command":
+            reply = send({"cmd": "command", "text": " ".join(args.text), "speak": args.speak})
+        else:
+            reply = send({"cmd": args.cmd})
+    except OSError as e:
+        # Not running, or an unsafe runtime directory
+        print(e, file=sys.stderr)
+        return 1
+    if not reply.get("ok", False):
+        print(reply.get("error", "failed"), file=sys.stderr)
+        return 1
+    if reply.get("response"):
+        print(reply["response"])
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,322 @@
+import weakref
+import threading
+import numpy as np
+
+SAMPLE_RATE = 16000
+FRAME_SAMPLES = 480  # 30 ms at 16 kHz
+SAMPLE_WIDTH = 2  # int16
+
+class RingBuffer:
+    # Preallocated int16 frames addressed by a monotonically increasing frame
+    # sequence number. One writer (the capture callback), any number of
+    # readers; readers get views into the buffer, not copies.
+    def __init__(self, capacity=1000, frame_samples=FRAME_SAMPLES):
+        self.capacity = capacity
+        self.frame_samples = frame_samples
+        self.frames = np.zeros((capacity, frame_samples), dtype=np.int16)
+        self.energy = np.full(capacity, -100.0, dtype=np.float32)
+        self.seq = 0  # sequence number of the next frame to be written
+        self.cond = threading.Condition()
+        self.closed = False
+        self.readers = weakref.WeakSet()
+
+    def write(self, samples):
+        slot = self.seq % self.capacity
+        frame = self.frames[slot]
+        frame[:len(samples)] = samples
+        frame[len(samples):] = 0
+        self.energy[slot] = frame_energy_db(frame)
+        with self.cond:
+            self.seq += 1
+            self.cond.notify_all()
+
+    def close(self):
+        with self.cond:
+            self.closed = True
+            self.cond.notify_all()
+
+    def oldest(self):
+        return max(0, self.seq - self.capacity)
+
+    def wait_for(self, seq, timeout=None):
+        # Block until frame `seq` has been written; False on timeout or close
+        with self.cond:
+            self.cond.wait_for(lambda: self.seq > seq or self.closed, timeout)
+            return self.seq > seq
+
+    def views(self, start, end):
+        # Frames [start, end) as at most two views (the range may wrap around)
+        start = max(start, self.oldest())
+        if end <= start:
+            return []
+        a = start % self.capacity
+        b = a + (end - start)
+        if b <= self.capacity:
+            return [self.frames[a:b]]
+        return [self.frames[a:], self.frames[:b - self.capacity]]
+
+    def frame(self, seq):
+        return self.frames[seq % self.capacity]
+
+    def frame_energy(self, seq):
+        return float(self.energy[seq % self.capacity])
+
+    def samples(self, start, end):
+        # Contiguous copy of [start, end), for consumers that need raw bytes
+        views = self.views(start, end)
+        if not views:
+            return np.zeros(0, dtype=np.int16)
+        if len(views) == 1:
+            return views[0].reshape(-1)
+        return np.concatenate([v.reshape(-1) for v in views])
+
+    def reader(self):
+        reader = RingReader(self)
+        self.readers.add(reader)
+        return reader
+
+    def backlog(self):
+        # Frames the slowest reader has not consumed yet
+        cursors = [r.cursor for r in list(self.readers)]
+        return self.seq - min(cursors) if cursors else 0
+
+class RingReader:
+    # Independent cursor over a RingBuffer. A reader that falls more than
+    # `capacity` frames behind skips ahead and counts what it lost.
+    def __init__(self, ring):
+        self.ring = ring
+        self.cursor = ring.seq
+        self.dropped = 0
+
+    def wait(self, timeout=None):
+        return self.ring.wait_for(self.cursor, timeout)
+
+    def read(self, timeout=None):
+        # Returns (first_seq, [views]) for every frame written since the last read
+        if self.cursor >= self.ring.seq and not self.wait(timeout):
+            return self.cursor, []
+        end = self.ring.seq
+        oldest = self.ring.oldest()
+        if self.cursor < oldest:
+            self.dropped += oldest - self.cursor
+            self.cursor = oldest
+        start = self.cursor
+        self.cursor = end
+        return start, self.ring.views(start, end)
+
+    def frames(self, timeout=None):
+        # Iterate (seq, frame view) until the ring is closed
+        while True:
+            start, views = self.read(timeout)
+            if not views and self.ring.closed:
+                break
+            seq = start
+            for view in views:
+                for frame in view:
+                    yield seq, frame
+                    seq += 1
+
+def frame_energy_db(frame):
+    # RMS level in dBFS
+    rms = np.sqrt(np.mean(np.square(frame, dtype=np.float64)))
+    return 20.0 * np.log10(max(rms, 1.0) / 32768.0)
+
+class NoiseFloorTracker:
+    # Follows the background level continuously: drops quickly when the room
+    # gets quieter, rises slowly so speech does not drag the floor up
+    def __init__(self, initial_db=-60.0, rise=0.005, fall=0.2):
+        self.floor = initial_db
+        self.rise = rise
+        self.fall = fall
+
+    def update(self, energy_db):
+        rate = self.fall if energy_db < self.floor else self.rise
+        self.floor += rate * (energy_db - self.floor)
+        return self.floor
+
+class VoiceActivityDetector:
+    # Frame-level energy VAD with hysteresis. update() returns
+    #   ("start", first_seq) when speech begins (first_seq includes pre-roll),
+    #   ("end", first_seq, end_seq) when it ends, otherwise None.
+    def __init__(self, threshold_db=10.0, start_frames=3, hangover_frames=20,
+                 preroll_frames=10, max_frames=500, noise=None):
+        self.threshold_db = threshold_db
+        self.start_frames = start_frames
+        self.hangover_frames = hangover_frames
+        self.preroll_frames = preroll_frames
+        self.max_frames = max_frames
+        self.noise = noise or NoiseFloorTracker()
+        self.in_speech = False
+        self.voiced_run = 0
+        self.silent_run = 0
+        self.speech_start = 0
+
+    def is_voiced(self, energy_db):
+        return energy_db > self.noise.floor + self.threshold_db
+
+    def update(self, seq, energy_db):
+        voiced = self.is_voiced(energy_db)
+        if not self.in_speech:
+            self.noise.update(energy_db)
+            self.voiced_run = self.voiced_run + 1 if voiced else 0
+            if self.voiced_run >= self.start_frames:
+                self.in_speech = True
+                self.silent_run = 0
+                self.speech_start = max(0, seq - self.voiced_run - self.preroll_frames + 1)
+                return ("start", self.speech_start)
+            return None
+        self.silent_run = 0 if voiced else self.silent_run + 1
+        if not voiced:
+            self.noise.update(energy_db)
+        length = seq + 1 - self.speech_start
+        if self.silent_run >= self.hangover_frames or length >= self.max_frames:
+            self.in_speech = False
+            self.voiced_run = 0
+            return ("end", self.speech_start, seq + 1)
+        return None
+
+class MicrophoneSource:
+    # One PyAudio input stream, opened once and kept open for the whole session
+    def __init__(self, device_index=None):
+        self.device_index = device_index
+        self.audio = None
+        self.stream = None
+
+    def start(self, ring):
+        import pyaudio
+        self.audio = pyaudio.PyAudio()
+
+        def callback(in_data, frame_count, time_info, status):
+            ring.write(np.frombuffer(in_data, dtype=np.int16))
+            return (None, pyaudio.paContinue)
+
+        self.stream = self.audio.open(format=pyaudio.paInt16, channels=1, rate=SAMPLE_RATE,
+                                      input=True, frames_per_buffer=ring.frame_samples,
+                                      input_device_index=self.device_index,
+                                      stream_callback=callback)
+        self.stream.start_stream()
+
+    def stop(self):
+        if self.stream is not None:
+            self.stream.stop_stream()
+            self.stream.close()
+            self.stream = None
+        if self.audio is not None:
+            self.audio.terminate()
+            self.audio = None
+
+class WavSource:
+    # Feeds a WAV file into the ring buffer instead of the microphone, for
+    # headless replay. realtime=False pushes frames as fast as consumers allow.
+    def __init__(self, path, realtime=False, trailing_silence=1.0):
+        self.path = path
+        self.realtime = realtime
+        self.trailing_silence = trailing_silence
+        self.thread = None
+        self.stopped = threading.Event()
+        self.duration = 0.0
+
+    def load(self):
+        import wave
+        with wave.open(self.path, 'rb') as wav:
+            channels = wav.getnchannels()
+            rate = wav.getframerate()
+            width = wav.getsampwidth()
+            data = wav.readframes(wav.getnframes())
+        dtype = {1: np.uint8, 2: np.int16, 4: np.int32}[width]
+        samples = np.frombuffer(data, dtype=dtype).astype(np.float64)
+        if width == 1:
+            samples = (samples - 128) * 256
+        elif width == 4:
+            samples = samples / 65536
+        if channels > 1:
+            samples = samples.reshape(-1, channels).mean(axis=1)
+        if rate != SAMPLE_RATE:
+            positions = np.arange(0, len(samples), rate / SAMPLE_RATE)
+            samples = np.interp(positions, np.arange(len(samples)), samples)
+        self.duration = len(samples) / float(SAMPLE_RATE)
+        return np.clip(samples, -32768, 32767).astype(np.int16)
+
+    def start(self, ring):
+        samples = self.load()
+        silence = np.zeros(int(self.trailing_silence * SAMPLE_RATE), dtype=np.int16)
+        samples = np.concatenate([samples, silence])
+
+        def run():
+            import time
+            frame_time = ring.frame_samples / float(SAMPLE_RATE)
+            next_at = time.perf_counter()
+            for offset in range(0, len(samples), ring.frame_samples):
+                if self.stopped.is_set():
+                    break
+                if self.realtime:
+                    next_at += frame_time
+                    time.sleep(max(0.0, next_at - time.perf_counter()))
+                else:
+                    # Never overwrite frames a reader still needs
+                    while ring.backlog() >= ring.capacity - 1 and not self.stopped.is_set():
+                        time.sleep(0.001)
+                ring.write(samples[offset:offset + ring.frame_samples])
+            ring.close()
+
+        self.thread = threading.Thread(target=run, name="wav-replay", daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.stopped.set()
+
+class AudioCapture:
+    # Shared capture: the source writes into the ring buffer, and every
+    # consumer (recognizer, hotword, level meter) reads it through its own reader
+    def __init__(self, source=None, capacity=1000):
+        self.ring = RingBuffer(capacity)
+        self.source = source or MicrophoneSource()
+        self.started = False
+
+    def start(self):
+        if not self.started:
+            self.source.start(self.ring)
+            self.started = True
+        return self
+
+    def stop(self):
+        if self.started:
+            self.source.stop()
+            self.started = False
+        self.ring.close()
+
+    def reader(self):
+        return self.ring.reader()
+
+    @property
+    def level_db(self):
+        # Level of the most recent frame, for meters
+        if self.ring.seq == 0:
+            return -100.0
+        return self.ring.frame_energy(self.ring.seq - 1)
+
+    def audio_bytes(self, start, end):
+        return self.ring.samples(start, end).tobytes()
+
+class UtteranceSegmenter:
+    # Runs the VAD over a reader and yields (start_seq, end_seq) for each
+    # utterance; frames stay in the ring until the consumer pulls them out
+    def __init__(self, capture, vad=None):
+        self.capture = capture
+        self.reader = capture.reader()
+        self.vad = vad or VoiceActivityDetector()
+
+    def events(self, should_stop=lambda: False, timeout=0.1):
+        ring = self.capture.ring
+        while not should_stop():
+            start, views = self.reader.read(timeout)
+            if not views and ring.closed:
+                break
+            for seq in range(start, start + sum(len(v) for v in views)):
+                event = self.vad.update(seq, ring.frame_energy(seq))
+                yield seq, event
+
+    def utterances(self, should_stop=lambda: False):
+        for seq, event in self.events(should_stop):
+            if event and event[0] == "end":
+                yield event[1], event[2]
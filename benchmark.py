@@ -0,0 +1,532 @@
+import os
+import sys
+import json
+import time
+import wave
+import shutil
+import argparse
+import platform
+import tempfile
+import subprocess
+import tracemalloc
+import numpy as np
+from audio_capture import AudioCapture, WavSource, VoiceActivityDetector, SAMPLE_RATE
+from recognizer import StreamingRecognizer, StreamingTranscriber, create_recognizer
+from web_lookup import StandInSearchServer, WebLookup
+from intent_router import normalize
+from tracing import tracer
+from inference_backend import _percentile
+
+# Headless, offline benchmarks for the voice pipeline. Stand-ins replace the
+# parts that need hardware or a network: WAV fixtures feed the capture ring
+# instead of the microphone, a scripted recognizer supplies the transcript,
+# canned result pages replace DuckDuckGo and speech is captured, not played.
+# The language model is a stand-in too, with a fixed reply after a fixed
+# delay, so the numbers do not depend on whether torch is installed; compare
+# the real model's runtimes with `python inference_backend.py bench`.
+SCENARIOS = ("startup", "routing", "nlp", "reminders", "voice")
+DEFAULT_OUTPUT = "benchmark_results.json"
+DEFAULT_BASELINE = "benchmark_baseline.json"
+# A metric regresses when it is this much worse than the baseline (0.25 = 25%)
+DEFAULT_THRESHOLD = 0.25
+# Thresholds of their own for metrics ending in these names; p99 of a few
+# hundred samples is close to the maximum and moves a lot between runs
+METRIC_THRESHOLDS = {"p99_ms": 1.0}
+# Millisecond metrics also have to move by this much, so sub-millisecond
+# jitter is not reported as a regression
+NOISE_MS = 0.5
+
+VOICE_SCRIPT = [
+    "what time is it",
+    "what's today's date",
+    "hello",
+    "who wrote hamlet",
+    "remind me to stretch in 20 minutes",
+    "what are my reminders",
+    "what is the capital of france",
+    "whats the capital of france",
+    "thank you",
+    "how tall is mount everest",
+]
+VOICE_ANSWERS = {
+    "who wrote hamlet": "Hamlet was written by William Shakespeare around 1600.",
+    "what is the capital of france": "Paris is the capital and largest city of France.",
+    "how tall is mount everest": "Mount Everest is 8,849 metres tall. It is the highest mountain on Earth.",
+}
+ROUTED_COMMANDS = [
+    "what time is it", "tell me the time", "what's today's date", "what day is it today",
+    "hello there", "good morning", "thanks a lot", "what are my reminders",
+]
+
+class ScriptedRecognizer(StreamingRecognizer):
+    # Returns the transcript of the fixture being played, so recognition
+    # itself costs nothing and everything around it is measured
+    def __init__(self):
+        self.transcript = ""
+        self.audio_bytes = 0
+
+    def start(self):
+        self.audio_bytes = 0
+
+    def accept(self, pcm):
+        self.audio_bytes += len(pcm)
+        return None
+
+    def finish(self):
+        text, self.transcript = self.transcript, ""
+        return text
+
+class CapturedSpeech:
+    # Takes the place of SpeechService: records what would have been said and when
+    def __init__(self):
+        self.spoken = []
+
+    def say(self, text, on_start=None):
+        from tts_service import Utterance
+        utterance = Utterance(text, on_start)
+        self.spoken.append((time.perf_counter(), text))
+        utterance.started()
+        utterance.done.set()
+        return utterance
+
+    def interrupt(self):
+        pass
+
+class StandInModel:
+    # Takes the place of the language model (as NLPProcessor.batcher): the
+    # same reply to everything after `delay` seconds, counting the calls
+    REPLY = "I could not find that, but I will keep looking."
+
+    def __init__(self, delay=0.2):
+        self.delay = delay
+        self.calls = 0
+
+    def submit(self, query, should_stop=None):
+        self.calls += 1
+        time.sleep(self.delay)
+        return self.REPLY
+
+def synth_utterance(seconds, seed):
+    # Voice-like audio at conversational level over faint background noise:
+    # a pitched harmonic stack with ~4 syllables per second. It is not speech
+    # (the scripted recognizer supplies the words) but drives capture, VAD and
+    # segmentation the way a recording would.
+    rng = np.random.default_rng(seed)
+    lead, tail = 0.6, 0.3
+    t = np.arange(int(seconds * SAMPLE_RATE)) / SAMPLE_RATE
+    f0 = 110 + 60 * rng.random()
+    voice = sum(np.sin(2 * np.pi * f0 * h * t + rng.random() * 2 * np.pi) / h for h in range(1, 6))
+    envelope = 0.35 + 0.65 * np.abs(np.sin(2 * np.pi * 2.0 * t))
+    voice = voice / np.max(np.abs(voice)) * envelope * 0.1 * 32767
+    noise = rng.normal(0, 0.001 * 32767, int((lead + seconds + tail) * SAMPLE_RATE))
+    start = int(lead * SAMPLE_RATE)
+    noise[start:start + len(voice)] += voice
+    return np.clip(noise, -32768, 32767).astype(np.int16)
+
+def write_wav(path, samples):
+    with wave.open(path, 'wb') as wav:
+        wav.setnchannels(1)
+        wav.setsampwidth(2)
+        wav.setframerate(SAMPLE_RATE)
+        wav.writeframes(samples.tobytes())
+
+def make_fixtures(directory, script=VOICE_SCRIPT):
+    # One synthetic WAV per line of the script, with the line as its transcript
+    os.makedirs(directory, exist_ok=True)
+    fixtures = []
+    for i, text in enumerate(script):
+        path = os.path.join(directory, f"{i:02d}.wav")
+        write_wav(path, synth_utterance(0.9 + 0.08 * len(text.split()), seed=i))
+        with open(path[:-len(".wav")] + ".txt", 'w', encoding='utf-8') as f:
+            f.write(text + "\n")
+        fixtures.append((path, text))
+    return fixtures
+
+def load_fixtures(directory):
+    # Recorded fixtures: NAME.wav with its transcript in NAME.txt
+    fixtures = []
+    for name in sorted(os.listdir(directory)):
+        if name.endswith(".wav"):
+            path = os.path.join(directory, name)
+            with open(path[:-len(".wav")] + ".txt", 'r', encoding='utf-8') as f:
+                fixtures.append((path, f.read().strip()))
+    return fixtures
+
+def summarize(latencies_ms, prefix=""):
+    return {f"{prefix}p50_ms": _percentile(latencies_ms, 50),
+            f"{prefix}p95_ms": _percentile(latencies_ms, 95),
+            f"{prefix}p99_ms": _percentile(latencies_ms, 99)}
+
+def respond(commands, speech, text):
+    # What CommandPipeline does for one request, minus Qt: route, then speak
+    # a fixed response or each sentence of a streamed one as it completes
+    from nlp_processor import SentenceSplitter
+    result = commands.handle(text)
+    if result.action:
+        return result.action
+    if result.stream is None:
+        speech.say(result.response)
+        return None
+    splitter = SentenceSplitter()
+    for chunk in result.stream:
+        for sentence in splitter.feed(chunk):
+            speech.say(sentence)
+    for sentence in splitter.flush():
+        speech.say(sentence)
+    return None
+
+class Bench:
+    # Shared setup for the scenarios: a scratch directory and the canned
+    # search server, and a fresh AssistantEngine per measurement
+    def __init__(self, workdir, answers, web_delay=0.05, rounds=3, fixtures=None, asr="scripted",
+                 model_delay=0.2):
+        self.workdir = workdir
+        self.model_delay = model_delay
+        self.rounds = rounds
+        self.fixtures = fixtures
+        self.asr = asr
+        self.answers = {normalize(q): a for q, a in answers.items()}
+        self.server = StandInSearchServer(self.answers, delay=web_delay).start()
+        self.engines = 0
+
+    def close(self):
+        self.server.stop()
+
+    def engine(self):
+        from engine import AssistantEngine
+        self.engines += 1
+        directory = os.path.join(self.workdir, f"engine-{self.engines}")
+        os.makedirs(directory)
+        engine = AssistantEngine(reminders_file=os.path.join(directory, "reminders.json"),
+                                 kb_path=os.path.join(directory, "knowledge_base.db"),
+                                 apps_path=os.path.join(directory, "app_index.json"))
+        engine.nlp.web.close()
+        engine.nlp.web = WebLookup(self.server.url)
+        engine.nlp.batcher = StandInModel(self.model_delay)
+        engine.nlp.kb_index.ready.wait()
+        return engine
+
+    def startup(self):
+        # Cold: a new interpreter importing and building the engine. Warm: the
+        # same construction in this process, with every module already imported.
+        code = ("import json, time, sys; started = time.perf_counter(); "
+                "from engine import AssistantEngine; "
+                "from inference_backend import _peak_rss_mb; "
+                "e = AssistantEngine(reminders_file=sys.argv[1], kb_path=sys.argv[2], apps_path=sys.argv[3]); "
+                "e.nlp.kb_index.ready.wait(); "
+                "print(json.dumps({'init_ms': (time.perf_counter() - started) * 1000, "
+                "'peak_rss_mb': _peak_rss_mb()}))")
+        here = os.path.dirname(os.path.abspath(__file__))
+        cold, init, rss = [], [], []
+        for i in range(self.rounds):
+            directory = tempfile.mkdtemp(dir=self.workdir)
+            started = time.perf_counter()
+            proc = subprocess.run([sys.executable, "-c", code, os.path.join(directory, "reminders.json"),
+                                   os.path.join(directory, "knowledge_base.db"),
+                                   os.path.join(directory, "app_index.json")],
+                                  cwd=here, capture_output=True, text=True)
+            cold.append((time.perf_counter() - started) * 1000)
+            if proc.returncode != 0:
+                raise RuntimeError(f"Cold start failed: {proc.stderr.strip().splitlines()[-1:]}")
+            child = json.loads(proc.stdout.strip().splitlines()[-1])
+            init.append(child["init_ms"])
+            rss.append(child["peak_rss_mb"])
+        warm = []
+        for i in range(self.rounds):
+            started = time.perf_counter()
+            engine = self.engine()
+            warm.append((time.perf_counter() - started) * 1000)
+            engine.stop()
+        return {"cold_process_ms": _percentile(cold, 50), "cold_init_ms": _percentile(init, 50),
+                "warm_init_ms": _percentile(warm, 50), "cold_peak_rss_mb": max(rss)}
+
+    def routing(self, per_round=500):
+        # Throughput is the median over rounds, which shrugs off a round that
+        # shared the CPU with something else
+        engine = self.engine()
+        latencies = []
+        throughput = []
+        for _ in range(self.rounds):
+            started = time.perf_counter()
+            for _ in range(per_round):
+                for text in ROUTED_COMMANDS:
+                    t = time.perf_counter()
+                    engine.commands.handle(text)
+                    latencies.append((time.perf_counter() - t) * 1000)
+            throughput.append(per_round * len(ROUTED_COMMANDS) / (time.perf_counter() - started))
+        engine.stop()
+        return dict(summarize(latencies), commands_per_second=_percentile(throughput, 50))
+
+    def nlp(self, questions):
+        # Questions go to the canned web once, then come back from the
+        # knowledge base, verbatim and rephrased; a question the web has no
+        # answer for falls through to the stand-in model, timed on its own
+        engine = self.engine()
+        nlp = engine.nlp
+        timings = {"web": [], "kb": [], "rephrased": [], "model": []}
+        correct = 0
+        started = time.perf_counter()
+        for question, answer in questions:
+            for kind, text in (("web", question), ("kb", question),
+                               ("rephrased", question.replace("what is", "whats") + "?"),
+                               ("model", question.replace("what is", "tell me a story about"))):
+                t = time.perf_counter()
+                reply = "".join(nlp.generate_response_stream(normalize(text), check_commands=False) or ())
+                timings[kind].append((time.perf_counter() - t) * 1000)
+                if kind == "rephrased":
+                    correct += reply == answer
+        elapsed = time.perf_counter() - started
+        model_calls = nlp.batcher.calls
+        engine.stop()
+        # Model time dominates the elapsed time, so throughput covers the
+        # web and knowledge base answers only
+        answered = elapsed - sum(timings["model"]) / 1000
+        results = {"queries_per_second": 3 * len(questions) / answered,
+                   "rephrased_correct_rate": correct / len(questions),
+                   # One per "model" question; any more means an answer the
+                   # web or knowledge base had still reached the model
+                   "model_calls": model_calls}
+        for kind, latencies in timings.items():
+            results.update(summarize(latencies, kind + "_"))
+        return results
+
+    def reminders(self, count=200):
+        # Adding, firing and reloading reminders on a fake clock
+        from reminder import ReminderManager, FakeClock
+        path = os.path.join(tempfile.mkdtemp(dir=self.workdir), "reminders.json")
+        clock = FakeClock()
+        manager = ReminderManager(path, clock=clock, autostart=False)
+        manager.add_listener(lambda reminder, message: None)
+        adds = []
+        for i in range(count):
+            t = time.perf_counter()
+            manager.add_reminder(f"task number {i}", f"in {i + 1} minutes")
+            adds.append((time.perf_counter() - t) * 1000)
+        started = time.perf_counter()
+        reloaded = ReminderManager(path, clock=clock, autostart=False)
+        load_ms = (time.perf_counter() - started) * 1000
+        clock.advance(minutes=count + 1)
+        started = time.perf_counter()
+        manager.run_pending()
+        fire = time.perf_counter() - started
+        return dict(summarize(adds, "add_"), load_ms=load_ms, reloaded=len(reloaded.reminders),
+                    fired_per_second=count / fire if fire else None)
+
+    def voice(self):
+        # Fixture audio -> capture ring -> VAD -> recognizer -> routing and
+        # answers -> captured speech. Latency runs from the VAD ending the
+        # utterance to the first and last sentence handed to speech. A real
+        # recognizer (asr="vosk") only makes sense with recorded fixtures.
+        engine = self.engine()
+        speech = CapturedSpeech()
+        scripted = self.asr == "scripted"
+        recognizer = ScriptedRecognizer() if scripted else create_recognizer(self.asr)
+        first, total = [], []
+        matched = 0
+        audio_seconds = 0.0
+        errors = 0
+        started = time.perf_counter()
+        for path, transcript in self.fixtures:
+            source = WavSource(path)
+            capture = AudioCapture(source)
+            ended = []
+
+            def on_final(text, start, end):
+                nonlocal errors, matched
+                matched += normalize(text) == normalize(transcript)
+                spoken = len(speech.spoken)
+                try:
+                    respond(engine.commands, speech, text)
+                except Exception:
+                    errors += 1
+                    return
+                done = time.perf_counter()
+                if len(speech.spoken) > spoken:
+                    first.append((speech.spoken[spoken][0] - ended[-1]) * 1000)
+                total.append((done - ended[-1]) * 1000)
+
+            if scripted:
+                recognizer.transcript = transcript
+            transcriber = StreamingTranscriber(capture, recognizer, VoiceActivityDetector(),
+                                               on_final=on_final,
+                                               on_speech_end=lambda s, e: ended.append(time.perf_counter()))
+            capture.start()
+            transcriber.run()
+            audio_seconds += source.duration
+        elapsed = time.perf_counter() - started
+        engine.stop()
+        return dict(summarize(first, "first_audio_"), **summarize(total, "response_"),
+                    utterances=len(total), errors=errors,
+                    transcript_match_rate=matched / len(self.fixtures),
+                    utterances_per_second=len(total) / elapsed,
+                    realtime_factor=elapsed / audio_seconds if audio_seconds else None)
+
+def _synthetic_questions(count):
+    from kb_index import _synthetic_entities
+    import random
+    names = _synthetic_entities(count, random.Random(7))
+    return [(f"what is the population of {name}", f"About {i + 1},000 people live in {name.title()}.")
+            for i, name in enumerate(names)]
+
+def _measure(fn, *args):
+    # Timings from a plain run; peak Python allocations from a second run
+    # under tracemalloc, which would otherwise slow the timed one down
+    metrics = fn(*args)
+    tracemalloc.start()
+    try:
+        fn(*args)
+        metrics["peak_traced_mb"] = tracemalloc.get_traced_memory()[1] / (1024.0 * 1024.0)
+    finally:
+        tracemalloc.stop()
+    return metrics
+
+def run(scenarios=SCENARIOS, rounds=3, questions=100, reminders=200, web_delay=0.05, fixtures_dir=None,
+        asr="scripted", model_delay=0.2):
+    workdir = tempfile.mkdtemp(prefix="jarvis-bench-")
+    was_enabled = tracer.enabled
+    tracer.enable()
+    try:
+        fixtures = load_fixtures(fixtures_dir) if fixtures_dir else \
+            make_fixtures(os.path.join(workdir, "fixtures"))
+        qa = _synthetic_questions(questions)
+        bench = Bench(workdir, dict(VOICE_ANSWERS, **dict(qa)), web_delay, rounds, fixtures, asr,
+                      model_delay)
+        results = {}
+        try:
+            for name in scenarios:
+                tracer.reset()
+                if name == "startup":
+                    # Memory here is the child's RSS; tracemalloc cannot see it
+                    metrics = bench.startup()
+                elif name == "nlp":
+                    metrics = _measure(bench.nlp, qa)
+                elif name == "reminders":
+                    metrics = _measure(bench.reminders, reminders)
+                else:
+                    metrics = _measure(getattr(bench, name))
+                stages, _ = tracer.snapshot()
+                # Per-stage medians from the tracer, for reading, not for comparison
+                metrics["stages"] = {stage: q[0.5] * 1000 for stage, (q, count, total) in stages.items()}
+                results[name] = metrics
+        finally:
+            bench.close()
+    finally:
+        tracer.enable(was_enabled)
+        shutil.rmtree(workdir, ignore_errors=True)
+    return {
+        "meta": {
+            "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+            "rounds": rounds,
+            "fixtures": fixtures_dir or "synthetic",
+            "asr": asr,
+            "web_delay": web_delay,
+            "model_delay": model_delay,
+        },
+        "scenarios": results,
+    }
+
+def _direction(metric):
+    # +1 if higher is better, -1 if lower is better, 0 if informational
+    if metric.endswith(("_per_second", "_rate")):
+        return 1
+    if metric.endswith(("_ms", "_mb", "errors", "realtime_factor")):
+        return -1
+    return 0
+
+def _limit(name, metric, threshold, overrides):
+    if name in overrides:
+        return overrides[name]
+    suffixes = [key for key in overrides if "." not in key and metric.endswith(key)]
+    return overrides[max(suffixes, key=len)] if suffixes else threshold
+
+def compare(results, baseline, threshold=DEFAULT_THRESHOLD, overrides=None):
+    # [(name, baseline, current, relative change)] for metrics that got worse
+    # by more than their threshold; overrides map "scenario.metric", or the
+    # end of a metric name ("p95_ms"), to a threshold of its own
+    overrides = dict(METRIC_THRESHOLDS, **(overrides or {}))
+    regressions = []
+    for scenario, metrics in results["scenarios"].items():
+        previous = baseline.get("scenarios", {}).get(scenario, {})
+        for metric, value in metrics.items():
+            old = previous.get(metric)
+            direction = _direction(metric)
+            if not direction or not isinstance(value, (int, float)) or not isinstance(old, (int, float)):
+                continue
+            name = f"{scenario}.{metric}"
+            limit = _limit(name, metric, threshold, overrides)
+            worse = (old - value) if direction > 0 else (value - old)
+            if worse <= 0 or (metric.endswith("_ms") and worse < NOISE_MS):
+                continue
+            change = worse / abs(old) if old else float("inf")
+            if change > limit:
+                regressions.append((name, old, value, change))
+    return regressions
+
+def _parse_overrides(items):
+    overrides = {}
+    for item in items or ():
+        name, _, value = item.partition("=")
+        overrides[name] = float(value)
+    return overrides
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Offline benchmarks for startup, routing, answers, "
+                                                 "reminders and the voice pipeline")
+    parser.add_argument("--scenarios", nargs="+", default=list(SCENARIOS), choices=SCENARIOS)
+    parser.add_argument("--rounds", type=int, default=3, help="repetitions for startup and routing")
+    parser.add_argument("--questions", type=int, default=100, help="distinct questions in the nlp scenario")
+    parser.add_argument("--reminders", type=int, default=200, help="reminders in the reminders scenario")
+    parser.add_argument("--web-delay", type=float, default=0.05,
+                        help="seconds the canned search server waits, standing in for the network")
+    parser.add_argument("--model-delay", type=float, default=0.2,
+                        help="seconds the stand-in language model takes to reply")
+    parser.add_argument("--fixtures", default=None,
+                        help="directory of NAME.wav recordings with NAME.txt transcripts "
+                             "(default: synthetic audio)")
+    parser.add_argument("--asr", default="scripted", choices=["scripted", "vosk", "google"],
+                        help="recognizer for the voice scenario; scripted returns the fixture's transcript")
+    parser.add_argument("--output", default=DEFAULT_OUTPUT, help="where to write the results JSON")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE, help="results to compare against")
+    parser.add_argument("--save-baseline", action="store_true", help="store these results as the baseline")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD,
+                        help="allowed relative regression (0.25 = 25%% worse)")
+    parser.add_argument("--threshold-for", action="append", metavar="METRIC=FRACTION",
+                        help="per-metric threshold, e.g. voice.response_p95_ms=0.5 or p99_ms=1.0")
+    args = parser.parse_args(argv)
+
+    results = run(args.scenarios, args.rounds, args.questions, args.reminders, args.web_delay, args.fixtures,
+                  args.asr, args.model_delay)
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(results, f, indent=2)
+    for scenario, metrics in results["scenarios"].items():
+        print(f"{scenario}:")
+        for metric, value in metrics.items():
+            if metric == "stages":
+                value = ", ".join(f"{stage} {ms:.2f} ms" for stage, ms in sorted(value.items())) or "-"
+            elif isinstance(value, float):
+                value = f"{value:.3f}"
+            print(f"  {metric:<28} {value}")
+    print(f"Results written to {args.output}")
+
+    if args.save_baseline:
+        shutil.copyfile(args.output, args.baseline)
+        print(f"Baseline saved to {args.baseline}")
+        return 0
+    if not os.path.exists(args.baseline):
+        print(f"No baseline at {args.baseline}; run with --save-baseline to create one")
+        return 0
+    with open(args.baseline, 'r', encoding='utf-8') as f:
+        baseline = json.load(f)
+    regressions = compare(results, baseline, args.threshold, _parse_overrides(args.threshold_for))
+    for name, old, new, change in regressions:
+        print(f"REGRESSION {name}: {old:.3f} -> {new:.3f} ({change:+.0%})")
+    if regressions:
+        return 1
+    print(f"No regressions against {args.baseline} (threshold {args.threshold:.0%})")
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
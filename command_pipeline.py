@@ -0,0 +1,164 @@
+import sys
+import time
+import itertools
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from PyQt5.QtCore import QObject, pyqtSignal
+from nlp_processor import SentenceSplitter
+from tracing import tracer
+
+STOP_WORDS = ("stop", "cancel", "jarvis stop", "stop jarvis", "never mind")
+
+class CommandRequest:
+    def __init__(self, request_id, text, deadline, trace=None):
+        self.id = request_id
+        self.text = text
+        # Trace request id; a spoken command keeps the one its ASR span used
+        self.trace = trace or tracer.new_request()
+        self.deadline = time.monotonic() + deadline if deadline else None
+        self.cancelled = threading.Event()
+
+    def cancel(self):
+        self.cancelled.set()
+
+    def expired(self):
+        return self.deadline is not None and time.monotonic() > self.deadline
+
+    def should_stop(self):
+        return self.cancelled.is_set() or self.expired()
+
+class ResponseLatency:
+    # Time from receiving a command to the first spoken word, and to the end of
+    # the reply; recorded by the tracer, and printed only when verbose
+    def __init__(self, trace=None):
+        self.start = time.perf_counter()
+        self.first_audio_at = None
+        self.trace = trace
+
+    def first_audio(self):
+        if self.first_audio_at is None:
+            self.first_audio_at = time.perf_counter()
+
+    def report(self, verbose=False):
+        total = (time.perf_counter() - self.start) * 1000
+        first = (self.first_audio_at - self.start) * 1000 if self.first_audio_at else total
+        if tracer.enabled:
+            tracer.observe("first_audio", first / 1000, self.trace)
+            tracer.observe("response", total / 1000, self.trace)
+        if not verbose:
+            return
+        print(f"Response latency: first audio {first:.0f} ms, total {total:.0f} ms", file=sys.stderr)
+        if tracer.enabled:
+            print(f"Trace {self.trace}: {tracer.breakdown(self.trace)}", file=sys.stderr)
+
+class CommandPipeline(QObject):
+    # Runs CommandProcessor.handle on a worker pool. A new utterance cancels
+    # whatever is still in flight, and every result reaches the GUI through
+    # queued signals so the UI thread never waits on I/O or inference.
+    partial_text = pyqtSignal(int, str)
+    response_ready = pyqtSignal(int, str)
+    request_finished = pyqtSignal(int)
+    request_failed = pyqtSignal(int, str)
+    action_requested = pyqtSignal(str)
+
+    def __init__(self, processor, speech, workers=4, deadline=30.0, verbose=False, parent=None):
+        super().__init__(parent)
+        self.processor = processor
+        self.speech = speech
+        self.deadline = deadline
+        # Print each reply's latency (and trace breakdown) to stderr
+        self.verbose = verbose
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="command")
+        self.ids = itertools.count(1)
+        self.active = {}
+        self.lock = threading.Lock()
+
+    def submit(self, text, trace=None):
+        self.cancel_all()
+        if text.strip().lower() in STOP_WORDS:
+            return None
+        request = CommandRequest(next(self.ids), text, self.deadline, trace)
+        with self.lock:
+            self.active[request.id] = request
+        self.executor.submit(self._run, request)
+        return request.id
+
+    def cancel_all(self):
+        with self.lock:
+            requests = list(self.active.values())
+        for request in requests:
+            request.cancel()
+        if requests:
+            self.speech.interrupt()
+
+    def shutdown(self):
+        self.cancel_all()
+        self.executor.shutdown(wait=False)
+
+    def _run(self, request):
+        with tracer.use(request.trace):
+            self._handle(request)
+
+    def _handle(self, request):
+        latency = ResponseLatency(request.trace)
+        try:
+            result = self.processor.handle(request.text, request.should_stop)
+            # Whether anything reached the user; a late reply is cut short, not apologised for
+            delivered = False
+            if request.should_stop():
+                pass
+            elif result.action:
+                self.action_requested.emit(result.action)
+                delivered = True
+            elif result.stream is not None:
+                delivered = self._stream(request, result.stream, latency)
+            else:
+                self.response_ready.emit(request.id, result.response)
+                delivered = True
+                self._finish_speech(request, self._say(request, result.response, latency), latency)
+            if request.expired() and not delivered:
+                self.request_failed.emit(request.id, "Sorry, that took too long.")
+        except Exception as e:
+            self.request_failed.emit(request.id, f"Error: {str(e)}")
+        finally:
+            with self.lock:
+                self.active.pop(request.id, None)
+            self.request_finished.emit(request.id)
+
+    def _stream(self, request, stream, latency):
+        # Show tokens as they arrive and speak each sentence as soon as it is
+        # complete; generation keeps running on its own thread meanwhile.
+        # Returns whether any text was shown.
+        splitter = SentenceSplitter()
+        utterance = None
+        delivered = False
+        try:
+            for chunk in stream:
+                if request.should_stop():
+                    break
+                self.partial_text.emit(request.id, chunk)
+                delivered = True
+                for sentence in splitter.feed(chunk):
+                    utterance = self._say(request, sentence, latency) or utterance
+        finally:
+            # Closing the stream stops the model's decode loop too
+            close = getattr(stream, "close", None)
+            if close is not None:
+                close()
+        for sentence in splitter.flush():
+            utterance = self._say(request, sentence, latency) or utterance
+        self._finish_speech(request, utterance, latency)
+        return delivered
+
+    def _say(self, request, text, latency):
+        # Queued on the speech service; latency is stamped when playback starts
+        if not text or request.should_stop():
+            return None
+        return self.speech.say(text, on_start=latency.first_audio)
+
+    def _finish_speech(self, request, utterance, latency):
+        # Wait for the last sentence to be spoken so total latency covers playback
+        while utterance is not None and not utterance.wait(0.1):
+            if request.should_stop():
+                return
+        latency.report(self.verbose)
@@ -0,0 +1,243 @@
+import datetime
+import itertools
+import webbrowser
+from intent_router import IntentRouter, normalize
+from app_index import AppIndex, launch
+from tracing import tracer
+
+GREETING_RESPONSES = [
+    "Hello! How can I help you today?",
+    "Hi there! What can I do for you?",
+    "Greetings! How may I assist you?",
+    "Hello! I'm here to help. What do you need?"
+]
+
+THANKS_RESPONSES = [
+    "You're welcome!",
+    "Happy to help!",
+    "Anytime!",
+    "My pleasure!"
+]
+
+# Fixed replies the speech service renders to disk ahead of time; prefixes such
+# as "The current time is" are played from the cache and only the rest is synthesized
+CACHED_PHRASES = GREETING_RESPONSES + THANKS_RESPONSES + [
+    "The current time is",
+    "Today's date is",
+    "Opening web browser",
+    "I'm not sure how to help with that.",
+    "Reminder set for",
+    "Reminder:",
+    "Missed reminder:",
+    "No active reminders",
+    "Active reminders:"
+]
+
+# A reminder's time is the clock time after "at", optionally followed by the
+# day or date, so a task that comes after it ("... at 9am to call mom") is
+# not taken for part of the time
+_MONTH = r"(?:jan|feb|mar|apr|may|jun|jul|aug|sep|oct|nov|dec)[a-z]*"
+_DATE = (r"(?:on\s+)?(?:the\s+)?(?:\d{4}-\d{1,2}-\d{1,2}|\d{1,2}/\d{1,2}(?:/\d{2,4})?|"
+         r"%s\s+\d{1,2}(?:st|nd|rd|th)?|\d{1,2}(?:st|nd|rd|th)?\s+(?:of\s+)?%s)(?:\s+\d{4})?"
+         % (_MONTH, _MONTH))
+_DAY = r"today|tonight|tomorrow|(?:on\s+)?(?:mon|tues|wednes|thurs|fri|satur|sun)day|" + _DATE
+REMINDER_SLOTS = {
+    "time": r"(?:\d{1,2}(?::\d{2})?(?:\s*(?:am|pm))?|noon|midnight)"
+            r"(?:\s+(?:%s|daily|weekly|monthly|hourly|(?:every|each)\s+\w+))?" % _DAY,
+    "day": _DAY,
+}
+
+class CommandResult:
+    # Either a finished response string or a stream of text chunks from the
+    # NLP processor; action asks the front end to do something (e.g. "quit")
+    def __init__(self, response=None, stream=None, action=None):
+        self.response = response
+        self.stream = stream
+        self.action = action
+
+class CommandProcessor:
+    # Command handling without any GUI dependency, so it can run on worker
+    # threads. Utterances are routed by the compiled IntentRouter; anything it
+    # does not recognise goes to the NLP processor, as does anything a handler
+    # declines by returning None. "open <app>" goes through apps, an AppIndex
+    # (one with the default index file is made on first use).
+    def __init__(self, reminder_manager, nlp_processor, apps=None):
+        self.reminder_manager = reminder_manager
+        self.nlp_processor = nlp_processor
+        self._apps = apps
+        self.router = IntentRouter()
+        self.register_intents(self.router)
+        self.router.compile()
+
+    def register_intents(self, router):
+        router.register("open_app", [
+            "(open|launch) {app}",
+        ], self.open_app)
+        # "start the timer" or "run a marathon" are not about apps, so these
+        # verbs only count when the index knows the name
+        router.register("start_app", [
+            "(start|run) {app}",
+        ], self.start_app)
+        router.register("time", [
+            "time",
+            "[the] (current|exact) time",
+            "what time is it",
+            "what's the [current] time",
+            "what is the [current] time",
+            "(tell|give) me the [current] time",
+            "do you know what time it is",
+        ], self.tell_time)
+        router.register("date", [
+            "date",
+            "[the] (current|today's) date",
+            "what's [the] date [today]",
+            "what is [the] date [today]",
+            "what's today's date",
+            "what is today's date",
+            "what day is it [today]",
+            "what day is today",
+            "(tell|give) me [the] [today's] date",
+        ], self.tell_date)
+        router.register("set_reminder", [
+            "[please] (set|add|create) [a|me] reminder [to|for] {text} at {time}",
+            "remind me [to] {text} at {time}",
+            "[please] (set|add|create) [a|me] reminder [for] {day} at {time} to {text}",
+            "[please] (set|add|create) [a|me] reminder at {time} to {text}",
+            "remind me {day} at {time} to {text}",
+            "remind me at {time} to {text}",
+            "[please] (set|add|create) [a|me] reminder [to|for] {text} in {delay}",
+            "remind me [to] {text} in {delay}",
+            "(set|add|create) [a] reminder [to|for] {text}",
+            "(set|add|create) [a] reminder",
+            "remind me [to] {text}",
+        ], self.set_reminder, REMINDER_SLOTS)
+        router.register("list_reminders", [
+            "(list|show) [me] [my|all] [the] reminders",
+            "what are my reminders",
+            "(do i have|are there) any reminders",
+        ], self.list_reminders)
+        router.register("exit", [
+            "(exit|quit|goodbye|bye)",
+            "(exit|quit|close|shut down|stop) (jarvis|assistant|the assistant)",
+        ], self.exit)
+        router.register("greeting", [
+            "(hello|hi|hey|greetings|yo) [there]",
+            "good (morning|afternoon|evening)",
+        ], self.greet)
+        router.register("thanks", [
+            "(thank you|thanks) [very much|so much|a lot]",
+            "(thank you|thanks) [jarvis]",
+            "much appreciated",
+        ], self.thank)
+        router.register("google_search", [
+            "google search [for] {query}",
+            "search google for {query}",
+            "google {query}",
+        ], self.google_search)
+        # Answered like any other question (knowledge base, web, model), not
+        # by opening a browser
+        router.register("look_up", [
+            "(search for|search the web for|look up) {query}",
+        ], self.look_up)
+
+    @property
+    def apps(self):
+        if self._apps is None:
+            self._apps = AppIndex()
+        return self._apps
+
+    def handle(self, text, should_stop=None):
+        with tracer.span("route"):
+            query = normalize(text)
+            match = self.router.match(query, normalized=True)
+        if not query:
+            # Nothing but the wake word ("jarvis", "hey jarvis") is a greeting
+            if text.strip():
+                return self.greet({}, should_stop)
+            return CommandResult(response="I'm not sure how to help with that.")
+        if match is not None:
+            result = match.handler(match.slots, should_stop)
+            if result is not None:
+                return result
+        # The normalized text is for routing only; the question is asked as
+        # it was said ("what is 3.5 times 2", "Please explain ...")
+        return self.answer(text.strip(), should_stop)
+
+    def answer(self, query, should_stop=None):
+        # Try to get a response from the NLP processor; commands were already
+        # ruled out by the router, so it does not need to re-check them
+        stream = _non_empty(self.nlp_processor.generate_response_stream(
+            query, should_stop, check_commands=False))
+        if stream is not None:
+            return CommandResult(stream=stream)
+        return CommandResult(response="I'm not sure how to help with that.")
+
+    def open_app(self, slots, should_stop=None):
+        app_name = slots["app"]
+        if "browser" in app_name:
+            webbrowser.open("https://www.google.com")
+            return CommandResult(response="Opening web browser")
+        app = self.apps.resolve(app_name)
+        if app is None:
+            return CommandResult(response=f"I couldn't find an application called {app_name}")
+        return self._launch(app)
+
+    def start_app(self, slots, should_stop=None):
+        app = self.apps.resolve(slots["app"])
+        if app is None:
+            return None
+        return self._launch(app)
+
+    def _launch(self, app):
+        try:
+            launch(app)
+        except OSError as e:
+            return CommandResult(response=f"Could not open {app.name}: {e.strerror or e}")
+        return CommandResult(response=f"Opening {app.name}")
+
+    def tell_time(self, slots, should_stop=None):
+        current_time = datetime.datetime.now().strftime("%I:%M %p")
+        return CommandResult(response=f"The current time is {current_time}")
+
+    def tell_date(self, slots, should_stop=None):
+        current_date = datetime.datetime.now().strftime("%B %d, %Y")
+        return CommandResult(response=f"Today's date is {current_date}")
+
+    def set_reminder(self, slots, should_stop=None):
+        if slots.get("day"):
+            slots["time"] = f"{slots['time']} {slots['day']}"
+        if slots.get("delay"):
+            slots["time"] = "in " + slots["delay"]
+        if not slots.get("time"):
+            return CommandResult(response="Please specify a time for the reminder using 'at' (e.g., 'set reminder buy groceries at 3:00 PM')")
+        return CommandResult(response=self.reminder_manager.add_reminder(slots["text"], slots["time"]))
+
+    def list_reminders(self, slots, should_stop=None):
+        return CommandResult(response=self.reminder_manager.list_reminders())
+
+    def exit(self, slots, should_stop=None):
+        return CommandResult(action="quit")
+
+    def greet(self, slots, should_stop=None):
+        return CommandResult(response=GREETING_RESPONSES[datetime.datetime.now().second % len(GREETING_RESPONSES)])
+
+    def thank(self, slots, should_stop=None):
+        return CommandResult(response=THANKS_RESPONSES[datetime.datetime.now().second % len(THANKS_RESPONSES)])
+
+    def google_search(self, slots, should_stop=None):
+        query = slots["query"]
+        webbrowser.open(f"https://www.google.com/search?q={query}")
+        return CommandResult(response=f"Searching Google for {query}")
+
+    def look_up(self, slots, should_stop=None):
+        return self.answer(slots["query"], should_stop)
+
+def _non_empty(stream):
+    # Wait for the first chunk so an empty answer can fall through to the
+    # next handler, then hand back a stream that still includes it
+    if stream is None:
+        return None
+    for first in stream:
+        if first:
+            return itertools.chain([first], stream)
+    return None
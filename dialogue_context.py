@@ -0,0 +1,87 @@
+import threading
+import collections
+
+# Token budget for the remembered conversation. DialoGPT has absolute
+# position embeddings (1024 positions), so the window stays well inside that
+# with room for the reply. When a new turn would overflow max_tokens, the
+# oldest exchanges are dropped until the window is back under low_water.
+MAX_CONTEXT_TOKENS = 512
+LOW_WATER_TOKENS = 256
+
+class DialogueContext:
+    # The recent exchanges as token ids plus the model's key/value cache for
+    # them. Each turn only runs the model over tokens the cache has not seen
+    # yet (the new query and the last token of the previous reply), so the
+    # per-turn cost does not grow with the length of the conversation.
+    # Keys are computed at absolute positions, so after an eviction the
+    # cache is dropped and the shorter window is re-encoded once, on the next
+    # turn.
+    def __init__(self, max_tokens=MAX_CONTEXT_TOKENS, low_water=LOW_WATER_TOKENS):
+        self.max_tokens = max_tokens
+        self.low_water = low_water
+        self.exchanges = []  # token ids per query + reply, each segment ending in eos
+        # (query, answer) text from the cache or web, tokenized on the next
+        # turn. An exchange is at least four tokens (two of them eos), so no
+        # more than max_tokens // 4 of them can ever be in the window.
+        self.pending = collections.deque(maxlen=max(1, max_tokens // 4))
+        self.past = None
+        self.cached = 0      # leading window tokens covered by self.past
+        self.evictions = 0
+        # Bumped by clear(); a turn that was running at the time is not kept
+        self.epoch = 0
+        self.pending_lock = threading.Lock()
+        # Held for a whole model turn; the cache can only extend one conversation
+        self.lock = threading.Lock()
+
+    def __len__(self):
+        return sum(len(e) for e in self.exchanges)
+
+    def ids(self):
+        return [token for exchange in self.exchanges for token in exchange]
+
+    def add_text(self, query, answer):
+        # Answers that did not come from the model still belong to the
+        # conversation; they are encoded along with the next model turn
+        with self.pending_lock:
+            self.pending.append((query, answer))
+
+    def tokenize_pending(self, tokenizer):
+        with self.pending_lock:
+            pending = list(self.pending)
+            self.pending.clear()
+        for query, answer in pending:
+            self.exchanges.append(tokenizer.encode(query + tokenizer.eos_token) +
+                                  tokenizer.encode(answer + tokenizer.eos_token))
+
+    def make_room(self, needed):
+        if len(self) + needed <= self.max_tokens:
+            return False
+        while self.exchanges and len(self) + needed > self.low_water:
+            self.exchanges.pop(0)
+        self.past = None
+        self.cached = 0
+        self.evictions += 1
+        return True
+
+    def uncached(self, extra=()):
+        # Tokens the next forward pass has to encode
+        return self.ids()[self.cached:] + list(extra)
+
+    def commit(self, exchange, past, cached, epoch):
+        if epoch != self.epoch:
+            return
+        self.exchanges.append(list(exchange))
+        self.past = past
+        self.cached = cached
+
+    def reset_cache(self):
+        self.past = None
+        self.cached = 0
+
+    def clear(self):
+        # Does not wait for a running turn, so the GUI never blocks on it
+        self.epoch += 1
+        self.exchanges = []
+        with self.pending_lock:
+            self.pending.clear()
+        self.reset_cache()
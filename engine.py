@@ -0,0 +1,381 @@
+import sys
+import json
+import time
+import queue
+import argparse
+import itertools
+import threading
+import collections
+from concurrent.futures import ThreadPoolExecutor
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from startup_profiler import profiler
+from tracing import tracer
+from reminder import ReminderManager
+from nlp_processor import NLPProcessor
+from commands import CommandProcessor
+from app_index import AppIndex
+from inference_backend import BACKENDS, MAX_INPUT_TOKENS
+
+DEFAULT_PORT = 8765
+
+class Overloaded(Exception):
+    # The generation queue is full; HTTP clients get a 503 and retry later
+    pass
+
+class _PendingReply:
+    def __init__(self, query, should_stop=None):
+        self.query = query
+        self.should_stop = should_stop
+        self.done = threading.Event()
+        self.response = None
+        self.error = None
+
+    def cancelled(self):
+        return bool(self.should_stop and self.should_stop())
+
+class BatchGenerator:
+    # Collects concurrent model queries for up to max_wait seconds (or until
+    # max_batch have arrived) and answers them with one left-padded generate()
+    # call, so throughput grows with load instead of serving one query at a
+    # time. The queue is bounded: submit() raises Overloaded when it is full.
+    def __init__(self, nlp, max_batch=8, max_wait=0.02, max_queue=64):
+        self.nlp = nlp
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self.queue = queue.Queue(max_queue)
+        self.thread = None
+        self.running = False
+        self.batches = 0
+        self.batched_queries = 0
+
+    def start(self):
+        if self.thread is None:
+            self.running = True
+            self.thread = threading.Thread(target=self._run, name="batch-generate", daemon=True)
+            self.thread.start()
+        return self
+
+    def stop(self):
+        self.running = False
+        if self.thread is not None:
+            try:
+                self.queue.put_nowait(None)
+            except queue.Full:
+                # The worker is busy and will see running is False
+                pass
+            self.thread.join()
+            self.thread = None
+
+    def submit(self, query, should_stop=None):
+        pending = _PendingReply(query, should_stop)
+        try:
+            self.queue.put_nowait(pending)
+        except queue.Full:
+            raise Overloaded(f"{self.queue.maxsize} queries already waiting")
+        while not pending.done.wait(0.1):
+            if pending.cancelled():
+                # The batch it joined still runs; the reply is just dropped
+                return ""
+        if pending.error is not None:
+            raise pending.error
+        return pending.response
+
+    def stats(self):
+        return {
+            "queued": self.queue.qsize(),
+            "batches": self.batches,
+            "queries": self.batched_queries,
+            "mean_batch": self.batched_queries / self.batches if self.batches else 0.0,
+        }
+
+    def _run(self):
+        while self.running:
+            first = self.queue.get()
+            if first is None:
+                break
+            batch = [first]
+            deadline = time.monotonic() + self.max_wait
+            while len(batch) < self.max_batch:
+                remaining = deadline - time.monotonic()
+                try:
+                    item = self.queue.get(timeout=remaining) if remaining > 0 else self.queue.get_nowait()
+                except queue.Empty:
+                    break
+                if item is None:
+                    self.running = False
+                    break
+                batch.append(item)
+            batch = [p for p in batch if not p.cancelled()]
+            if not batch:
+                continue
+            try:
+                replies = self._generate(batch)
+            except Exception as e:
+                for pending in batch:
+                    pending.error = e
+                    pending.done.set()
+                continue
+            for pending, reply in zip(batch, replies):
+                pending.response = reply
+                pending.done.set()
+
+    def _generate(self, batch):
+        import torch
+        from transformers import StoppingCriteria, StoppingCriteriaList
+
+        class _AllCancelled(StoppingCriteria):
+            def __call__(self, input_ids, scores, **kwargs):
+                return all(p.cancelled() for p in batch)
+
+        tokenizer = self.nlp.tokenizer
+        model = self.nlp.model
+        eos = tokenizer.eos_token_id
+        encoded = [tokenizer.encode(p.query + tokenizer.eos_token)[-MAX_INPUT_TOKENS:] for p in batch]
+        width = max(len(ids) for ids in encoded)
+        # Left padding lines up every prompt's last token in the same column;
+        # the attention mask hides the padding and generate() derives
+        # position ids from it
+        input_ids = torch.full((len(batch), width), eos, dtype=torch.long)
+        attention_mask = torch.zeros((len(batch), width), dtype=torch.long)
+        for row, ids in enumerate(encoded):
+            input_ids[row, width - len(ids):] = torch.tensor(ids)
+            attention_mask[row, width - len(ids):] = 1
+        with torch.inference_mode():
+            output = model.generate(
+                input_ids=input_ids,
+                attention_mask=attention_mask,
+                max_new_tokens=self.nlp.max_new_tokens,
+                pad_token_id=eos,
+                no_repeat_ngram_size=3,
+                do_sample=True,
+                top_k=100,
+                top_p=0.7,
+                temperature=0.8,
+                stopping_criteria=StoppingCriteriaList([_AllCancelled()]))
+        self.batches += 1
+        self.batched_queries += len(batch)
+        return [tokenizer.decode(row[width:], skip_special_tokens=True).strip() for row in output]
+
+class AssistantEngine:
+    # Everything the assistant does except audio and the window: commands,
+    # reminders and the NLP responder. The GUI builds one of these; the HTTP
+    # server and the replay CLI below run it headless. With batch_size set,
+    # model replies go through a BatchGenerator and are answered one query at
+    # a time without per-client conversation context. With a worker
+    # (model_worker.ModelWorker) the model runs in that process instead.
+    def __init__(self, backend="eager", threads=None, batch_size=None, batch_wait=0.02,
+                 max_queue=64, reminders_file="reminders.json", kb_path="knowledge_base.db", worker=None,
+                 apps_path="app_index.json"):
+        if batch_size and worker is not None:
+            raise ValueError("Batched generation runs the model in this process; it cannot use a worker")
+        with profiler.phase("init reminders"):
+            # Started by start() so listeners can be attached first and see
+            # reminders that were missed while nothing was running
+            self.reminders = ReminderManager(reminders_file, autostart=False)
+        with profiler.phase("init NLP processor"):
+            # The model itself is loaded lazily (see NLPProcessor.load_model)
+            self.nlp = NLPProcessor(lazy=True, kb_path=kb_path, backend=backend, threads=threads,
+                                    worker=worker)
+        # Scanned for "open <app>" on a background thread
+        self.apps = AppIndex(apps_path)
+        self.commands = CommandProcessor(self.reminders, self.nlp, self.apps)
+        self.batcher = None
+        if batch_size:
+            self.batcher = BatchGenerator(self.nlp, batch_size, batch_wait, max_queue)
+            self.nlp.batcher = self.batcher
+        self.fired = collections.deque(maxlen=100)
+        self.fired_ids = itertools.count(1)
+        self.reminders.add_listener(self._reminder_fired)
+
+    def start(self):
+        self.reminders.start()
+        if self.batcher is not None:
+            self.batcher.start()
+        return self
+
+    def stop(self):
+        self.reminders.stop()
+        if self.batcher is not None:
+            self.batcher.stop()
+        if self.nlp.worker is not None:
+            self.nlp.worker.close()
+
+    def handle(self, text, should_stop=None):
+        # Raises Overloaded when the model queue is full
+        with tracer.use(tracer.new_request()), tracer.span("response"):
+            result = self.commands.handle(text, should_stop)
+            response = result.response if result.stream is None else "".join(result.stream)
+        return {"response": response, "action": result.action}
+
+    def _reminder_fired(self, reminder, message):
+        self.fired.append({"id": next(self.fired_ids), "text": reminder["text"], "message": message})
+
+    def fired_since(self, since=0):
+        # Clients poll with the last id they have seen
+        return [r for r in list(self.fired) if r["id"] > since]
+
+    def stats(self):
+        stats = {"model_loaded": self.nlp.is_model_loaded, "backend": self.nlp.backend}
+        if self.batcher is not None:
+            stats["batching"] = self.batcher.stats()
+        if self.nlp.worker is not None:
+            stats["worker"] = self.nlp.worker.status()
+        return stats
+
+class _RequestHandler(BaseHTTPRequestHandler):
+    # POST /command {"text"}           -> {"response", "action"}
+    # GET  /reminders                  -> {"reminders": text}
+    # POST /reminders {"text", "time"} -> {"response"}
+    # GET  /reminders/fired?since=N    -> {"fired": [...]}
+    # GET  /health, GET /stats
+    # GET  /metrics                    -> Prometheus text (needs --trace)
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def _reply(self, status, body, headers=()):
+        data = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        for name, value in headers:
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _body(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        return json.loads(self.rfile.read(length) or b"{}")
+
+    def do_GET(self):
+        engine = self.server.engine
+        path, _, query = self.path.partition("?")
+        if path == "/health":
+            self._reply(200, {"ok": True})
+        elif path == "/stats":
+            self._reply(200, engine.stats())
+        elif path == "/metrics":
+            data = tracer.prometheus().encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+        elif path == "/reminders":
+            self._reply(200, {"reminders": engine.reminders.list_reminders()})
+        elif path == "/reminders/fired":
+            params = dict(p.partition("=")[::2] for p in query.split("&") if p)
+            self._reply(200, {"fired": engine.fired_since(int(params.get("since") or 0))})
+        else:
+            self._reply(404, {"error": f"Unknown path: {path}"})
+
+    def do_POST(self):
+        engine = self.server.engine
+        try:
+            body = self._body()
+        except ValueError:
+            self._reply(400, {"error": "Body must be JSON"})
+            return
+        try:
+            if self.path == "/command" and body.get("text"):
+                self._reply(200, engine.handle(body["text"]))
+            elif self.path == "/reminders" and body.get("text") and body.get("time"):
+                self._reply(200, {"response": engine.reminders.add_reminder(body["text"], body["time"])})
+            else:
+                self._reply(404, {"error": f"Unknown request: POST {self.path}"})
+        except Overloaded as e:
+            self._reply(503, {"error": f"Busy: {e}"}, [("Retry-After", "1")])
+        except Exception as e:
+            self._reply(500, {"error": str(e)})
+
+def serve(engine, host="127.0.0.1", port=DEFAULT_PORT):
+    server = ThreadingHTTPServer((host, port), _RequestHandler)
+    server.daemon_threads = True
+    server.engine = engine
+    return server
+
+def replay(engine, lines, concurrency=1):
+    # Runs transcripts through the engine, `concurrency` at a time, retrying
+    # whenever the model queue pushes back
+    def run(text):
+        started = time.perf_counter()
+        while True:
+            try:
+                reply = engine.handle(text)
+                break
+            except Overloaded:
+                time.sleep(0.05)
+        return {"text": text, "response": reply["response"], "action": reply["action"],
+                "ms": (time.perf_counter() - started) * 1000}
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = list(pool.map(run, lines))
+    return results, time.perf_counter() - started
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run the assistant without the GUI")
+    sub = parser.add_subparsers(dest="command", required=True)
+    serve_cmd = sub.add_parser("serve", help="answer requests over a local HTTP API")
+    serve_cmd.add_argument("--host", default="127.0.0.1")
+    serve_cmd.add_argument("--port", type=int, default=DEFAULT_PORT)
+    replay_cmd = sub.add_parser("replay", help="run a file of transcripts, one per line")
+    replay_cmd.add_argument("transcripts")
+    replay_cmd.add_argument("--concurrency", type=int, default=1)
+    replay_cmd.add_argument("--json", action="store_true", help="print results as JSON")
+    for p in (serve_cmd, replay_cmd):
+        p.add_argument("--backend", default="eager", choices=BACKENDS)
+        p.add_argument("--threads", type=int, default=None)
+        p.add_argument("--batch-size", type=int, default=8,
+                       help="most model queries per generate() call (0 disables batching)")
+        p.add_argument("--batch-wait", type=float, default=0.02,
+                       help="seconds to wait for a batch to fill")
+        p.add_argument("--max-queue", type=int, default=64,
+                       help="model queries allowed to wait before requests get 503")
+        p.add_argument("--trace", action="store_true", help="time every stage of each request")
+        p.add_argument("--metrics-file", default=None,
+                       help="write Prometheus-format metrics here every 10 seconds (implies --trace)")
+    args = parser.parse_args(argv)
+
+    if args.trace or args.metrics_file:
+        tracer.enable()
+    exporter = tracer.export_to(args.metrics_file) if args.metrics_file else None
+    engine = AssistantEngine(args.backend, args.threads, args.batch_size, args.batch_wait,
+                             args.max_queue).start()
+    if args.command == "serve":
+        server = serve(engine, args.host, args.port)
+        print(f"Jarvis engine listening on http://{args.host}:{server.server_address[1]}")
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
+            engine.stop()
+            if exporter is not None:
+                exporter.stop()
+        return
+
+    with open(args.transcripts, 'r', encoding='utf-8') as f:
+        lines = [line.strip() for line in f if line.strip() and not line.startswith("#")]
+    results, elapsed = replay(engine, lines, args.concurrency)
+    engine.stop()
+    if exporter is not None:
+        exporter.stop()
+    if args.json:
+        print(json.dumps({"results": results, "seconds": elapsed, "stats": engine.stats()}, indent=2))
+        return
+    for r in results:
+        print(f"> {r['text']}\n< {r['response'] or r['action']}")
+    latencies = sorted(r["ms"] for r in results)
+    if latencies:
+        print(f"{len(results)} transcripts in {elapsed:.2f}s ({len(results) / elapsed:.1f}/s), "
+              f"p50 {latencies[len(latencies) // 2]:.0f} ms, max {latencies[-1]:.0f} ms")
+    if engine.batcher is not None and engine.batcher.batches:
+        print(f"{engine.batcher.batches} model batches, mean size {engine.batcher.stats()['mean_batch']:.1f}")
+    if tracer.enabled:
+        print(tracer.summary())
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,68 +1,100 @@
-import win32serviceutil
-import win32service
-import win32event
-import servicemanager
-import subprocess
 import sys
-import os
-import speech_recognition as sr
+import signal
+from audio_capture import AudioCapture, VoiceActivityDetector
+from recognizer import create_recognizer, StreamingTranscriber
+from keyword_spotter import load_spotter
+import assistant_daemon
 
-class JarvisHotwordService(win32serviceutil.ServiceFramework):
-    _svc_name_ = "JarvisHotwordService"
-    _svc_display_name_ = "Jarvis Hotword Listener Service"
-    _svc_description_ = "Listens for 'Hey Jarvis' and launches the Jarvis assistant."
+try:
+    import win32serviceutil
+    import win32service
+    import win32event
+    import servicemanager
+except ImportError:
+    win32serviceutil = None
 
-    def __init__(self, args):
-        win32serviceutil.ServiceFramework.__init__(self, args)
-        self.hWaitStop = win32event.CreateEvent(None, 0, 0, None)
+class HotwordListener:
+    # Waits for "hey jarvis" and activates the resident assistant over its
+    # socket, starting it only if nothing is listening yet
+    def __init__(self):
         self.is_running = True
 
-    def SvcStop(self):
-        self.ReportServiceStatus(win32service.SERVICE_STOP_PENDING)
+    def stop(self):
         self.is_running = False
-        win32event.SetEvent(self.hWaitStop)
-
-    def SvcDoRun(self):
-        servicemanager.LogMsg(servicemanager.EVENTLOG_INFORMATION_TYPE,
-                              servicemanager.PYS_SERVICE_STARTED,
-                              (self._svc_name_, ""))
-        self.main()
 
     def main(self):
-        recognizer = sr.Recognizer()
-        while self.is_running:
-            try:
-                with sr.Microphone() as source:
-                    recognizer.adjust_for_ambient_noise(source)
-                    audio = recognizer.listen(source, timeout=5, phrase_time_limit=5)
-                    try:
-                        text = recognizer.recognize_google(audio)
-                        if text.strip().lower() == "hey jarvis":
-                            # Launch main.py if not already running
-                            if not self.is_jarvis_running():
-                                subprocess.Popen([sys.executable, os.path.join(os.path.dirname(__file__), "main.py")])
-                    except sr.UnknownValueError:
-                        pass
-                    except sr.RequestError:
-                        pass
-            except Exception:
-                pass
+        capture = AudioCapture()
+        spotter = load_spotter()
+        try:
+            # The recognizer is only needed when no keyword has been enrolled
+            recognizer = None if spotter else create_recognizer()
+            capture.start()
+        except Exception as e:
+            # No microphone or no speech model: say so rather than exiting silently
+            print(f"Hotword listener could not start: {e}", file=sys.stderr)
+            capture.stop()
+            return
+        try:
+            if spotter:
+                reader = capture.reader()
+                for seq, frame in reader.frames(timeout=0.5):
+                    if not self.is_running:
+                        break
+                    if spotter.process(seq, frame, capture.ring.frame_energy(seq)) is not None:
+                        self.launch_jarvis()
+            else:
+                # One open stream for the life of the service; phrases are limited to ~5 s
+                transcriber = StreamingTranscriber(capture, recognizer, VoiceActivityDetector(max_frames=167),
+                                                   on_final=self.handle_final)
+                transcriber.run(lambda: not self.is_running)
+        finally:
+            capture.stop()
+
+    def handle_final(self, text, start, end):
+        if text.strip().lower().startswith("hey jarvis"):
+            self.launch_jarvis()
+
+    def launch_jarvis(self):
+        try:
+            assistant_daemon.activate()
+        except (OSError, ValueError) as e:
+            # Refused or timed-out connections, a failed launch or a garbled reply
+            print(f"Could not activate Jarvis: {e}", file=sys.stderr)
+
+if win32serviceutil is not None:
+    class JarvisHotwordService(win32serviceutil.ServiceFramework):
+        _svc_name_ = "JarvisHotwordService"
+        _svc_display_name_ = "Jarvis Hotword Listener Service"
+        _svc_description_ = "Listens for 'Hey Jarvis' and launches the Jarvis assistant."
+
+        def __init__(self, args):
+            win32serviceutil.ServiceFramework.__init__(self, args)
+            self.hWaitStop = win32event.CreateEvent(None, 0, 0, None)
+            self.listener = HotwordListener()
+
+        def SvcStop(self):
+            self.ReportServiceStatus(win32service.SERVICE_STOP_PENDING)
+            self.listener.stop()
+            win32event.SetEvent(self.hWaitStop)
 
-    def is_jarvis_running(self):
-        # Check if main.py is already running
-        import psutil
-        for proc in psutil.process_iter(['pid', 'name', 'cmdline']):
-            try:
-                if 'main.py' in proc.info['cmdline']:
-                    return True
-            except Exception:
-                continue
-        return False
+        def SvcDoRun(self):
+            servicemanager.LogMsg(servicemanager.EVENTLOG_INFORMATION_TYPE,
+                                  servicemanager.PYS_SERVICE_STARTED,
+                                  (self._svc_name_, ""))
+            self.listener.main()
 
 if __name__ == '__main__':
-    if len(sys.argv) == 1:
+    if win32serviceutil is None:
+        # Linux/macOS: run in the foreground (e.g. from a systemd user unit)
+        listener = HotwordListener()
+        signal.signal(signal.SIGTERM, lambda signum, frame: listener.stop())
+        try:
+            listener.main()
+        except KeyboardInterrupt:
+            pass
+    elif len(sys.argv) == 1:
         servicemanager.Initialize()
         servicemanager.PrepareToHostSingle(JarvisHotwordService)
         servicemanager.StartServiceCtrlDispatcher()
     else:
-        win32serviceutil.HandleCommandLine(JarvisHotwordService) 
\ No newline at end of file
+        win32serviceutil.HandleCommandLine(JarvisHotwordService)
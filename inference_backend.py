@@ -0,0 +1,310 @@
+import os
+import sys
+import json
+import time
+import argparse
+import subprocess
+from startup_profiler import profiler
+
+# How DialoGPT is run on the CPU:
+#   eager  - the fp32 PyTorch model as downloaded
+#   int8   - the same model with its Linear layers dynamically quantized to int8
+#   onnx   - an exported ONNX graph run by onnxruntime (needs optimum[onnxruntime])
+BACKENDS = ("eager", "int8", "onnx")
+DEFAULT_MODEL = "microsoft/DialoGPT-small"
+ONNX_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'models', 'onnx')
+
+# Generation caps: DialoGPT replies are a sentence or two, and the old
+# max_length=1000 let a bad sample run for hundreds of tokens
+MAX_NEW_TOKENS = 64
+MAX_INPUT_TOKENS = 256
+
+BENCH_PROMPTS = [
+    "Hello, how are you today?",
+    "What do you like to do on weekends?",
+    "Can you recommend a good book?",
+    "What is the best way to learn a new language?",
+    "Tell me something interesting about space.",
+    "How do I make a good cup of coffee?",
+    "What's your favourite kind of music?",
+    "Do you think it will rain tomorrow?",
+]
+
+def default_threads():
+    # Physical cores: hyper-threads only add contention for GEMM-heavy work
+    try:
+        import psutil
+        cores = psutil.cpu_count(logical=False)
+    except ImportError:
+        cores = None
+    return cores or os.cpu_count() or 1
+
+def configure_threads(threads=None):
+    import torch
+    threads = threads or default_threads()
+    torch.set_num_threads(threads)
+    try:
+        # One generate() call at a time; inter-op parallelism only adds threads
+        torch.set_num_interop_threads(1)
+    except RuntimeError:
+        # Can only be set before the first parallel op; keep whatever is in place
+        pass
+    return threads
+
+def _conv1d_to_linear(model):
+    # GPT-2 style models use transformers' Conv1D (a Linear with a transposed
+    # weight), which quantize_dynamic does not recognise; swap in nn.Linear
+    import torch
+    from transformers.pytorch_utils import Conv1D
+    for parent in list(model.modules()):
+        for name, child in list(parent.named_children()):
+            if isinstance(child, Conv1D):
+                in_features, out_features = child.weight.shape
+                linear = torch.nn.Linear(in_features, out_features)
+                linear.weight.data = child.weight.data.t().contiguous()
+                linear.bias.data = child.bias.data
+                setattr(parent, name, linear)
+    return model
+
+def load_backend(model_name=DEFAULT_MODEL, backend="eager", threads=None):
+    # Returns (tokenizer, model); every model supports generate() with a streamer
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown inference backend: {backend}")
+    with profiler.phase("import torch"):
+        import torch
+    with profiler.phase("import transformers"):
+        from transformers import AutoModelForCausalLM, AutoTokenizer
+    threads = configure_threads(threads)
+    with profiler.phase("load tokenizer"):
+        tokenizer = AutoTokenizer.from_pretrained(model_name)
+    if backend == "onnx":
+        with profiler.phase("load onnx model"):
+            model = _load_onnx(model_name, threads)
+        return tokenizer, model
+    with profiler.phase("load model"):
+        model = AutoModelForCausalLM.from_pretrained(model_name)
+        model.eval()
+    if backend == "int8":
+        with profiler.phase("quantize model"):
+            model = torch.quantization.quantize_dynamic(
+                _conv1d_to_linear(model), {torch.nn.Linear}, dtype=torch.qint8)
+    return tokenizer, model
+
+def _load_onnx(model_name, threads):
+    try:
+        import onnxruntime
+        from optimum.onnxruntime import ORTModelForCausalLM
+    except ImportError:
+        raise RuntimeError("The onnx backend needs optimum[onnxruntime] "
+                           "(pip install optimum[onnxruntime])")
+    options = onnxruntime.SessionOptions()
+    options.intra_op_num_threads = threads
+    options.inter_op_num_threads = 1
+    options.graph_optimization_level = onnxruntime.GraphOptimizationLevel.ORT_ENABLE_ALL
+    export_dir = os.path.join(ONNX_DIR, model_name.replace("/", "--"))
+    if os.path.isdir(export_dir):
+        return ORTModelForCausalLM.from_pretrained(export_dir, session_options=options, use_cache=True)
+    # Exported once and kept next to the speech models
+    model = ORTModelForCausalLM.from_pretrained(model_name, export=True, use_cache=True,
+                                                session_options=options)
+    model.save_pretrained(export_dir)
+    return model
+
+def decode_turn(model, tokenizer, dialogue, query, emit, should_stop, max_new_tokens=MAX_NEW_TOKENS,
+                keep=None):
+    # One DialoGPT turn on top of dialogue's cached keys/values, sampling
+    # token by token and emitting the new text as it decodes
+    import torch
+    from transformers import (LogitsProcessorList, NoRepeatNGramLogitsProcessor,
+                              TemperatureLogitsWarper, TopKLogitsWarper, TopPLogitsWarper)
+    processors = LogitsProcessorList([
+        NoRepeatNGramLogitsProcessor(3),
+        TemperatureLogitsWarper(0.8),
+        TopKLogitsWarper(100),
+        TopPLogitsWarper(0.7),
+    ])
+    eos = tokenizer.eos_token_id
+    epoch = dialogue.epoch
+    dialogue.tokenize_pending(tokenizer)
+    # A pasted paragraph is clipped from the left so it cannot blow up the window
+    query_ids = tokenizer.encode(query + tokenizer.eos_token)[-MAX_INPUT_TOKENS:]
+    dialogue.make_room(len(query_ids) + max_new_tokens + 1)
+    past = dialogue.past
+    cached = dialogue.cached
+    feed = dialogue.uncached(query_ids)
+    # Repeated 3-grams are only banned within this exchange, not against
+    # everything said earlier in the conversation
+    turn_ids = list(query_ids)
+    reply = []
+    text = ""
+    try:
+        with torch.inference_mode():
+            while len(reply) < max_new_tokens and not should_stop():
+                input_ids = torch.tensor([feed])
+                positions = torch.arange(cached, cached + len(feed)).unsqueeze(0)
+                out = model(input_ids=input_ids, past_key_values=past, use_cache=True,
+                            attention_mask=torch.ones((1, cached + len(feed)), dtype=torch.long),
+                            position_ids=positions)
+                past = out.past_key_values
+                cached += len(feed)
+                scores = processors(torch.tensor([turn_ids]), out.logits[:, -1, :].float())
+                token = int(torch.multinomial(torch.softmax(scores, dim=-1), 1))
+                if token == eos:
+                    break
+                reply.append(token)
+                turn_ids.append(token)
+                feed = [token]
+                # Decode the whole reply so far and emit the new part; a
+                # multi-byte character split across tokens waits for its rest
+                decoded = tokenizer.decode(reply, skip_special_tokens=True)
+                if decoded.startswith(text) and not decoded.endswith("\ufffd"):
+                    emit(decoded[len(text):])
+                    text = decoded
+    except Exception:
+        # The cache may be half-extended; rebuild it from the window next turn
+        dialogue.reset_cache()
+        raise
+    if keep is not None and not keep():
+        # Discarded by the caller; the cache already holds this turn's
+        # tokens, so it is rebuilt from the window next time
+        dialogue.reset_cache()
+        return
+    # Interrupted replies are kept too: the user heard that much of it
+    dialogue.commit(query_ids + reply + [eos], past, cached, epoch)
+
+def _peak_rss_mb():
+    try:
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # kilobytes on Linux, bytes on macOS
+        return peak / (1024.0 * 1024.0) if sys.platform == "darwin" else peak / 1024.0
+    except ImportError:
+        import psutil
+        info = psutil.Process().memory_info()
+        return getattr(info, "peak_wset", info.rss) / (1024.0 * 1024.0)
+
+def _percentile(values, p):
+    values = sorted(values)
+    if not values:
+        return None
+    k = (len(values) - 1) * p / 100.0
+    lo = int(k)
+    hi = min(lo + 1, len(values) - 1)
+    return values[lo] + (values[hi] - values[lo]) * (k - lo)
+
+def run_benchmark(backend, model_name=DEFAULT_MODEL, threads=None, rounds=2,
+                  max_new_tokens=MAX_NEW_TOKENS):
+    # Measures one backend in this process. Greedy decoding with a fixed
+    # number of new tokens so every backend does the same amount of work.
+    start = time.perf_counter()
+    tokenizer, model = load_backend(model_name, backend, threads)
+    load_seconds = time.perf_counter() - start
+    import torch
+    latencies = []
+    tokens = 0
+    generate_seconds = 0.0
+    # One untimed reply so lazy initialisation does not count against the first prompt
+    prompts = BENCH_PROMPTS[:1] + BENCH_PROMPTS * rounds
+    for i, prompt in enumerate(prompts):
+        input_ids = tokenizer.encode(prompt + tokenizer.eos_token, return_tensors='pt')
+        started = time.perf_counter()
+        with torch.inference_mode():
+            output = model.generate(input_ids=input_ids, attention_mask=torch.ones_like(input_ids),
+                                    max_new_tokens=max_new_tokens, min_new_tokens=max_new_tokens,
+                                    do_sample=False, pad_token_id=tokenizer.eos_token_id)
+        elapsed = time.perf_counter() - started
+        if i == 0:
+            continue
+        latencies.append(elapsed * 1000)
+        tokens += output.shape[1] - input_ids.shape[1]
+        generate_seconds += elapsed
+    return {
+        "backend": backend,
+        "threads": torch.get_num_threads(),
+        "load_seconds": load_seconds,
+        "replies": len(latencies),
+        "tokens_per_second": tokens / generate_seconds if generate_seconds else None,
+        "p50_ms": _percentile(latencies, 50),
+        "p95_ms": _percentile(latencies, 95),
+        "peak_rss_mb": _peak_rss_mb(),
+    }
+
+def benchmark_turns(backend="eager", turns=24, threads=None, max_new_tokens=MAX_NEW_TOKENS):
+    # Per-turn latency of one long conversation through NLPProcessor, to check
+    # that the cached context keeps it flat as the history grows
+    from nlp_processor import NLPProcessor
+    nlp = NLPProcessor(lazy=False, kb_path=":memory:", backend=backend, threads=threads,
+                       max_new_tokens=max_new_tokens)
+    results = []
+    for i in range(turns):
+        prompt = BENCH_PROMPTS[i % len(BENCH_PROMPTS)]
+        started = time.perf_counter()
+        reply = "".join(nlp._stream_model(prompt))
+        results.append({"turn": i + 1, "ms": (time.perf_counter() - started) * 1000,
+                        "context_tokens": len(nlp.dialogue), "evictions": nlp.dialogue.evictions,
+                        "reply": reply})
+    return results
+
+def benchmark(backends=BACKENDS, model_name=DEFAULT_MODEL, threads=None, rounds=2,
+              max_new_tokens=MAX_NEW_TOKENS):
+    # Each backend runs in a fresh interpreter so load time and peak RSS are
+    # not skewed by whatever the previous backend left in memory
+    results = []
+    for backend in backends:
+        command = [sys.executable, os.path.abspath(__file__), "_run", backend,
+                   "--model", model_name, "--rounds", str(rounds),
+                   "--max-new-tokens", str(max_new_tokens)]
+        if threads:
+            command += ["--threads", str(threads)]
+        proc = subprocess.run(command, capture_output=True, text=True)
+        if proc.returncode != 0:
+            lines = proc.stderr.strip().splitlines()
+            results.append({"backend": backend, "error": lines[-1] if lines else "failed"})
+            continue
+        results.append(json.loads(proc.stdout.strip().splitlines()[-1]))
+    return results
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compare CPU inference backends for the responder")
+    sub = parser.add_subparsers(dest="command", required=True)
+    bench = sub.add_parser("bench", help="load time, tokens/s, reply latency and peak RSS per backend")
+    bench.add_argument("--backends", nargs="+", default=list(BACKENDS), choices=BACKENDS)
+    bench.add_argument("--json", action="store_true", help="print results as JSON")
+    turns = sub.add_parser("turns", help="per-turn latency over one long conversation")
+    turns.add_argument("--backend", default="eager", choices=BACKENDS)
+    turns.add_argument("--turns", type=int, default=24)
+    turns.add_argument("--threads", type=int, default=None)
+    turns.add_argument("--max-new-tokens", type=int, default=MAX_NEW_TOKENS)
+    # Internal: measure one backend in this process
+    run = sub.add_parser("_run")
+    run.add_argument("backend", choices=BACKENDS)
+    for p in (bench, run):
+        p.add_argument("--model", default=DEFAULT_MODEL)
+        p.add_argument("--threads", type=int, default=None)
+        p.add_argument("--rounds", type=int, default=2, help="passes over the prompt set")
+        p.add_argument("--max-new-tokens", type=int, default=MAX_NEW_TOKENS)
+    args = parser.parse_args(argv)
+
+    if args.command == "turns":
+        for r in benchmark_turns(args.backend, args.turns, args.threads, args.max_new_tokens):
+            print(f"turn {r['turn']:>3}: {r['ms']:6.0f} ms, {r['context_tokens']:>4} context tokens, "
+                  f"{r['evictions']} evictions")
+        return
+    if args.command == "_run":
+        print(json.dumps(run_benchmark(args.backend, args.model, args.threads, args.rounds,
+                                       args.max_new_tokens)))
+        return
+    results = benchmark(args.backends, args.model, args.threads, args.rounds, args.max_new_tokens)
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    for r in results:
+        if "error" in r:
+            print(f"{r['backend']:>6}: {r['error']}")
+            continue
+        print(f"{r['backend']:>6}: load {r['load_seconds']:.1f}s, {r['tokens_per_second']:.1f} tokens/s, "
+              f"reply p50 {r['p50_ms']:.0f} ms / p95 {r['p95_ms']:.0f} ms, "
+              f"peak RSS {r['peak_rss_mb']:.0f} MB ({r['threads']} threads)")
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,190 @@
+import re
+import sys
+import time
+import random
+import argparse
+
+# Words dropped from the front of an utterance before routing
+LEADING_FILLER = ("jarvis", "hey jarvis", "ok jarvis", "please", "can you", "could you",
+                  "would you", "will you", "i want you to", "i'd like you to")
+TRAILING_FILLER = ("please", "for me", "now", "jarvis")
+
+# Dots go ("a.m." -> "am") except between digits ("3.5")
+_DOTS = re.compile(r"(?<!\d)\.|\.(?!\d)")
+# Keeps ":" in times, "-" or "/" between digits in dates and decimal points
+_PUNCTUATION = re.compile(r"[^\w\s'.:/-]+|(?<!\d)[/-]|[/-](?!\d)")
+_SPACES = re.compile(r"\s+")
+# Longest alternatives first so "hey jarvis" is removed as a whole
+_LEADING = re.compile(r"^(?:(?:%s)(?:\s+|$))+" % "|".join(
+    re.escape(w) for w in sorted(LEADING_FILLER, key=len, reverse=True)))
+_TRAILING = re.compile(r"(?:\s+(?:%s))+$" % "|".join(
+    re.escape(w) for w in sorted(TRAILING_FILLER, key=len, reverse=True)))
+
+def normalize(text):
+    text = _PUNCTUATION.sub(" ", _DOTS.sub("", text.lower()))
+    text = _SPACES.sub(" ", text).strip()
+    text = _LEADING.sub("", text)
+    return _TRAILING.sub("", text)
+
+def _compile_pattern(pattern, prefix, slot_patterns=None):
+    # "(set|add) [a] reminder {text} at {time}" ->
+    # "(?:set|add)(?:\s+a)?\s+reminder\s+(?P<_3_text>\S.*?)\s+at\s+(?P<_3_time>\S.*)"
+    # {slot} captures one or more words; the last slot in a pattern is greedy.
+    # slot_patterns maps a slot name to a regex of its own (no capturing groups).
+    slot_patterns = slot_patterns or {}
+    tokens = re.findall(r"\[[^\]]+\]|\([^)]+\)|\{\w+\}|[^\s\[\](){}]+", pattern)
+    slots = [t[1:-1] for t in tokens if t.startswith("{")]
+    parts = []
+    first = True
+    for token in tokens:
+        optional = token.startswith("[")
+        if optional:
+            token = token[1:-1]
+        if token.startswith("{"):
+            name = token[1:-1]
+            lazy = "?" if name != slots[-1] else ""
+            slot = slot_patterns.get(name, "\\S.*" + lazy)
+            body = f"(?P<{prefix}{name}>{slot})"
+        elif token.startswith("(") or "|" in token:
+            words = token[1:-1] if token.startswith("(") else token
+            body = "(?:" + "|".join(re.escape(a.strip()) for a in words.split("|")) + ")"
+        else:
+            body = re.escape(token)
+        if first:
+            # An optional leading word carries its own separator
+            parts.append(f"(?:{body}\\s+)?" if optional else body)
+            first = optional
+        else:
+            parts.append(f"(?:\\s+{body})?" if optional else f"\\s+{body}")
+    return "".join(parts), slots
+
+class IntentMatch:
+    def __init__(self, name, handler, slots, text):
+        self.name = name
+        self.handler = handler
+        self.slots = slots
+        self.text = text
+
+class IntentRouter:
+    # Intents register patterns with slots; all of them are compiled into one
+    # anchored alternation so routing is a single regex match, and slots come
+    # out of the same match. Earlier registrations win ties.
+    def __init__(self):
+        self.intents = []
+        self._regex = None
+        self._groups = {}
+
+    def register(self, name, patterns, handler, slots=None):
+        if isinstance(patterns, str):
+            patterns = [patterns]
+        self.intents.append((name, list(patterns), handler, slots))
+        self._regex = None
+
+    def route(self, name, *patterns):
+        # Decorator form of register()
+        def decorator(handler):
+            self.register(name, patterns, handler)
+            return handler
+        return decorator
+
+    def compile(self):
+        alternatives = []
+        self._groups = {}
+        index = 0
+        for name, patterns, handler, slot_patterns in self.intents:
+            for pattern in patterns:
+                group = f"_{index}"
+                body, slots = _compile_pattern(pattern, group + "_", slot_patterns)
+                alternatives.append(f"(?P<{group}>{body})")
+                self._groups[group] = (name, handler, slots)
+                index += 1
+        self._regex = re.compile("^(?:" + "|".join(alternatives) + ")$")
+        return self
+
+    def match(self, text, normalized=False):
+        if self._regex is None:
+            self.compile()
+        if not normalized:
+            text = normalize(text)
+        m = self._regex.match(text)
+        if not m:
+            return None
+        # The outer group of the matching alternative closes last
+        group = m.lastgroup
+        name, handler, slots = self._groups[group]
+        return IntentMatch(name, handler, {slot: m.group(f"{group}_{slot}") for slot in slots}, text)
+
+def _legacy_route(text):
+    # The substring chain this router replaced, kept only for the benchmark
+    text = text.lower()
+    if "open" in text:
+        return "open_app"
+    elif "time" in text:
+        return "time"
+    elif "date" in text:
+        return "date"
+    elif "set reminder" in text:
+        return "set_reminder"
+    elif "list reminders" in text:
+        return "list_reminders"
+    elif "exit" in text or "quit" in text:
+        return "exit"
+    elif "hello" in text or "hi" in text:
+        return "greeting"
+    elif "thank you" in text or "thanks" in text:
+        return "thanks"
+    elif "google search" in text:
+        return "google_search"
+    return None
+
+BENCH_UTTERANCES = [
+    ("open firefox", "open_app"),
+    ("jarvis open visual studio code", "open_app"),
+    ("what time is it", "time"),
+    ("what's today's date", "date"),
+    ("set reminder call mom at 3:00 pm", "set_reminder"),
+    ("remind me to water the plants at 6:30 pm", "set_reminder"),
+    ("list reminders", "list_reminders"),
+    ("hello", "greeting"),
+    ("thank you very much", "thanks"),
+    ("google search weather in paris", "google_search"),
+    ("what is this thing", None),
+    ("tell me about the history of time travel movies", None),
+    ("who wrote the opening chapter of that book", None),
+    ("is it a good day to go hiking", None),
+]
+
+def benchmark(router, count=100000, seed=0):
+    rng = random.Random(seed)
+    corpus = [rng.choice(BENCH_UTTERANCES) for _ in range(count)]
+    start = time.perf_counter()
+    routed = [router.match(text) for text, _ in corpus]
+    elapsed = time.perf_counter() - start
+    correct = sum(1 for (text, want), got in zip(corpus, routed) if (got.name if got else None) == want)
+    start = time.perf_counter()
+    legacy = [_legacy_route(text) for text, _ in corpus]
+    legacy_elapsed = time.perf_counter() - start
+    legacy_correct = sum(1 for (text, want), got in zip(corpus, legacy) if got == want)
+    return {
+        "utterances": count,
+        "router_per_second": count / elapsed,
+        "router_us_per_utterance": elapsed / count * 1e6,
+        "router_accuracy": correct / count,
+        "legacy_per_second": count / legacy_elapsed,
+        "legacy_accuracy": legacy_correct / count,
+    }
+
+def main(argv=None):
+    from commands import CommandProcessor
+    parser = argparse.ArgumentParser(description="Benchmark intent routing throughput")
+    parser.add_argument("--count", type=int, default=100000)
+    args = parser.parse_args(argv)
+    router = CommandProcessor(None, None).router
+    r = benchmark(router, args.count)
+    print(f"router: {r['router_per_second']:,.0f} utterances/s "
+          f"({r['router_us_per_utterance']:.1f} us each), accuracy {r['router_accuracy']:.1%}")
+    print(f"legacy substring chain: {r['legacy_per_second']:,.0f} utterances/s, "
+          f"accuracy {r['legacy_accuracy']:.1%}")
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,483 @@
+import re
+import sys
+import math
+import time
+import random
+import argparse
+import threading
+import numpy as np
+from intent_router import normalize as strip_filler
+
+# Spoken and typed forms of the same question should share a key
+CONTRACTIONS = {
+    "what's": "what is", "whats": "what is", "who's": "who is", "whos": "who is",
+    "where's": "where is", "wheres": "where is", "how's": "how is", "when's": "when is",
+    "it's": "it is", "that's": "that is", "there's": "there is", "you're": "you are",
+    "youre": "you are", "i'm": "i am", "im": "i am", "don't": "do not", "dont": "do not",
+    "doesn't": "does not", "can't": "can not", "cannot": "can not", "won't": "will not",
+    "isn't": "is not", "aren't": "are not", "didn't": "did not", "what're": "what are",
+    "who're": "who are", "u": "you", "ur": "your", "r": "are",
+}
+# Words that change how a question is asked, not what it is about
+QUESTION_WORDS = {"a", "an", "the", "is", "are", "was", "were", "what", "tell", "me", "do", "you",
+                  "know", "can", "could", "would", "give", "say", "about", "please"}
+_WORD = re.compile(r"[a-z0-9]+(?:'[a-z]+)?")
+
+def _singular(word):
+    # Crude plural folding ("movies" / "movie", "cities" / "city"); it only
+    # has to map both forms to the same key, not produce a real word
+    if len(word) <= 3 or not word.endswith("s") or word.endswith(("ss", "us", "is")):
+        return word
+    if word.endswith("ies") and len(word) > 4:
+        return word[:-3] + "y"
+    return word[:-1]
+
+def normalize_query(text):
+    words = _WORD.findall(strip_filler(text))
+    words = " ".join(CONTRACTIONS.get(w, w) for w in words).replace("'", "").split()
+    return " ".join(_singular(w) for w in words)
+
+def _one_edit(a, b):
+    # True if b is a with at most one letter inserted, removed or changed
+    if abs(len(a) - len(b)) > 1:
+        return False
+    if len(a) > len(b):
+        a, b = b, a
+    i = 0
+    while i < len(a) and a[i] == b[i]:
+        i += 1
+    return a[i + (len(a) == len(b)):] == b[i + 1:]
+
+def same_content(a, b):
+    # Similar character n-grams are not enough when two questions share a
+    # template and differ in one short name ("population of belmi" / "of
+    # belpe"): apart from question words, every word of one normalized query
+    # must appear in the other, or be a one-letter typo of a word there
+    left = set(a.split()) - QUESTION_WORDS
+    right = set(b.split()) - QUESTION_WORDS
+    only_left = sorted(left - right)
+    only_right = sorted(right - left)
+    if len(only_left) != len(only_right):
+        return False
+    for word in only_left:
+        match = next((w for w in only_right if min(len(w), len(word)) >= 5 and _one_edit(word, w)), None)
+        if match is None:
+            return False
+        only_right.remove(match)
+    return True
+
+def features(normalized, n=3):
+    # Character n-grams inside word boundaries ("what" -> " wh", "wha", "hat",
+    # "at ") catch spelling and inflection variants; whole words are added as
+    # features too so one differing content word ("france" / "spain") costs
+    # more than a shared prefix gains
+    grams = []
+    for word in normalized.split():
+        padded = f" {word} "
+        grams.extend(padded[i:i + n] for i in range(max(1, len(padded) - n + 1)))
+        grams.append("w:" + word)
+    return grams
+
+class QueryIndex:
+    # TF-IDF cosine similarity over stored queries, in NumPy.
+    #
+    # Postings (gram, doc, tf) live in two parts: a frozen part kept twice,
+    # sorted by gram (inverted) and by document (forward), and a small tail
+    # of recent additions in insertion order. A lookup first gathers the
+    # postings of the query's rarer grams to pick a few candidates (common
+    # grams like "wha" would touch most of the index and rank nothing), then
+    # scores those candidates exactly over all their grams. IDF comes live
+    # from document frequencies. Removals are tombstones until enough pile
+    # up to compact the arrays.
+    def __init__(self, threshold=0.85, merge_every=512, candidates=64, common_df=0.02):
+        self.threshold = threshold
+        self.merge_every = merge_every
+        self.candidates = candidates
+        self.common_df = common_df
+        self.lock = threading.RLock()
+        self.vocab = {}
+        self.df = np.zeros(1024, dtype=np.float32)
+        self.keys = []           # doc id -> stored query
+        self.doc_ids = {}        # stored query -> doc id
+        self.exact = {}          # normalized query -> doc id
+        self.normalized = []     # doc id -> normalized query
+        self.alive = np.zeros(1024, dtype=bool)
+        self.norms = np.ones(1024, dtype=np.float32)
+        self.dead = 0
+        self.refreshed = 0
+        # Frozen postings: inverted (by gram) and forward (by doc)
+        self.frozen = 0
+        self.gram_offsets = np.zeros(1, dtype=np.int64)
+        self.inv_doc = np.zeros(0, dtype=np.int32)
+        self.inv_tf = np.zeros(0, dtype=np.float32)
+        self.doc_offsets = np.zeros(1, dtype=np.int64)
+        self.fwd_gram = np.zeros(0, dtype=np.int32)
+        self.fwd_tf = np.zeros(0, dtype=np.float32)
+        # Tail postings, in insertion order
+        self.tail_gram = []
+        self.tail_doc = []
+        self.tail_tf = []
+        self._tail_arrays = None
+
+    def __len__(self):
+        return len(self.doc_ids)
+
+    def _gram_ids(self, grams, grow):
+        counts = {}
+        for gram in grams:
+            gid = self.vocab.get(gram)
+            if gid is None:
+                if not grow:
+                    continue
+                gid = self.vocab[gram] = len(self.vocab)
+            counts[gid] = counts.get(gid, 0) + 1
+        # Sublinear term frequency
+        return list(counts), [1.0 + math.log(c) for c in counts.values()]
+
+    def _idf(self, ids=None):
+        n = max(1, len(self.keys) - self.dead)
+        df = self.df[:len(self.vocab)] if ids is None else self.df[ids]
+        return np.log((1.0 + n) / (1.0 + df)) + 1.0
+
+    @staticmethod
+    def _grow(array, size, fill):
+        if size <= len(array):
+            return array
+        grown = np.full(max(size, 2 * len(array)), fill, dtype=array.dtype)
+        grown[:len(array)] = array
+        return grown
+
+    @staticmethod
+    def _offsets(counts):
+        offsets = np.zeros(len(counts) + 1, dtype=np.int64)
+        np.cumsum(counts, out=offsets[1:])
+        return offsets
+
+    def _append(self, key):
+        normalized = normalize_query(key)
+        ids, tf = self._gram_ids(features(normalized), grow=True)
+        doc = len(self.keys)
+        self.keys.append(key)
+        self.normalized.append(normalized)
+        self.doc_ids[key] = doc
+        self.exact.setdefault(normalized, doc)
+        self.alive = self._grow(self.alive, doc + 1, False)
+        self.alive[doc] = True
+        self.tail_gram.extend(ids)
+        self.tail_doc.extend([doc] * len(ids))
+        self.tail_tf.extend(tf)
+        self._tail_arrays = None
+        return doc, ids, tf
+
+    def add(self, key):
+        with self.lock:
+            if key in self.doc_ids:
+                return self.doc_ids[key]
+            doc, ids, tf = self._append(key)
+            self.df = self._grow(self.df, len(self.vocab), 0.0)
+            self.df[ids] += 1
+            self.norms = self._grow(self.norms, doc + 1, 1.0)
+            self.norms[doc] = max(float(np.linalg.norm(np.asarray(tf) * self._idf(ids))), 1e-6)
+            if len(self.keys) - self.frozen >= self.merge_every:
+                self.merge()
+            return doc
+
+    def add_many(self, keys):
+        # Bulk load: frequencies and norms are computed once, at the end
+        with self.lock:
+            for key in keys:
+                if key not in self.doc_ids:
+                    self._append(key)
+            self.merge(refresh=True)
+
+    def remove(self, key):
+        with self.lock:
+            doc = self.doc_ids.pop(key, None)
+            if doc is None:
+                return
+            self.alive[doc] = False
+            self.dead += 1
+            normalized = self.normalized[doc]
+            if self.exact.get(normalized) == doc:
+                del self.exact[normalized]
+            if self.dead > max(self.merge_every, len(self.doc_ids) // 4):
+                self.merge()
+
+    def merge(self, refresh=False):
+        # Fold the tail into the frozen postings without re-sorting them:
+        # tail documents have the highest ids, so their postings go at the end
+        # of the forward arrays and at the end of each gram's run in the
+        # inverted ones
+        with self.lock:
+            tail_gram, tail_doc, tail_tf = self._tail()
+            self.tail_gram, self.tail_doc, self.tail_tf = [], [], []
+            self._tail_arrays = None
+            count = len(self.keys)
+            per_doc = np.bincount(tail_doc - self.frozen, minlength=count - self.frozen)
+            self.doc_offsets = np.concatenate([self.doc_offsets, self.doc_offsets[-1] + np.cumsum(per_doc)])
+            self.fwd_gram = np.concatenate([self.fwd_gram, tail_gram])
+            self.fwd_tf = np.concatenate([self.fwd_tf, tail_tf])
+            order = np.argsort(tail_gram, kind="stable")
+            known = len(self.gram_offsets) - 1
+            # Grams first seen in the tail sort after all known ones
+            at = self.gram_offsets[np.minimum(tail_gram[order] + 1, known)]
+            self.inv_doc = np.insert(self.inv_doc, at, tail_doc[order])
+            self.inv_tf = np.insert(self.inv_tf, at, tail_tf[order])
+            per_gram = np.bincount(tail_gram, minlength=len(self.vocab))
+            per_gram[:known] += np.diff(self.gram_offsets)
+            self.gram_offsets = self._offsets(per_gram)
+            self.frozen = count
+            if self.dead:
+                self._compact()
+                refresh = True
+            # Norms of older documents drift as IDF changes; refresh them
+            # whenever the index has grown by a quarter
+            if refresh or len(self.keys) >= 1.25 * self.refreshed:
+                self._refresh()
+
+    def _compact(self):
+        # Drop removed documents and renumber the rest
+        count = len(self.keys)
+        keep = self.alive[:count]
+        remap = (np.cumsum(keep) - 1).astype(np.int32)
+        inv_gram = np.repeat(np.arange(len(self.gram_offsets) - 1, dtype=np.int32), np.diff(self.gram_offsets))
+        live = keep[self.inv_doc]
+        self.inv_doc = remap[self.inv_doc[live]]
+        self.inv_tf = self.inv_tf[live]
+        self.gram_offsets = self._offsets(np.bincount(inv_gram[live], minlength=len(self.vocab)))
+        per_doc = np.diff(self.doc_offsets)
+        live = np.repeat(keep, per_doc)
+        self.fwd_gram = self.fwd_gram[live]
+        self.fwd_tf = self.fwd_tf[live]
+        self.doc_offsets = self._offsets(per_doc[keep])
+        self.keys = [k for k, a in zip(self.keys, keep) if a]
+        self.normalized = [q for q, a in zip(self.normalized, keep) if a]
+        self.doc_ids = {k: i for i, k in enumerate(self.keys)}
+        self.exact = {}
+        for i, q in enumerate(self.normalized):
+            self.exact.setdefault(q, i)
+        count = self.frozen = len(self.keys)
+        self.alive = np.zeros(max(count, 1024), dtype=bool)
+        self.alive[:count] = True
+        self.dead = 0
+
+    def _refresh(self):
+        # Every frozen posting belongs to a live document here
+        count = self.refreshed = len(self.keys)
+        self.df = self._grow(np.diff(self.gram_offsets).astype(np.float32), 1024, 0.0)
+        docs = np.repeat(np.arange(count, dtype=np.int32), np.diff(self.doc_offsets))
+        weights = (self.fwd_tf * self._idf()[self.fwd_gram]) ** 2
+        norms = np.sqrt(np.bincount(docs, weights=weights, minlength=count))
+        self.norms = self._grow(np.maximum(norms, 1e-6).astype(np.float32), 1024, 1.0)
+
+    def _tail(self):
+        if self._tail_arrays is None:
+            self._tail_arrays = (np.asarray(self.tail_gram, dtype=np.int32),
+                                 np.asarray(self.tail_doc, dtype=np.int32),
+                                 np.asarray(self.tail_tf, dtype=np.float32))
+        return self._tail_arrays
+
+    @staticmethod
+    def _slices(offsets, rows):
+        # Indices of offsets[r]:offsets[r + 1] for every r in rows, concatenated
+        starts, ends = offsets[rows], offsets[rows + 1]
+        lengths = ends - starts
+        total = int(lengths.sum())
+        return np.repeat(ends - lengths.cumsum(), lengths) + np.arange(total), lengths
+
+    def search(self, query, k=5):
+        # [(stored query, cosine similarity)] best first
+        normalized = normalize_query(query)
+        with self.lock:
+            count = len(self.keys)
+            if not count:
+                return []
+            doc = self.exact.get(normalized)
+            if doc is not None and k == 1:
+                return [(self.keys[doc], 1.0)]
+            ids, q_tf = self._gram_ids(features(normalized), grow=False)
+            if not ids:
+                return []
+            ids = np.asarray(ids, dtype=np.int32)
+            q_tf = np.asarray(q_tf, dtype=np.float32)
+            q_weight = q_tf * self._idf(ids)
+            q_norm = max(float(np.linalg.norm(q_weight)), 1e-6)
+            # Per-gram query weight times idf, so a posting's contribution is tf * lookup[gram]
+            lookup = np.zeros(len(self.vocab), dtype=np.float32)
+            lookup[ids] = q_weight * self._idf(ids)
+            tail_gram, tail_doc, tail_tf = self._tail()
+
+            # 1. Candidates from the grams that are not in most documents
+            rare = ids[self.df[ids] <= max(self.common_df * count, 2 * self.candidates)]
+            if not len(rare):
+                rare = ids
+            frozen = rare[rare < len(self.gram_offsets) - 1]
+            index, lengths = self._slices(self.gram_offsets, frozen)
+            docs = self.inv_doc[index]
+            contrib = self.inv_tf[index] * np.repeat(lookup[frozen], lengths)
+            if len(tail_gram):
+                rare_mask = np.zeros(len(self.vocab), dtype=bool)
+                rare_mask[rare] = True
+                mask = rare_mask[tail_gram]
+                docs = np.concatenate([docs, tail_doc[mask]])
+                contrib = np.concatenate([contrib, tail_tf[mask] * lookup[tail_gram[mask]]])
+            if not len(docs):
+                return []
+            partial = np.bincount(docs, weights=contrib, minlength=count)[:count]
+            partial[~self.alive[:count]] = 0.0
+            n = min(self.candidates, count)
+            candidates = np.argpartition(-partial, n - 1)[:n]
+            candidates = candidates[partial[candidates] > 0]
+
+            # 2. Exact cosine over every gram of each candidate
+            scores = np.zeros(len(candidates), dtype=np.float64)
+            old = candidates < self.frozen
+            if old.any():
+                index, lengths = self._slices(self.doc_offsets, candidates[old])
+                weights = self.fwd_tf[index] * lookup[self.fwd_gram[index]]
+                rows = np.repeat(np.arange(int(old.sum())), lengths)
+                scores[old] = np.bincount(rows, weights=weights, minlength=int(old.sum()))
+            if (~old).any():
+                new = candidates[~old]
+                mask = np.isin(tail_doc, new)
+                dot = np.bincount(tail_doc[mask], weights=tail_tf[mask] * lookup[tail_gram[mask]],
+                                  minlength=count)
+                scores[~old] = dot[new]
+            scores /= self.norms[candidates] * q_norm
+            order = np.argsort(-scores)[:k]
+            return [(self.keys[candidates[i]], float(scores[i])) for i in order if scores[i] > 0]
+
+    def best(self, query):
+        # The stored query that means the same as query, or None
+        normalized = normalize_query(query)
+        for key, score in self.search(query, k=3):
+            if score < self.threshold:
+                break
+            if same_content(normalized, normalize_query(key)):
+                return key
+        return None
+
+class KnowledgeIndex(QueryIndex):
+    # A QueryIndex that follows a KnowledgeStore: built from its keys on a
+    # background thread, then kept current through the store's listeners
+    def __init__(self, store, threshold=0.85, merge_every=512):
+        super().__init__(threshold, merge_every)
+        self.store = store
+        self.ready = threading.Event()
+        store.add_listener(self._on_change)
+        threading.Thread(target=self._build, name="kb-index", daemon=True).start()
+
+    def _build(self):
+        try:
+            self.add_many(self.store.keys())
+        finally:
+            self.ready.set()
+
+    def _on_change(self, event, query):
+        if event == "put":
+            self.add(query)
+        elif event == "delete":
+            self.remove(query)
+
+    def lookup(self, query):
+        # (stored query, answer) for a near-duplicate, or None
+        if not self.ready.is_set():
+            return None
+        key = self.best(query)
+        if key is None:
+            return None
+        answer = self.store.get(key)
+        if answer is None:
+            # Expired or evicted from the store since it was indexed
+            self.remove(key)
+            return None
+        return key, answer
+
+TOPICS = ["capital of {}", "population of {}", "weather in {}", "history of {}", "currency of {}",
+          "best food in {}", "time zone of {}", "language spoken in {}", "distance to {}",
+          "famous people from {}"]
+TEMPLATES = ["what is the {}", "tell me the {}", "do you know the {}", "{}", "what's the {}"]
+
+def _synthetic_entities(count, rng):
+    syllables = ["ka", "lo", "mi", "ra", "ten", "vor", "sa", "bel", "do", "ni", "qu", "zar",
+                 "pe", "ul", "gra", "fi", "mon", "tes", "ya", "ber"]
+    names = set()
+    while len(names) < count:
+        names.add("".join(rng.choice(syllables) for _ in range(rng.randint(2, 4))))
+    return sorted(names)
+
+def _paraphrase(text, rng):
+    # What a user might say for the same question on another day
+    words = text.split()
+    variants = [
+        lambda: text.replace("what is", "what's") if "what is" in text else "what is " + text,
+        lambda: "jarvis " + text + " please",
+        lambda: text.upper() + "?",
+        lambda: text.replace("the ", "", 1),
+        lambda: " ".join(words[:-1] + [words[-1] + "s"]),
+    ]
+    return rng.choice(variants)()
+
+def benchmark(entries=100000, probes=2000, seed=0, threshold=0.85):
+    rng = random.Random(seed)
+    per_entity = len(TOPICS)
+    entities = _synthetic_entities(entries // per_entity + probes, rng)
+    stored = []
+    for entity in entities[:entries // per_entity]:
+        for topic in TOPICS:
+            stored.append(rng.choice(TEMPLATES).format(topic.format(entity)))
+    index = QueryIndex(threshold)
+    started = time.perf_counter()
+    index.add_many(stored)
+    build = time.perf_counter() - started
+    # Paraphrases of stored questions should hit; the same questions about
+    # entities that were never stored must not
+    known = [(_paraphrase(q, rng), q) for q in rng.sample(stored, probes)]
+    unknown = [rng.choice(TEMPLATES).format(rng.choice(TOPICS).format(e)) for e in entities[-probes:]]
+    latencies = []
+    hits = correct = false_hits = 0
+    for text, want in known:
+        t = time.perf_counter()
+        got = index.best(text)
+        latencies.append((time.perf_counter() - t) * 1000)
+        hits += got is not None
+        correct += got == want
+    for text in unknown:
+        t = time.perf_counter()
+        got = index.best(text)
+        latencies.append((time.perf_counter() - t) * 1000)
+        false_hits += got is not None
+    # Incremental updates land in the tail and are searchable at once
+    started = time.perf_counter()
+    extra = [f"who painted the picture number {i}" for i in range(1000)]
+    for q in extra:
+        index.add(q)
+    add_us = (time.perf_counter() - started) / len(extra) * 1e6
+    latencies.sort()
+    return {
+        "entries": len(index),
+        "build_seconds": build,
+        "hit_rate": hits / len(known),
+        "correct_rate": correct / len(known),
+        "false_hit_rate": false_hits / len(unknown),
+        "p50_ms": latencies[len(latencies) // 2],
+        "p95_ms": latencies[int(len(latencies) * 0.95)],
+        "add_us": add_us,
+        "found_new": index.best("who painted picture number 517") == "who painted the picture number 517",
+    }
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark near-duplicate lookups over cached queries")
+    parser.add_argument("--entries", type=int, default=100000)
+    parser.add_argument("--probes", type=int, default=2000)
+    parser.add_argument("--threshold", type=float, default=0.85)
+    args = parser.parse_args(argv)
+    r = benchmark(args.entries, args.probes, threshold=args.threshold)
+    print(f"{r['entries']:,} entries indexed in {r['build_seconds']:.1f}s")
+    print(f"paraphrases: {r['hit_rate']:.1%} hit, {r['correct_rate']:.1%} matched the right entry")
+    print(f"unseen questions: {r['false_hit_rate']:.1%} false hits")
+    print(f"lookup p50 {r['p50_ms']:.2f} ms, p95 {r['p95_ms']:.2f} ms; "
+          f"incremental add {r['add_us']:.0f} us, searchable immediately: {r['found_new']}")
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,175 @@
+import os
+import json
+import time
+import sqlite3
+import threading
+
+class KnowledgeStore:
+    # SQLite in WAL mode: inserts are single-row upserts, lookups hit the
+    # primary-key index, and a crash can only lose the last uncommitted write
+    # instead of corrupting the whole cache like a rewritten JSON file.
+
+    def __init__(self, path="knowledge_base.db", max_entries=10000, ttl=None,
+                 legacy_json="knowledge_base.json", evict_every=100):
+        self.path = path
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.evict_every = evict_every
+        self.lock = threading.Lock()
+        self.listeners = []
+        self._writes_since_evict = 0
+        # query -> last read time, written to the table in one batch before
+        # eviction (or on close) so a read does not have to write
+        self._accessed = {}
+        self.conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS entries (
+                query TEXT PRIMARY KEY,
+                answer TEXT NOT NULL,
+                created REAL NOT NULL,
+                accessed REAL NOT NULL
+            )""")
+        self.conn.execute("CREATE INDEX IF NOT EXISTS entries_accessed ON entries(accessed)")
+        self.conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+        if legacy_json:
+            self.migrate_json(legacy_json)
+
+    def migrate_json(self, json_path):
+        # One-time import of the old knowledge_base.json cache
+        if not os.path.exists(json_path):
+            return 0
+        key = "migrated:" + os.path.abspath(json_path)
+        with self.lock:
+            if self.conn.execute("SELECT 1 FROM meta WHERE key = ?", (key,)).fetchone():
+                return 0
+            try:
+                with open(json_path, 'r') as f:
+                    data = json.load(f)
+            except (OSError, ValueError) as e:
+                print(f"Could not migrate {json_path}: {e}")
+                data = {}
+            now = time.time()
+            with self.conn:
+                self.conn.execute("BEGIN")
+                self.conn.executemany(
+                    "INSERT OR IGNORE INTO entries (query, answer, created, accessed) VALUES (?, ?, ?, ?)",
+                    [(q, str(a), now, now) for q, a in data.items()])
+                self.conn.execute("INSERT INTO meta (key, value) VALUES (?, ?)", (key, str(now)))
+        return len(data)
+
+    def get(self, query, default=None):
+        now = time.time()
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT answer, created FROM entries WHERE query = ?", (query,)).fetchone()
+            if row is None:
+                return default
+            answer, created = row
+            expired = self.ttl is not None and now - created > self.ttl
+            if expired:
+                self._delete([query])
+            else:
+                self._accessed[query] = now
+        if expired:
+            self._notify("delete", [query])
+            return default
+        return answer
+
+    def put(self, query, answer):
+        now = time.time()
+        with self.lock:
+            self.conn.execute(
+                "INSERT INTO entries (query, answer, created, accessed) VALUES (?, ?, ?, ?) "
+                "ON CONFLICT(query) DO UPDATE SET answer = excluded.answer, "
+                "created = excluded.created, accessed = excluded.accessed",
+                (query, answer, now, now))
+            self._accessed.pop(query, None)
+            removed = []
+            self._writes_since_evict += 1
+            if self._writes_since_evict >= self.evict_every:
+                removed = self._evict(now)
+        self._notify("put", [query])
+        self._notify("delete", removed)
+
+    def delete(self, query):
+        with self.lock:
+            self._delete([query])
+        self._notify("delete", [query])
+
+    def _delete(self, queries):
+        if not queries:
+            return
+        self.conn.executemany("DELETE FROM entries WHERE query = ?", [(q,) for q in queries])
+        for q in queries:
+            self._accessed.pop(q, None)
+
+    def _notify(self, event, queries):
+        # Called without the lock held, so a listener may use the store
+        for listener in self.listeners:
+            for q in queries:
+                listener(event, q)
+
+    def evict(self):
+        with self.lock:
+            removed = self._evict(time.time())
+        self._notify("delete", removed)
+        return len(removed)
+
+    def _flush_accessed(self):
+        self.conn.executemany("UPDATE entries SET accessed = ? WHERE query = ?",
+                              [(t, q) for q, t in self._accessed.items()])
+
+    def _evict(self, now):
+        # Drop expired entries first, then the least recently used ones over
+        # the size limit, in one transaction; returns the removed queries
+        self._writes_since_evict = 0
+        cutoff = now - self.ttl if self.ttl is not None else float("-inf")
+        with self.conn:
+            self.conn.execute("BEGIN")
+            self._flush_accessed()
+            removed = [r[0] for r in self.conn.execute(
+                "SELECT query FROM entries WHERE created < ?", (cutoff,))]
+            if self.max_entries is not None:
+                count = self.conn.execute(
+                    "SELECT COUNT(*) FROM entries WHERE created >= ?", (cutoff,)).fetchone()[0]
+                if count > self.max_entries:
+                    removed += [r[0] for r in self.conn.execute(
+                        "SELECT query FROM entries WHERE created >= ? ORDER BY accessed LIMIT ?",
+                        (cutoff, count - self.max_entries))]
+            self._delete(removed)
+        self._accessed.clear()
+        return removed
+
+    def keys(self):
+        with self.lock:
+            return [r[0] for r in self.conn.execute("SELECT query FROM entries")]
+
+    def add_listener(self, listener):
+        # listener(event, query) is called after every put/delete, outside the lock
+        self.listeners.append(listener)
+
+    def __contains__(self, query):
+        return self.get(query) is not None
+
+    def __getitem__(self, query):
+        answer = self.get(query)
+        if answer is None:
+            raise KeyError(query)
+        return answer
+
+    def __setitem__(self, query, answer):
+        self.put(query, answer)
+
+    def __len__(self):
+        with self.lock:
+            return self.conn.execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+
+    def close(self):
+        with self.lock:
+            with self.conn:
+                self.conn.execute("BEGIN")
+                self._flush_accessed()
+            self._accessed.clear()
+            self.conn.close()
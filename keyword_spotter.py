@@ -0,0 +1,241 @@
+import os
+import sys
+import time
+import argparse
+import numpy as np
+from audio_capture import (AudioCapture, WavSource, NoiseFloorTracker,
+                           SAMPLE_RATE, FRAME_SAMPLES, frame_energy_db)
+
+DEFAULT_KEYWORD_MODEL = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'models', 'hey_jarvis.npz')
+N_FFT = 512
+N_MELS = 20
+# Used when a single sample gives no pairwise distance to learn from
+DEFAULT_THRESHOLD = 0.3
+
+def _mel_filterbank(n_mels=N_MELS, n_fft=N_FFT, rate=SAMPLE_RATE, fmin=60.0, fmax=7600.0):
+    def hz_to_mel(hz):
+        return 2595.0 * np.log10(1.0 + hz / 700.0)
+
+    def mel_to_hz(mel):
+        return 700.0 * (10 ** (mel / 2595.0) - 1.0)
+
+    mels = np.linspace(hz_to_mel(fmin), hz_to_mel(fmax), n_mels + 2)
+    bins = np.floor((n_fft + 1) * mel_to_hz(mels) / rate).astype(int)
+    bank = np.zeros((n_fft // 2 + 1, n_mels), dtype=np.float32)
+    for m in range(1, n_mels + 1):
+        left, center, right = bins[m - 1], bins[m], bins[m + 1]
+        if center > left:
+            bank[left:center, m - 1] = (np.arange(left, center) - left) / float(center - left)
+        if right > center:
+            bank[center:right, m - 1] = (right - np.arange(center, right)) / float(right - center)
+    return bank
+
+MEL_BANK = _mel_filterbank()
+WINDOW = np.hamming(FRAME_SAMPLES).astype(np.float32)
+
+def log_mel(frames):
+    # frames: (n, FRAME_SAMPLES) int16 -> (n, N_MELS) log-mel energies, all frames at once
+    spectrum = np.abs(np.fft.rfft(frames.astype(np.float32) * WINDOW, n=N_FFT, axis=1)) ** 2
+    return np.log(spectrum @ MEL_BANK + 1e-3)
+
+def normalize(features):
+    # Remove each frame's overall level (keeping its spectral shape), then scale
+    # to unit length so the frame distance is a plain dot product
+    features = features - features.mean(axis=1, keepdims=True)
+    norms = np.linalg.norm(features, axis=1, keepdims=True)
+    return features / np.maximum(norms, 1e-6)
+
+def dtw_end_scores(template, window):
+    # Subsequence DTW: the whole template must match, starting anywhere in the
+    # window. Local steps (1,1), (1,2) and (2,1) bound the warp to between half
+    # and double speed and only reference earlier rows, so each row is one
+    # vectorized operation over the window. Returns the length-normalized cost
+    # of a match ending at each window frame.
+    cost = 1.0 - template @ window.T  # (T, W) cosine distances
+    inf = np.full(2, np.inf, dtype=cost.dtype)
+
+    def shift(acc, k):
+        return np.concatenate([inf[:k], acc[:-k]])
+
+    prev2 = np.full(cost.shape[1], np.inf, dtype=cost.dtype)
+    prev = cost[0].copy()
+    for i in range(1, len(cost)):
+        acc = cost[i] + np.minimum(np.minimum(shift(prev, 1), shift(prev, 2)),
+                                   shift(prev2, 1) + cost[i - 1])
+        prev2, prev = prev, acc
+    return prev / len(template)
+
+def trim_silence(frames, margin=3, threshold_db=10.0):
+    energy = np.array([frame_energy_db(f) for f in frames])
+    voiced = np.nonzero(energy > np.percentile(energy, 10) + threshold_db)[0]
+    if len(voiced) == 0:
+        return frames
+    return frames[max(0, voiced[0] - margin):voiced[-1] + 1 + margin]
+
+def wav_frames(path):
+    samples = WavSource(path, trailing_silence=0).load()
+    usable = len(samples) - len(samples) % FRAME_SAMPLES
+    return samples[:usable].reshape(-1, FRAME_SAMPLES)
+
+def enrollment_threshold(templates, margin=1.5):
+    # The worst match between two of the user's own samples, with headroom for
+    # the next time they say it; matched both ways as DTW is not symmetric
+    distances = [float(dtw_end_scores(a, b).min())
+                 for i, a in enumerate(templates) for j, b in enumerate(templates) if i != j]
+    distances = [d for d in distances if np.isfinite(d)]
+    if not distances:
+        return DEFAULT_THRESHOLD
+    return max(distances) * margin
+
+class KeywordModel:
+    def __init__(self, templates, threshold=DEFAULT_THRESHOLD):
+        self.templates = templates
+        self.threshold = threshold
+
+    @classmethod
+    def enroll(cls, wav_paths, threshold=None, margin=1.5):
+        # A handful of recordings of the keyword, each becoming one template.
+        # Without an explicit threshold it is learned from how far apart they are.
+        templates = [normalize(log_mel(trim_silence(wav_frames(p)))) for p in wav_paths]
+        if threshold is None:
+            threshold = enrollment_threshold(templates, margin)
+        return cls(templates, threshold)
+
+    @classmethod
+    def load(cls, path):
+        data = np.load(path)
+        count = int(data["count"])
+        return cls([data[f"template_{i}"] for i in range(count)], float(data["threshold"]))
+
+    def save(self, path):
+        arrays = {f"template_{i}": t for i, t in enumerate(self.templates)}
+        np.savez(path, count=len(self.templates), threshold=self.threshold, **arrays)
+
+    @property
+    def max_frames(self):
+        return max(len(t) for t in self.templates)
+
+class KeywordSpotter:
+    # Runs on every captured frame. Features are computed in small vectorized
+    # batches; template matching only runs while the energy is above the noise
+    # floor, so a quiet room costs almost nothing.
+    def __init__(self, model, sensitivity=0.5, stride=3, refractory=1.0):
+        self.model = model
+        # sensitivity 0..1 scales the enrolled threshold between 0.6x and 1.4x
+        self.threshold = model.threshold * (0.6 + 0.8 * sensitivity)
+        self.stride = stride
+        self.window_frames = int(model.max_frames * 1.5) + stride
+        self.features = np.zeros((self.window_frames, N_MELS), dtype=np.float32)
+        self.filled = 0
+        self.pending = []
+        self.noise = NoiseFloorTracker()
+        self.voiced_until = -1
+        self.refractory_frames = int(refractory * SAMPLE_RATE / FRAME_SAMPLES)
+        self.last_fire = -10 ** 9
+        self.last_score = None
+
+    def process(self, seq, frame, energy_db):
+        # Returns the score when the keyword ends at this frame, otherwise None
+        if energy_db > self.noise.floor + 8.0:
+            self.voiced_until = seq + self.window_frames
+        else:
+            self.noise.update(energy_db)
+        self.pending.append(frame)
+        if len(self.pending) < self.stride:
+            return None
+        batch = log_mel(np.stack(self.pending))
+        self.pending = []
+        n = len(batch)
+        self.features = np.roll(self.features, -n, axis=0)
+        self.features[-n:] = batch
+        self.filled = min(self.window_frames, self.filled + n)
+        if seq > self.voiced_until or seq - self.last_fire < self.refractory_frames:
+            return None
+        if self.filled < min(len(t) for t in self.model.templates):
+            return None
+        window = normalize(self.features[-self.filled:])
+        best = min(float(dtw_end_scores(t, window)[-n:].min()) for t in self.model.templates
+                   if len(t) <= self.filled)
+        self.last_score = best
+        if best < self.threshold:
+            self.last_fire = seq
+            return best
+        return None
+
+def load_spotter(path=DEFAULT_KEYWORD_MODEL, sensitivity=0.5):
+    # None when no keyword has been enrolled; callers fall back to transcription
+    if not path or not os.path.exists(path):
+        return None
+    return KeywordSpotter(KeywordModel.load(path), sensitivity)
+
+def benchmark(wav_path, model_path, sensitivity=0.5, keyword_ends=()):
+    # CPU time and detection latency for one recording. keyword_ends are the
+    # labelled times (seconds) at which each spoken keyword finishes.
+    spotter = KeywordSpotter(KeywordModel.load(model_path), sensitivity)
+    capture = AudioCapture(WavSource(wav_path, trailing_silence=0.5))
+    reader = capture.reader()
+    capture.start()
+    frame_seconds = FRAME_SAMPLES / float(SAMPLE_RATE)
+    detections = []
+    cpu_start = time.process_time()
+    wall_start = time.perf_counter()
+    for seq, frame in reader.frames():
+        score = spotter.process(seq, frame, capture.ring.frame_energy(seq))
+        if score is not None:
+            detections.append(((seq + 1) * frame_seconds, score))
+    cpu = time.process_time() - cpu_start
+    wall = time.perf_counter() - wall_start
+    audio_seconds = capture.source.duration
+    latencies = []
+    for end in keyword_ends:
+        hits = [t for t, _ in detections if end - 0.5 <= t <= end + 2.0]
+        if hits:
+            latencies.append((hits[0] - end) * 1000)
+    return {
+        "file": wav_path,
+        "audio_seconds": audio_seconds,
+        "cpu_seconds": cpu,
+        "wall_seconds": wall,
+        "cpu_percent_of_realtime": 100.0 * cpu / audio_seconds if audio_seconds else None,
+        "detections": [{"time": t, "score": s} for t, s in detections],
+        "detected": len(latencies),
+        "labelled": len(keyword_ends),
+        "latency_ms": latencies
+    }
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Keyword spotter for 'hey jarvis'")
+    sub = parser.add_subparsers(dest="command", required=True)
+    enroll = sub.add_parser("enroll", help="build a keyword model from recorded samples")
+    enroll.add_argument("wavs", nargs="+")
+    enroll.add_argument("--out", default=DEFAULT_KEYWORD_MODEL)
+    enroll.add_argument("--threshold", type=float, default=None,
+                        help="match threshold (default: learned from the samples)")
+    enroll.add_argument("--margin", type=float, default=1.5,
+                        help="headroom over the largest distance between samples")
+    bench = sub.add_parser("bench", help="measure CPU use and detection latency on a recording")
+    bench.add_argument("wav")
+    bench.add_argument("--model", default=DEFAULT_KEYWORD_MODEL)
+    bench.add_argument("--sensitivity", type=float, default=0.5)
+    bench.add_argument("--keyword-ends", default="",
+                       help="comma-separated times (s) where each spoken keyword ends")
+    args = parser.parse_args(argv)
+
+    if args.command == "enroll":
+        model = KeywordModel.enroll(args.wavs, args.threshold, args.margin)
+        os.makedirs(os.path.dirname(os.path.abspath(args.out)), exist_ok=True)
+        model.save(args.out)
+        print(f"Enrolled {len(model.templates)} samples into {args.out} (threshold {model.threshold:.3f})")
+        return
+    ends = [float(t) for t in args.keyword_ends.split(",") if t.strip()]
+    r = benchmark(args.wav, args.model, args.sensitivity, ends)
+    print(f"{r['file']}: {r['audio_seconds']:.1f}s audio, CPU {r['cpu_seconds'] * 1000:.0f} ms "
+          f"({r['cpu_percent_of_realtime']:.2f}% of real time)")
+    for d in r["detections"]:
+        print(f"  keyword at {d['time']:.2f}s (score {d['score']:.3f})")
+    if ends:
+        mean = sum(r["latency_ms"]) / len(r["latency_ms"]) if r["latency_ms"] else float("nan")
+        print(f"  detected {r['detected']}/{r['labelled']}, mean latency {mean:.0f} ms")
+
+if __name__ == '__main__':
+    sys.exit(main())
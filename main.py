@@ -1,91 +1,267 @@
 import sys
-import speech_recognition as sr
-import pyttsx3
-import datetime
+import argparse
 import os
-import subprocess
-import webbrowser
-from PyQt5.QtWidgets import (QApplication, QMainWindow, QWidget, QVBoxLayout,
-                            QTextEdit, QPushButton, QLabel, QHBoxLayout, QGraphicsDropShadowEffect,
-                            QSystemTrayIcon, QMenu, QAction)
-from PyQt5.QtCore import Qt, QThread, pyqtSignal, QTimer
-from PyQt5.QtGui import QFont, QColor, QPainter, QPen, QBrush, QPixmap, QFontDatabase, QIcon
-from reminder import ReminderManager
-from nlp_processor import NLPProcessor
+from startup_profiler import profiler
+from tracing import tracer
+with profiler.phase("import PyQt5"):
+    from PyQt5.QtWidgets import (QApplication, QMainWindow, QWidget, QVBoxLayout,
+                                QPlainTextEdit, QPushButton, QLabel, QHBoxLayout, QGraphicsDropShadowEffect,
+                                QSystemTrayIcon, QMenu, QAction)
+    from PyQt5.QtCore import Qt, QThread, pyqtSignal, QTimer, QPointF
+    from PyQt5.QtGui import (QFont, QColor, QPainter, QPen, QBrush, QPixmap, QFontDatabase, QIcon, QTextCursor,
+                             QRadialGradient)
+from inference_backend import BACKENDS
+from commands import CACHED_PHRASES
+from engine import AssistantEngine
+from tts_service import SpeechService
+from audio_capture import AudioCapture, VoiceActivityDetector
+from recognizer import create_recognizer, StreamingTranscriber, DEFAULT_MODEL_PATH
+from keyword_spotter import load_spotter, DEFAULT_KEYWORD_MODEL
+import assistant_daemon
+from assistant_daemon import DaemonServer, InstanceLock
+from command_pipeline import CommandPipeline
+from model_worker import ModelWorker
 
 FONT_PATH = os.path.join(os.path.dirname(__file__), 'resources', 'Orbitron-Regular.ttf')
+# Lines kept in the voice log; older ones are dropped as new ones arrive
+LOG_LINES = 500
 
 class ListeningIndicator(QWidget):
-    def __init__(self, parent=None):
+    # A spinning arc around a core whose glow pulses with the microphone
+    # level. Every arc position and glow size is rendered once into a pixmap,
+    # so a frame is two drawPixmap calls. The timer only runs while the
+    # assistant is listening or speaking and the widget is visible; when idle
+    # it shows one dimmed frame and costs nothing.
+    ANGLE_STEPS = 36
+    PULSE_STEPS = 8
+    # Microphone levels mapped onto the pulse
+    LEVEL_FLOOR_DB = -60.0
+    LEVEL_CEIL_DB = -20.0
+
+    def __init__(self, parent=None, fps=20, level_source=None):
         super().__init__(parent)
         self.setFixedSize(120, 120)
-        self.angle = 0
+        self.level_source = level_source
+        self.listening = False
+        self.speaking = False
+        self.step = 0
+        self.pulse = 0.0
+        self.phase = 0
+        self.painted = None
         self.timer = QTimer(self)
+        self.timer.setInterval(int(1000 / fps))
         self.timer.timeout.connect(self.animate)
-        self.timer.start(30)
-        self.pulse = 0
-        self.pulse_dir = 1
+        self.arcs = []
+        self.glows = []
+        self.render_frames()
 
-    def animate(self):
-        self.angle = (self.angle + 2) % 360
-        self.pulse += self.pulse_dir * 0.5
-        if self.pulse > 15 or self.pulse < 0:
-            self.pulse_dir *= -1
+    def _pixmap(self):
+        ratio = self.devicePixelRatioF()
+        pixmap = QPixmap(int(self.width() * ratio), int(self.height() * ratio))
+        pixmap.setDevicePixelRatio(ratio)
+        pixmap.fill(Qt.transparent)
+        return pixmap
+
+    def render_frames(self):
+        center = QPointF(self.rect().center())
+        self.arcs = []
+        for i in range(self.ANGLE_STEPS):
+            pixmap = self._pixmap()
+            painter = QPainter(pixmap)
+            painter.setRenderHint(QPainter.Antialiasing)
+            painter.setPen(QPen(QColor(0, 200, 255, 180), 8))
+            angle = i * 360 // self.ANGLE_STEPS
+            painter.drawArc(int(center.x()) - 50, int(center.y()) - 50, 100, 100, angle * 16, 270 * 16)
+            painter.end()
+            self.arcs.append(pixmap)
+        # The glow replaces the window-wide drop shadow around the core
+        self.glows = []
+        for i in range(self.PULSE_STEPS):
+            pixmap = self._pixmap()
+            painter = QPainter(pixmap)
+            painter.setRenderHint(QPainter.Antialiasing)
+            radius = 34 + 24 * i / (self.PULSE_STEPS - 1)
+            glow = QRadialGradient(center, radius)
+            glow.setColorAt(0.0, QColor(0, 200, 255, 160))
+            glow.setColorAt(1.0, QColor(0, 200, 255, 0))
+            painter.setPen(Qt.NoPen)
+            painter.setBrush(QBrush(glow))
+            painter.drawEllipse(center, radius, radius)
+            painter.setBrush(QBrush(QColor(0, 120, 255, 220)))
+            painter.drawEllipse(center, 30.0, 30.0)
+            painter.end()
+            self.glows.append(pixmap)
+
+    def set_listening(self, listening):
+        self.listening = listening
+        self._update_timer()
+
+    def set_speaking(self, speaking):
+        self.speaking = speaking
+        self._update_timer()
+
+    def _update_timer(self):
+        if (self.listening or self.speaking) and self.isVisible():
+            if not self.timer.isActive():
+                self.timer.start()
+        else:
+            self.timer.stop()
+            self.pulse = 0.0
         self.update()
 
+    def showEvent(self, event):
+        self._update_timer()
+
+    def hideEvent(self, event):
+        self.timer.stop()
+
+    def animate(self):
+        self.step = (self.step + 1) % self.ANGLE_STEPS
+        if self.listening and not self.speaking and self.level_source is not None:
+            span = self.LEVEL_CEIL_DB - self.LEVEL_FLOOR_DB
+            level = min(1.0, max(0.0, (self.level_source() - self.LEVEL_FLOOR_DB) / span))
+            # Rise at once, fall back gently
+            self.pulse = max(level, self.pulse * 0.8)
+        else:
+            # No level to follow (speaking): a steady breathing pulse
+            self.phase = (self.phase + 1) % (2 * self.PULSE_STEPS)
+            self.pulse = abs(self.PULSE_STEPS - self.phase) / float(self.PULSE_STEPS)
+        if self._frame() != self.painted:
+            self.update()
+
+    def _frame(self):
+        return self.step, int(round(self.pulse * (self.PULSE_STEPS - 1)))
+
     def paintEvent(self, event):
         painter = QPainter(self)
-        painter.setRenderHint(QPainter.Antialiasing)
-        center = self.rect().center()
-        radius = int(50 + self.pulse)
-        # Outer glowing arc
-        pen = QPen(QColor(0, 200, 255, 180), 8)
-        painter.setPen(pen)
-        painter.drawArc(center.x()-radius, center.y()-radius, 2*radius, 2*radius, self.angle*16, 270*16)
-        # Inner circle
-        brush = QBrush(QColor(0, 120, 255, 220))
-        painter.setPen(Qt.NoPen)
-        painter.setBrush(brush)
-        painter.drawEllipse(center, 30, 30)
+        if not self.timer.isActive():
+            painter.setOpacity(0.45)
+        self.painted = self._frame()
+        step, pulse = self.painted
+        painter.drawPixmap(0, 0, self.glows[pulse])
+        painter.drawPixmap(0, 0, self.arcs[step])
 
 class VoiceThread(QThread):
-    text_received = pyqtSignal(str)
+    # Transcript and its trace request id (0 when tracing is off)
+    text_received = pyqtSignal(str, int)
+    partial_received = pyqtSignal(str)
     hotword_detected = pyqtSignal()
     
-    def __init__(self):
+    def __init__(self, capture, asr_backend="auto", asr_model=DEFAULT_MODEL_PATH,
+                 keyword_model=DEFAULT_KEYWORD_MODEL, keyword_sensitivity=0.5):
         super().__init__()
-        self.recognizer = sr.Recognizer()
-        self.engine = pyttsx3.init()
+        self.capture = capture
+        self.asr_backend = asr_backend
+        self.asr_model = asr_model
+        self.recognizer = None
+        # Without an enrolled keyword every utterance is transcribed and
+        # "hey jarvis" is matched on the text instead
+        self.spotter = load_spotter(keyword_model, keyword_sensitivity)
+        # Kept across stop/start so the noise floor estimate survives
+        self.vad = VoiceActivityDetector()
         self.is_listening = True
         
     def run(self):
-        while self.is_listening:
-            try:
-                with sr.Microphone() as source:
-                    self.recognizer.adjust_for_ambient_noise(source)
-                    audio = self.recognizer.listen(source)
-                    text = self.recognizer.recognize_google(audio)
-                    if text.lower() == "hey jarvis":
-                        self.hotword_detected.emit()
-                    else:
-                        self.text_received.emit(text)
-            except sr.UnknownValueError:
-                pass
-            except sr.RequestError:
-                self.text_received.emit("Error: Could not request results")
-            except Exception as e:
-                self.text_received.emit(f"Error: {str(e)}")
+        try:
+            if self.recognizer is None:
+                # Loaded here so a local model does not delay the window
+                with profiler.phase("load speech recognizer"):
+                    self.recognizer = create_recognizer(self.asr_backend, self.asr_model)
+            # The stream stays open; utterances are cut from the shared ring buffer
+            transcriber = StreamingTranscriber(self.capture, self.recognizer, self.vad,
+                                               on_partial=self.partial_received.emit,
+                                               on_final=self.handle_final,
+                                               on_error=self.handle_error,
+                                               spotter=self.spotter,
+                                               on_wake=self.hotword_detected.emit)
+            self.capture.start()
+        except Exception as e:
+            self.text_received.emit(f"Error: {str(e)}", 0)
+            return
+        transcriber.run(lambda: not self.is_listening)
+
+    def handle_final(self, text, start, end):
+        lowered = text.lower()
+        if self.spotter is None and lowered.startswith("hey jarvis"):
+            self.hotword_detected.emit()
+            # "hey jarvis open browser" carries a command after the keyword
+            text = text[len("hey jarvis"):].strip(" ,.")
+        if text:
+            self.text_received.emit(text, tracer.current() or 0)
+
+    def handle_error(self, error):
+        self.text_received.emit(f"Error: {str(error)}", 0)
 
 class JarvisGUI(QMainWindow):
-    def __init__(self):
+    # Requests from the daemon socket arrive on its threads and are re-emitted
+    # here so they are handled on the GUI thread
+    remote_activate = pyqtSignal()
+    remote_hide = pyqtSignal()
+    remote_quit = pyqtSignal()
+    remote_command = pyqtSignal(str, str, bool)
+    # Emitted from the reminder scheduler thread
+    reminder_due = pyqtSignal(str)
+    # Emitted from the speech thread when it starts and stops talking
+    speaking_changed = pyqtSignal(bool)
+
+    def __init__(self, warm_up=True, asr_backend="auto", asr_model=DEFAULT_MODEL_PATH,
+                 keyword_model=DEFAULT_KEYWORD_MODEL, keyword_sensitivity=0.5, resident=False,
+                 backend="eager", threads=None, trace_overlay=False, low_power=False,
+                 model_worker=True, idle_unload=600.0, memory_budget_mb=None, over_budget="restart",
+                 verbose=False):
         super().__init__()
-        self.reminder_manager = ReminderManager()
-        self.nlp_processor = NLPProcessor()
-        self.initUI()
-        self.voice_thread = VoiceThread()
-        self.voice_thread.text_received.connect(self.process_command)
-        self.voice_thread.hotword_detected.connect(self.activate_assistant)
-        self.voice_thread.start()
+        # Resident mode starts hidden, keeps the models warm and hides on close
+        self.resident = resident
+        self.quitting = False
+        self.trace_overlay = trace_overlay
+        # Low-power rendering: no window-wide blur and half the animation frame rate
+        self.low_power = low_power
+        # DialoGPT runs in a supervised worker process, unloaded after
+        # idle_unload seconds without a query (never in resident mode)
+        worker = None
+        if model_worker:
+            worker = ModelWorker(backend=backend, threads=threads,
+                                 idle_timeout=None if resident else idle_unload,
+                                 memory_budget_mb=memory_budget_mb, over_budget=over_budget)
+        # Commands, reminders and the language model live in the GUI-free
+        # engine; this window adds audio, speech and display on top
+        self.engine = AssistantEngine(backend=backend, threads=threads, worker=worker)
+        self.reminder_manager = self.engine.reminders
+        self.nlp_processor = self.engine.nlp
+        self.command_processor = self.engine.commands
+        self.reminder_manager.add_listener(lambda reminder, message: self.reminder_due.emit(message))
+        with profiler.phase("start speech service"):
+            # pyttsx3 is initialised on the speech thread, not here
+            self.speech = SpeechService(phrases=CACHED_PHRASES, on_state=self.speaking_changed.emit).start()
+        self.pipeline = CommandPipeline(self.command_processor, self.speech, verbose=verbose, parent=self)
+        self.streaming_request = None
+        self.pipeline.partial_text.connect(self.show_partial)
+        self.pipeline.response_ready.connect(self.show_response)
+        self.pipeline.request_failed.connect(self.show_response)
+        self.pipeline.action_requested.connect(self.handle_action)
+        with profiler.phase("init UI"):
+            self.initUI()
+        self.speaking_changed.connect(self.indicator.set_speaking)
+        with profiler.phase("start voice thread"):
+            self.capture = AudioCapture()
+            self.indicator.level_source = lambda: self.capture.level_db
+            self.voice_thread = VoiceThread(self.capture, asr_backend, asr_model,
+                                            keyword_model, keyword_sensitivity)
+            self.voice_thread.text_received.connect(self.process_command)
+            self.voice_thread.partial_received.connect(self.show_hypothesis)
+            self.voice_thread.hotword_detected.connect(self.activate_assistant)
+            self.voice_thread.start()
+            self.indicator.set_listening(True)
+        self.remote_activate.connect(self.activate_assistant)
+        self.remote_hide.connect(self.hide)
+        self.remote_quit.connect(self.quit_assistant)
+        self.remote_command.connect(self.show_remote_command)
+        self.reminder_due.connect(self.deliver_reminder)
+        self.engine.start()
+        if warm_up or resident:
+            # Start loading DialoGPT once the event loop is running so the
+            # window is painted first
+            QTimer.singleShot(0, self.nlp_processor.warm_up)
         
     def initUI(self):
         self.setWindowTitle('Jarvis - Voice Assistant')
@@ -95,7 +271,7 @@ class JarvisGUI(QMainWindow):
             QMainWindow {
                 background: transparent;
             }
-            QTextEdit {
+            QPlainTextEdit {
                 background-color: #101522;
                 color: #00bfff;
                 border: 2px solid #00bfff;
@@ -133,18 +309,30 @@ class JarvisGUI(QMainWindow):
         layout = QVBoxLayout(central_widget)
         layout.setAlignment(Qt.AlignCenter)
         # Listening indicator
-        self.indicator = ListeningIndicator(self)
+        self.indicator = ListeningIndicator(self, fps=10 if self.low_power else 20)
         layout.addWidget(self.indicator, alignment=Qt.AlignCenter)
         # Status label
         self.status_label = QLabel("Status: Listening...")
         self.status_label.setFont(QFont(family, 18))
         layout.addWidget(self.status_label, alignment=Qt.AlignCenter)
         # Voice log display
-        self.voice_log = QTextEdit()
+        # Plain text lays out only what is visible, and the block limit keeps
+        # a long session from growing the log without bound
+        self.voice_log = QPlainTextEdit()
         self.voice_log.setReadOnly(True)
+        self.voice_log.setMaximumBlockCount(LOG_LINES)
         self.voice_log.setFont(QFont(family, 13))
         self.voice_log.setMaximumHeight(200)
         layout.addWidget(self.voice_log)
+        if self.trace_overlay:
+            # Per-stage latency percentiles and counters from the tracer
+            self.trace_label = QLabel(tracer.summary())
+            self.trace_label.setFont(QFont("Monospace", 8))
+            self.trace_label.setStyleSheet("font-size: 10px; color: #7fdfff;")
+            layout.addWidget(self.trace_label)
+            self.trace_timer = QTimer(self)
+            self.trace_timer.timeout.connect(lambda: self.trace_label.setText(tracer.summary()))
+            self.trace_timer.start(1000)
         # Control buttons
         button_layout = QHBoxLayout()
         self.mic_button = QPushButton("🎤")
@@ -156,118 +344,62 @@ class JarvisGUI(QMainWindow):
         self.clear_button.clicked.connect(self.clear_log)
         button_layout.addWidget(self.clear_button)
         layout.addLayout(button_layout)
-        # Drop shadow effect
-        effect = QGraphicsDropShadowEffect(self)
-        effect.setBlurRadius(40)
-        effect.setColor(QColor(0, 200, 255, 180))
-        effect.setOffset(0, 0)
-        central_widget.setGraphicsEffect(effect)
+        # Drop shadow effect; it blurs the whole window again on every
+        # repaint, so low-power mode goes without
+        if not self.low_power:
+            effect = QGraphicsDropShadowEffect(self)
+            effect.setBlurRadius(40)
+            effect.setColor(QColor(0, 200, 255, 180))
+            effect.setOffset(0, 0)
+            central_widget.setGraphicsEffect(effect)
         # Set window size and position
         self.setGeometry(500, 200, 500, 500)
-        self.show()
-        
-    def process_command(self, text):
-        self.voice_log.append(f"You: {text}")
-        
-        # Process commands
-        text = text.lower()
-        response = ""
-        
-        # Check if it's a general query (starts with "jarvis")
-        if text.startswith("jarvis"):
-            query = text.replace("jarvis", "").strip()
-            nlp_response = self.nlp_processor.generate_response(query)
-            if nlp_response:
-                response = nlp_response
-                self.voice_log.append(f"Jarvis: {response}")
-                self.speak(response)
-                return
+        if not self.resident:
+            self.show()
         
-        if "open" in text:
-            app_name = text.replace("open", "").strip()
-            try:
-                if "browser" in app_name:
-                    webbrowser.open("https://www.google.com")
-                    response = "Opening web browser"
-                else:
-                    subprocess.Popen(app_name)
-                    response = f"Opening {app_name}"
-            except:
-                response = f"Could not open {app_name}"
-                
-        elif "time" in text:
-            current_time = datetime.datetime.now().strftime("%I:%M %p")
-            response = f"The current time is {current_time}"
-            
-        elif "date" in text:
-            current_date = datetime.datetime.now().strftime("%B %d, %Y")
-            response = f"Today's date is {current_date}"
-            
-        elif "set reminder" in text:
-            # Extract reminder text and time
-            reminder_text = text.replace("set reminder", "").strip()
-            if "at" in reminder_text:
-                text_part, time_part = reminder_text.split("at")
-                reminder_text = text_part.strip()
-                time_str = time_part.strip()
-                response = self.reminder_manager.add_reminder(reminder_text, time_str)
-            else:
-                response = "Please specify a time for the reminder using 'at' (e.g., 'set reminder buy groceries at 3:00 PM')"
-                
-        elif "list reminders" in text:
-            response = self.reminder_manager.list_reminders()
-            
-        elif "exit" in text or "quit" in text:
-            self.close()
-            return
-            
-        elif "hello" in text or "hi" in text:
-            responses = [
-                "Hello! How can I help you today?",
-                "Hi there! What can I do for you?",
-                "Greetings! How may I assist you?",
-                "Hello! I'm here to help. What do you need?"
-            ]
-            response = responses[datetime.datetime.now().second % len(responses)]
-            
-        elif "thank you" in text or "thanks" in text:
-            responses = [
-                "You're welcome!",
-                "Happy to help!",
-                "Anytime!",
-                "My pleasure!"
-            ]
-            response = responses[datetime.datetime.now().second % len(responses)]
-            
-        elif "google search" in text:
-            query = text.replace("google search", "").strip()
-            webbrowser.open(f"https://www.google.com/search?q={query}")
-            response = f"Searching Google for {query}"
-            
-        else:
-            # Try to get a response from the NLP processor
-            nlp_response = self.nlp_processor.generate_response(text)
-            if nlp_response:
-                response = nlp_response
-            else:
-                response = "I'm not sure how to help with that."
-            
-        self.voice_log.append(f"Jarvis: {response}")
-        self.speak(response)
+    def process_command(self, text, trace=0):
+        if self.voice_thread.is_listening:
+            self.status_label.setText("Status: Listening...")
+        self.voice_log.appendPlainText(f"You: {text}")
+        # Handled on the command pipeline's workers; a new utterance cancels
+        # the reply that is still running
+        self.pipeline.submit(text, trace or None)
+
+    def show_hypothesis(self, text):
+        # The recognizer's running guess while the user is still speaking;
+        # also a cue to have the language model ready by the time they finish
+        self.status_label.setText(f"Hearing: {text}")
+        self.nlp_processor.warm_up()
+
+    def show_partial(self, request_id, chunk):
+        if request_id != self.streaming_request:
+            self.streaming_request = request_id
+            self.voice_log.appendPlainText("Jarvis: ")
+        cursor = self.voice_log.textCursor()
+        cursor.movePosition(QTextCursor.End)
+        cursor.insertText(chunk)
+        self.voice_log.ensureCursorVisible()
+
+    def show_response(self, request_id, response):
+        self.voice_log.appendPlainText(f"Jarvis: {response}")
+
+    def handle_action(self, action):
+        if action == "quit":
+            self.quit_assistant()
         
     def speak(self, text):
-        engine = pyttsx3.init()
-        engine.say(text)
-        engine.runAndWait()
+        return self.speech.say(text)
         
     def toggle_listening(self):
         if self.voice_thread.is_listening:
             self.voice_thread.is_listening = False
+            self.indicator.set_listening(False)
             self.status_label.setText("Status: Stopped")
             self.mic_button.setText("🎤/")
         else:
             self.voice_thread.is_listening = True
             self.voice_thread.start()
+            self.indicator.set_listening(True)
             self.status_label.setText("Status: Listening...")
             self.mic_button.setText("🎤")
         
@@ -275,9 +407,58 @@ class JarvisGUI(QMainWindow):
         self.voice_log.clear()
         self.nlp_processor.clear_history()
             
+    def handle_daemon_message(self, message):
+        # Runs on a daemon connection thread: only thread-safe work and signals
+        cmd = message.get("cmd")
+        if cmd == "ping":
+            return {"ok": True}
+        if cmd == "activate":
+            self.remote_activate.emit()
+            return {"ok": True}
+        if cmd == "hide":
+            self.remote_hide.emit()
+            return {"ok": True}
+        if cmd == "quit":
+            self.remote_quit.emit()
+            return {"ok": True}
+        if cmd == "command":
+            text = message.get("text", "")
+            result = self.command_processor.handle(text)
+            if result.action == "quit":
+                self.remote_quit.emit()
+                return {"ok": True}
+            response = result.response if result.stream is None else "".join(result.stream)
+            self.remote_command.emit(text, response, bool(message.get("speak")))
+            return {"ok": True, "response": response}
+        return {"ok": False, "error": f"Unknown command: {cmd}"}
+
+    def show_remote_command(self, text, response, speak):
+        self.voice_log.appendPlainText(f"You: {text}")
+        self.voice_log.appendPlainText(f"Jarvis: {response}")
+        if speak:
+            self.speak(response)
+
+    def deliver_reminder(self, message):
+        self.voice_log.appendPlainText(f"Jarvis: {message}")
+        self.speak(message)
+
+    def quit_assistant(self):
+        self.quitting = True
+        self.close()
+        QApplication.instance().quit()
+
     def closeEvent(self, event):
+        if self.resident and not self.quitting:
+            # Stay resident with the models loaded; "exit" or `assistant_daemon.py quit` really quits
+            event.ignore()
+            self.hide()
+            return
+        self.pipeline.shutdown()
+        self.engine.stop()
+        self.speech.stop()
         self.voice_thread.is_listening = False
         self.voice_thread.wait()
+        self.capture.stop()
         event.accept()
 
     def activate_assistant(self):
@@ -288,8 +469,91 @@ class JarvisGUI(QMainWindow):
         self.mic_button.setText("🎤")
         self.voice_thread.is_listening = True
         self.voice_thread.start()
+        self.indicator.set_listening(True)
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(description="Jarvis voice assistant")
+    parser.add_argument("--no-warmup", action="store_true",
+                        help="load the language model on first use instead of in the background")
+    parser.add_argument("--profile-startup", action="store_true",
+                        help="print how long each import and init phase took")
+    parser.add_argument("--asr", default="auto", choices=["auto", "vosk", "google"],
+                        help="speech recognizer; auto uses the local model when it is installed")
+    parser.add_argument("--asr-model", default=DEFAULT_MODEL_PATH,
+                        help="path to the local speech recognition model")
+    parser.add_argument("--keyword-model", default=DEFAULT_KEYWORD_MODEL,
+                        help="enrolled 'hey jarvis' samples (see keyword_spotter.py enroll)")
+    parser.add_argument("--resident", action="store_true",
+                        help="start hidden with the models loaded and wait to be activated")
+    parser.add_argument("--keyword-sensitivity", type=float, default=0.5,
+                        help="0 (strict) to 1 (lenient)")
+    parser.add_argument("--backend", default="eager", choices=BACKENDS,
+                        help="language model runtime (compare with inference_backend.py bench)")
+    parser.add_argument("--threads", type=int, default=None,
+                        help="CPU threads for the language model (default: physical cores)")
+    parser.add_argument("--trace", action="store_true",
+                        help="time every stage of each request and print a breakdown per reply")
+    parser.add_argument("--trace-overlay", action="store_true",
+                        help="show stage latency percentiles in the window (implies --trace)")
+    parser.add_argument("--metrics-file", default=None,
+                        help="write Prometheus-format metrics here every 10 seconds (implies --trace)")
+    parser.add_argument("--low-power", action="store_true",
+                        help="cheaper rendering for always-on machines: no window blur, slower animation")
+    parser.add_argument("--in-process-model", action="store_true",
+                        help="run the language model inside this process instead of a worker process")
+    parser.add_argument("--idle-unload", type=float, default=600.0,
+                        help="seconds without a query before the model worker is unloaded (0 keeps it)")
+    parser.add_argument("--memory-budget", type=float, default=None,
+                        help="MB the model worker may use before it is restarted")
+    parser.add_argument("--over-budget", default="restart", choices=("restart", "downgrade"),
+                        help="restart the worker as is, or with a lighter backend (eager/onnx -> int8)")
+    return parser.parse_known_args(argv[1:])[0]
 
 if __name__ == '__main__':
-    app = QApplication(sys.argv)
-    ex = JarvisGUI()
-    sys.exit(app.exec_()) 
\ No newline at end of file
+    args = parse_args(sys.argv)
+    # Single instance: the pidfile lock is checked in O(1); a second launch
+    # just asks the running assistant to show itself
+    try:
+        instance_lock = InstanceLock()
+    except PermissionError as e:
+        print(e, file=sys.stderr)
+        sys.exit(1)
+    if not instance_lock.acquire():
+        try:
+            assistant_daemon.send({"cmd": "activate"})
+        except ConnectionError as e:
+            print(e, file=sys.stderr)
+        sys.exit(0)
+    if args.trace or args.trace_overlay or args.metrics_file:
+        tracer.enable()
+    with profiler.phase("create QApplication"):
+        app = QApplication(sys.argv)
+    if args.resident:
+        app.setQuitOnLastWindowClosed(False)
+    ex = JarvisGUI(warm_up=not args.no_warmup, asr_backend=args.asr, asr_model=args.asr_model,
+                   keyword_model=args.keyword_model, keyword_sensitivity=args.keyword_sensitivity,
+                   resident=args.resident, backend=args.backend, threads=args.threads,
+                   trace_overlay=args.trace_overlay, low_power=args.low_power,
+                   model_worker=not args.in_process_model, idle_unload=args.idle_unload or None,
+                   memory_budget_mb=args.memory_budget, over_budget=args.over_budget,
+                   verbose=args.trace)
+    server = DaemonServer(ex.handle_daemon_message).start()
+    app.aboutToQuit.connect(server.stop)
+    if args.metrics_file:
+        app.aboutToQuit.connect(tracer.export_to(args.metrics_file).stop)
+    if args.profile_startup:
+        def report_startup():
+            profiler.mark("event loop running")
+            profiler.print_report()
+        QTimer.singleShot(0, report_startup)
+        if not args.no_warmup:
+            # Print a second report once the background warm-up has finished
+            def report_warmup():
+                thread = ex.nlp_processor.warm_up()
+                if thread is not None and thread.is_alive():
+                    QTimer.singleShot(200, report_warmup)
+                    return
+                profiler.mark("model warm")
+                profiler.print_report()
+            QTimer.singleShot(200, report_warmup)
+    sys.exit(app.exec_())
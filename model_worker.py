@@ -0,0 +1,507 @@
+import os
+import sys
+import time
+import queue
+import signal
+import argparse
+import itertools
+import threading
+import subprocess
+import collections
+from multiprocessing.connection import Client, Listener
+from tracing import tracer
+from inference_backend import BACKENDS, DEFAULT_MODEL, MAX_NEW_TOKENS
+
+# DialoGPT runs in a child process so its few hundred MB of torch and weights
+# are only resident while the model is in use, and a runaway generation or an
+# out-of-memory kill takes down the worker rather than the assistant.
+#
+# Messages are small tuples over a multiprocessing Connection:
+#   parent -> worker  ("load",) ("generate", id, query, pending) ("stop", id, keep)
+#                     ("clear",) ("quit",)
+#   worker -> parent  ("loaded", backend) ("load_failed", error)
+#                     ("chunk", id, text) ("done", id, kept) ("error", id, error)
+# pending is the (query, answer) text the worker's conversation has not seen
+# yet: cached and web answers, and after a restart the recent history.
+
+# Lighter backend to switch to when a worker goes over its memory budget
+DOWNGRADE = {"eager": "int8", "onnx": "int8"}
+# Unexpected exits restarted within this many seconds; past that the worker
+# is left down until the next request needs it
+MAX_RESTARTS = 3
+RESTART_WINDOW = 60.0
+# The connection's authkey travels in the environment, not on the command line
+KEY_ENV = "JARVIS_WORKER_KEY"
+
+class WorkerError(RuntimeError):
+    pass
+
+def _serve(address_out, model_name, backend, threads, max_new_tokens):
+    from dialogue_context import DialogueContext
+    from inference_backend import load_backend, decode_turn
+    # Ctrl-C in the terminal is the parent's to handle
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    listener = Listener(authkey=bytes.fromhex(os.environ[KEY_ENV]))
+    address_out.write(f"{listener.address}\n")
+    address_out.flush()
+    conn = listener.accept()
+    listener.close()
+
+    dialogue = DialogueContext()
+    requests = queue.Queue()
+    # Requests queued or decoding; a stop for any other id crossed its "done"
+    # and is dropped, so finished ids never pile up in stopped
+    live = set()
+    # request id -> whether to keep the reply in the conversation
+    stopped = {}
+    stop_lock = threading.Lock()
+    send_lock = threading.Lock()
+
+    def send(*message):
+        with send_lock:
+            conn.send(message)
+
+    def read():
+        # Beside the decode loop, so stop and clear take effect mid-reply
+        while True:
+            try:
+                message = conn.recv()
+            except (EOFError, OSError):
+                # The assistant has gone away
+                message = ("quit",)
+            if message[0] == "stop":
+                with stop_lock:
+                    if message[1] in live:
+                        stopped[message[1]] = message[2]
+            elif message[0] == "clear":
+                dialogue.clear()
+            else:
+                if message[0] == "generate":
+                    with stop_lock:
+                        live.add(message[1])
+                requests.put(message)
+            if message[0] == "quit":
+                return
+
+    def finish(request):
+        # Whether to keep the reply; the request takes no more stops
+        with stop_lock:
+            live.discard(request)
+            return stopped.pop(request, True)
+
+    threading.Thread(target=read, name="worker-read", daemon=True).start()
+    loaded = None
+    while True:
+        message = requests.get()
+        if message[0] == "quit":
+            break
+        if loaded is None:
+            try:
+                loaded = load_backend(model_name, backend, threads)
+            except Exception as e:
+                # Exit rather than limp along; the next request starts a fresh worker
+                send("load_failed", f"{type(e).__name__}: {e}")
+                break
+            send("loaded", backend)
+        if message[0] != "generate":
+            continue
+        _, request, query, pending = message
+        for asked, answer in pending:
+            dialogue.add_text(asked, answer)
+        tokenizer, model = loaded
+        try:
+            with dialogue.lock:
+                decode_turn(model, tokenizer, dialogue, query, lambda text: send("chunk", request, text),
+                            lambda: request in stopped, max_new_tokens,
+                            keep=lambda: stopped.get(request, True))
+            send("done", request, finish(request))
+        except Exception as e:
+            finish(request)
+            send("error", request, f"{type(e).__name__}: {e}")
+    conn.close()
+
+class _Child:
+    # One worker process and the thread that reads its replies. Every
+    # (re)start gets a new one, so replies can never reach a request that
+    # was sent to an earlier process.
+    def __init__(self, command):
+        key = os.urandom(16)
+        env = dict(os.environ)
+        env[KEY_ENV] = key.hex()
+        self.process = subprocess.Popen(command, stdout=subprocess.PIPE, env=env, text=True)
+        # The worker prints where it listens once it is up; an empty line
+        # means it died first
+        address = self.process.stdout.readline().strip()
+        self.process.stdout.close()
+        if not address:
+            self.process.wait()
+            raise WorkerError(f"Model worker failed to start (exit code {self.process.returncode})")
+        self.conn = Client(address, authkey=key)
+        self.send_lock = threading.Lock()
+        # request id -> queue of messages for it
+        self.streams = {}
+        self.loaded = threading.Event()
+        # Set once loading succeeded or failed, or the process is gone
+        self.settled = threading.Event()
+        self.exited = threading.Event()
+        self.load_error = None
+        # Why the assistant ended this worker; None for an unexpected exit
+        self.reason = None
+        self.reader = threading.Thread(target=self._read, name="model-worker", daemon=True)
+        self.reader.start()
+
+    @property
+    def pid(self):
+        return self.process.pid
+
+    def send(self, *message):
+        try:
+            with self.send_lock:
+                self.conn.send(message)
+        except (OSError, ValueError):
+            raise WorkerError(self.reason or "Model worker is not running")
+
+    def _read(self):
+        while True:
+            try:
+                message = self.conn.recv()
+            except (EOFError, OSError):
+                break
+            if message[0] == "loaded":
+                self.loaded.set()
+                self.settled.set()
+            elif message[0] == "load_failed":
+                self.load_error = message[1]
+                self.settled.set()
+            else:
+                stream = self.streams.get(message[1])
+                if stream is not None:
+                    stream.put(message)
+        self.conn.close()
+        self.process.wait()
+        if self.load_error:
+            reason = f"Could not load the model: {self.load_error}"
+        else:
+            reason = self.reason or f"Model worker exited unexpectedly (exit code {self.process.returncode})"
+        self.exited.set()
+        self.settled.set()
+        for request, stream in list(self.streams.items()):
+            stream.put(("error", request, reason))
+
+    def quit(self, reason, timeout=5.0):
+        self.reason = reason
+        try:
+            self.send("quit")
+            self.process.wait(timeout)
+        except (WorkerError, subprocess.TimeoutExpired):
+            self.kill(reason)
+
+    def kill(self, reason):
+        self.reason = reason
+        if self.process.poll() is None:
+            self.process.kill()
+
+class ModelWorker:
+    # Runs DialoGPT in a supervised child process and streams replies back.
+    # The process is started on demand, quit after idle_timeout seconds
+    # without a request (None keeps it), and killed when its RSS goes over
+    # memory_budget_mb: over_budget="restart" reloads the same backend,
+    # "downgrade" moves to a lighter one (see DOWNGRADE). A worker that
+    # crashes while warm is restarted and reloaded in the background. The
+    # last few exchanges are kept here as text so a new worker carries on the
+    # same conversation.
+    def __init__(self, model_name=DEFAULT_MODEL, backend="eager", threads=None,
+                 max_new_tokens=MAX_NEW_TOKENS, idle_timeout=600.0, memory_budget_mb=None,
+                 over_budget="restart", history=8, poll_interval=1.0):
+        if over_budget not in ("restart", "downgrade"):
+            raise ValueError(f"Unknown over-budget policy: {over_budget}")
+        self.model_name = model_name
+        self.backend = backend
+        self.threads = threads
+        self.max_new_tokens = max_new_tokens
+        self.idle_timeout = idle_timeout
+        self.memory_budget_mb = memory_budget_mb
+        self.over_budget = over_budget
+        self.poll_interval = poll_interval
+        self.lock = threading.Lock()
+        # Held while a worker is started so only one starts at a time; starting
+        # waits on the process, so it is never done under self.lock
+        self.spawn_lock = threading.Lock()
+        self.child = None
+        self.ids = itertools.count(1)
+        self.active = 0
+        self.last_used = time.monotonic()
+        self.exchanges = collections.deque(maxlen=history)
+        # Exchanges the worker has not seen; never more than it would keep
+        self.unsent = collections.deque(maxlen=history)
+        # Bumped by clear(); replies that were running at the time are not kept
+        self.epoch = 0
+        self.crashes = collections.deque()
+        self.stats = collections.Counter()
+        self.stopped = threading.Event()
+        self.supervisor = None
+
+    @property
+    def is_loaded(self):
+        child = self.child
+        return child is not None and child.loaded.is_set() and not child.exited.is_set()
+
+    def _command(self):
+        command = [sys.executable, os.path.abspath(__file__), "_serve", "--model", self.model_name,
+                   "--backend", self.backend, "--max-new-tokens", str(self.max_new_tokens)]
+        if self.threads:
+            command += ["--threads", str(self.threads)]
+        return command
+
+    def _ensure_child(self):
+        # Called without self.lock; the running worker, or a newly started one
+        with self.spawn_lock:
+            with self.lock:
+                if self.stopped.is_set():
+                    raise WorkerError("Model worker has been shut down")
+                if self.child is not None and not self.child.exited.is_set():
+                    return self.child
+            child = _Child(self._command())
+            with self.lock:
+                closed = self.stopped.is_set()
+                if not closed:
+                    self.child = child
+                    # A new worker knows nothing of the conversation so far
+                    self.unsent = collections.deque(self.exchanges, maxlen=self.exchanges.maxlen)
+                    self.last_used = time.monotonic()
+                    self.stats["starts"] += 1
+                    if self.supervisor is None:
+                        self.supervisor = threading.Thread(target=self._supervise, name="model-supervisor",
+                                                           daemon=True)
+                        self.supervisor.start()
+            if closed:
+                child.quit("Model worker has been shut down")
+                raise WorkerError("Model worker has been shut down")
+            return child
+
+    def load(self, timeout=None):
+        child = self._ensure_child()
+        child.send("load")
+        child.settled.wait(timeout)
+        self.last_used = time.monotonic()
+        if child.load_error:
+            raise WorkerError(f"Could not load the model: {child.load_error}")
+        if not child.loaded.is_set():
+            raise WorkerError(child.reason or "Model worker did not finish loading")
+
+    def generate(self, query, should_stop=None, keep=None):
+        # Reply chunks as the worker decodes them. should_stop is polled while
+        # waiting; keep() is asked once when stopping, and a reply it rejects
+        # is left out of the conversation. Raises WorkerError if the worker
+        # fails or is restarted mid-reply.
+        stream = queue.Queue()
+        while True:
+            child = self._ensure_child()
+            with self.lock:
+                # Unloaded while idle in between; start another
+                if self.child is not child:
+                    continue
+                request = next(self.ids)
+                child.streams[request] = stream
+                pending = list(self.unsent)
+                self.unsent.clear()
+                epoch = self.epoch
+                self.active += 1
+                break
+        parts = []
+        finished = False
+        stopping = False
+        kept = True
+        try:
+            child.send("generate", request, query, pending)
+            while True:
+                if not stopping and should_stop and should_stop():
+                    stopping = True
+                    self._stop(child, request, keep)
+                try:
+                    message = stream.get(timeout=0.05)
+                except queue.Empty:
+                    if child.exited.is_set() and stream.empty():
+                        raise WorkerError(child.reason or "Model worker exited")
+                    continue
+                if message[0] == "chunk":
+                    parts.append(message[2])
+                    yield message[2]
+                elif message[0] == "done":
+                    finished = True
+                    kept = message[2]
+                    break
+                else:
+                    raise WorkerError(message[2])
+        finally:
+            if not finished and not stopping:
+                # Abandoned by the consumer, or failed
+                self._stop(child, request, keep)
+            with self.lock:
+                child.streams.pop(request, None)
+                self.active -= 1
+                self.last_used = time.monotonic()
+        with self.lock:
+            if kept and parts and epoch == self.epoch:
+                self.exchanges.append((query, "".join(parts)))
+
+    def _stop(self, child, request, keep):
+        try:
+            child.send("stop", request, bool(keep()) if keep else True)
+        except WorkerError:
+            pass
+
+    def add_text(self, query, answer):
+        # Cached and web answers; sent along with the next request
+        with self.lock:
+            self.exchanges.append((query, answer))
+            self.unsent.append((query, answer))
+
+    def clear(self):
+        with self.lock:
+            self.epoch += 1
+            self.exchanges.clear()
+            self.unsent.clear()
+            child = self.child
+        if child is not None and not child.exited.is_set():
+            try:
+                child.send("clear")
+            except WorkerError:
+                pass
+
+    def rss_mb(self):
+        child = self.child
+        if child is None or child.exited.is_set():
+            return 0.0
+        import psutil
+        try:
+            return psutil.Process(child.pid).memory_info().rss / (1024.0 * 1024.0)
+        except psutil.Error:
+            return 0.0
+
+    def _supervise(self):
+        while not self.stopped.wait(self.poll_interval):
+            try:
+                self._check()
+            except Exception as e:
+                print(f"Model supervisor: {e}", file=sys.stderr)
+
+    def _check(self):
+        with self.lock:
+            child = self.child
+            idle = self.active == 0 and time.monotonic() - self.last_used
+        if child is None:
+            return
+        if child.exited.is_set():
+            if child.reason is None and child.load_error is None:
+                self._crashed(child)
+            return
+        if self.idle_timeout and idle and idle > self.idle_timeout:
+            with self.lock:
+                if self.child is not child or self.active:
+                    return
+                self.child = None
+            child.quit("Model worker was unloaded while idle")
+            self.stats["idle_unloads"] += 1
+            tracer.count("worker_idle_unloads")
+            return
+        if self.memory_budget_mb and child.loaded.is_set():
+            rss = self.rss_mb()
+            if rss > self.memory_budget_mb:
+                self._over_budget(child, rss)
+
+    def _over_budget(self, child, rss):
+        reason = f"Model worker used {rss:.0f} MB, over its {self.memory_budget_mb:.0f} MB budget"
+        with self.lock:
+            if self.child is child:
+                self.child = None
+        child.kill(reason)
+        self.stats["over_budget"] += 1
+        tracer.count("worker_over_budget")
+        if self.over_budget == "downgrade" and self.backend in DOWNGRADE:
+            self.backend = DOWNGRADE[self.backend]
+            reason += f"; switching to the {self.backend} backend"
+        print(reason, file=sys.stderr)
+        self._reload()
+
+    def _crashed(self, child):
+        with self.lock:
+            if self.child is not child:
+                return
+            self.child = None
+        self.stats["crashes"] += 1
+        tracer.count("worker_crashes")
+        now = time.monotonic()
+        while self.crashes and now - self.crashes[0] > RESTART_WINDOW:
+            self.crashes.popleft()
+        self.crashes.append(now)
+        print(f"Model worker exited unexpectedly (exit code {child.process.returncode})", file=sys.stderr)
+        # A cold worker is simply started again by the next request
+        if child.loaded.is_set() and len(self.crashes) <= MAX_RESTARTS:
+            self._reload()
+
+    def _reload(self):
+        # Bring a warm worker back without waiting for it to load
+        try:
+            child = self._ensure_child()
+            child.send("load")
+            self.stats["restarts"] += 1
+        except WorkerError as e:
+            print(f"Could not restart the model worker: {e}", file=sys.stderr)
+
+    def status(self):
+        child = self.child
+        running = child is not None and not child.exited.is_set()
+        status = {"running": running, "loaded": self.is_loaded, "backend": self.backend,
+                  "pid": child.pid if running else None, "rss_mb": round(self.rss_mb(), 1)}
+        status.update(self.stats)
+        return status
+
+    def close(self):
+        self.stopped.set()
+        with self.lock:
+            child, self.child = self.child, None
+        if child is not None and not child.exited.is_set():
+            child.quit("Model worker has been shut down")
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Talk to the language model through a worker process")
+    sub = parser.add_subparsers(dest="command", required=True)
+    ask = sub.add_parser("ask", help="send prompts to a worker and report its memory use")
+    ask.add_argument("prompts", nargs="+")
+    ask.add_argument("--memory-budget", type=float, default=None, help="MB of RSS before the worker is restarted")
+    ask.add_argument("--over-budget", default="restart", choices=("restart", "downgrade"))
+    # Internal: the worker process itself
+    serve = sub.add_parser("_serve")
+    for p in (ask, serve):
+        p.add_argument("--model", default=DEFAULT_MODEL)
+        p.add_argument("--backend", default="eager", choices=BACKENDS)
+        p.add_argument("--threads", type=int, default=None)
+        p.add_argument("--max-new-tokens", type=int, default=MAX_NEW_TOKENS)
+    args = parser.parse_args(argv)
+
+    if args.command == "_serve":
+        # stdout only carries the address; anything printed later goes to stderr
+        address_out, sys.stdout = sys.stdout, sys.stderr
+        _serve(address_out, args.model, args.backend, args.threads, args.max_new_tokens)
+        return
+    worker = ModelWorker(args.model, args.backend, args.threads, args.max_new_tokens,
+                         memory_budget_mb=args.memory_budget, over_budget=args.over_budget)
+    try:
+        started = time.perf_counter()
+        worker.load()
+        print(f"loaded {worker.backend} in {time.perf_counter() - started:.1f}s, "
+              f"worker RSS {worker.rss_mb():.0f} MB")
+        for prompt in args.prompts:
+            started = time.perf_counter()
+            reply = "".join(worker.generate(prompt))
+            print(f"> {prompt}\n{reply}  ({(time.perf_counter() - started) * 1000:.0f} ms)")
+        print(worker.status())
+    except WorkerError as e:
+        print(e, file=sys.stderr)
+        return 1
+    finally:
+        worker.close()
+
+if __name__ == '__main__':
+    sys.exit(main())
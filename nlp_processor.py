@@ -1,94 +1,338 @@
-import torch
-from transformers import AutoModelForCausalLM, AutoTokenizer
-import requests
-from bs4 import BeautifulSoup
-import os
-import json
+import re
+import time
+import queue
+import threading
+from startup_profiler import profiler
+from kb_store import KnowledgeStore
+from kb_index import KnowledgeIndex
+from dialogue_context import DialogueContext
+from web_lookup import WebLookup
+from tracing import tracer
+from inference_backend import load_backend, decode_turn, DEFAULT_MODEL, MAX_NEW_TOKENS
+
+# torch, transformers, requests and bs4 are imported on first use so the GUI
+# can come up before the heavy libraries are loaded
+
+# A sentence ends at ., ! or ? followed by whitespace
+SENTENCE_END = re.compile(r'[.!?]+(?=\s)')
 
 class NLPProcessor:
-    def __init__(self):
-        self.model_name = "microsoft/DialoGPT-small"  # Using smaller model for better compatibility
-        self.tokenizer = AutoTokenizer.from_pretrained(self.model_name)
-        self.model = AutoModelForCausalLM.from_pretrained(self.model_name)
-        self.conversation_history = []
-        self.knowledge_base = {}
-        self.load_knowledge_base()
-        
-    def load_knowledge_base(self):
-        if os.path.exists('knowledge_base.json'):
-            try:
-                with open('knowledge_base.json', 'r') as f:
-                    self.knowledge_base = json.load(f)
-            except:
-                self.knowledge_base = {}
-                
-    def save_knowledge_base(self):
-        with open('knowledge_base.json', 'w') as f:
-            json.dump(self.knowledge_base, f)
-            
-    def search_web(self, query):
+    def __init__(self, lazy=True, kb_path="knowledge_base.db", kb_max_entries=10000, kb_ttl=None,
+                 backend="eager", threads=None, max_new_tokens=MAX_NEW_TOKENS,
+                 web=None, web_deadline=1.5, deadline=10.0, kb_similarity=0.85, worker=None):
+        self.model_name = DEFAULT_MODEL  # Using smaller model for better compatibility
+        # See inference_backend.py: eager, int8 or onnx, with explicit torch threads
+        self.backend = backend
+        self.threads = threads
+        self.max_new_tokens = max_new_tokens
+        self._tokenizer = None
+        self._model = None
+        self._model_lock = threading.Lock()
+        self._warmup_thread = None
+        self._warmup_failed = False
+        self.dialogue = DialogueContext()
+        # Set by the headless engine to answer model queries in batches
+        self.batcher = None
+        # A model_worker.ModelWorker runs the model and the conversation's
+        # cache in a separate process instead of this one
+        self.worker = worker
+        # Seconds a web answer is preferred for, and the overall budget for
+        # any answer to start (see _resolve)
+        self.web = web or WebLookup()
+        self.web_deadline = web_deadline
+        self.deadline = deadline
+        with profiler.phase("open knowledge base"):
+            self.knowledge_base = KnowledgeStore(kb_path, max_entries=kb_max_entries, ttl=kb_ttl)
+        # Answers rephrased questions from the cache too ("whats the capital
+        # of france" / "what is the capital of France?"); None turns it off
+        self.kb_index = None
+        if kb_similarity is not None:
+            self.kb_index = KnowledgeIndex(self.knowledge_base, threshold=kb_similarity)
+        if not lazy:
+            self.load_model()
+
+    @property
+    def tokenizer(self):
+        self.load_model()
+        return self._tokenizer
+
+    @property
+    def model(self):
+        self.load_model()
+        return self._model
+
+    @property
+    def is_model_loaded(self):
+        if self.worker is not None:
+            return self.worker.is_loaded
+        return self._model is not None
+
+    def load_model(self):
+        if self.worker is not None:
+            self.worker.load()
+            return
+        if self._model is not None:
+            return
+        with self._model_lock:
+            if self._model is not None:
+                return
+            tokenizer, model = load_backend(self.model_name, self.backend, self.threads)
+            self._tokenizer = tokenizer
+            self._model = model
+
+    def warm_up(self):
+        # Load the model on a background thread; generate_response waits on the
+        # same lock if a query arrives before warm-up has finished. A worker
+        # that has been unloaded while idle is warmed up again.
+        thread = self._warmup_thread
+        if thread is not None and (thread.is_alive() or self.worker is None or self._warmup_failed):
+            return thread
+        if self.is_model_loaded:
+            return thread
+        self._warmup_thread = threading.Thread(target=self._warm_up, name="nlp-warmup", daemon=True)
+        self._warmup_thread.start()
+        return self._warmup_thread
+
+    def _warm_up(self):
         try:
-            # Use DuckDuckGo for privacy-focused search
-            search_url = f"https://html.duckduckgo.com/html/?q={query.replace(' ', '+')}"
-            headers = {'User-Agent': 'Mozilla/5.0'}
-            response = requests.get(search_url, headers=headers)
-            soup = BeautifulSoup(response.text, 'html.parser')
-            
-            # Extract search results
-            results = []
-            for result in soup.find_all('div', class_='result'):
-                title = result.find('h2')
-                snippet = result.find('a', class_='result__snippet')
-                if title and snippet:
-                    results.append({
-                        'title': title.text.strip(),
-                        'snippet': snippet.text.strip()
-                    })
-                    
-            return results[:3]  # Return top 3 results
+            self.load_model()
         except Exception as e:
-            return []
+            self._warmup_failed = True
+            print(f"Model warm-up failed: {e}")
+        
+    def search_web(self, query):
+        return self.web.search(query)
             
     def generate_response(self, query, context=None):
-        # Check if query is a system command
-        if query.lower().startswith(('open', 'set reminder', 'what time', 'what date')):
+        chunks = self.generate_response_stream(query)
+        if chunks is None:
             return None
-            
-        # Add query to conversation history
-        self.conversation_history.append(query)
-        
+        return "".join(chunks)
+
+    def generate_response_stream(self, query, should_stop=None, check_commands=True):
+        # Returns None for system commands, otherwise an iterator of text chunks.
+        # Cached and web answers arrive as a single chunk; DialoGPT output is
+        # streamed token by token while generation runs on a helper thread.
+        # Callers that have already routed the query pass check_commands=False.
+        if check_commands and query.lower().startswith(('open', 'set reminder', 'what time', 'what date')):
+            return None
+
         # Check knowledge base first
-        if query in self.knowledge_base:
-            return self.knowledge_base[query]
+        with tracer.span("kb"):
+            cached = self.knowledge_base.get(query)
+            if cached is None and self.kb_index is not None:
+                similar = self.kb_index.lookup(query)
+                if similar is not None:
+                    cached = similar[1]
+        if cached is not None:
+            tracer.count("kb_hits")
+            self._remember(query, cached)
+            return iter([cached])
+        tracer.count("kb_misses")
             
-        # Search web for information
-        search_results = self.search_web(query)
+        return self._resolve(query, should_stop)
+
+    def _resolve(self, query, should_stop=None):
+        # The web lookup starts at once. The local model races it only when
+        # it is already loaded; otherwise it is loaded after the web has
+        # missed or web_deadline has passed, so a web answer never pays for
+        # loading it. The first complete answer wins: a web result within
+        # web_deadline (the model is stopped), or a model reply that finished
+        # before the web came back. Past web_deadline the model's reply is
+        # streamed and the lookup is left to finish in the background (it
+        # still fills the web cache). None if the model has produced nothing
+        # by the overall deadline.
+        started = time.monotonic()
+        web_won = threading.Event()
+        closed = threading.Event()
+        # Set once the model has finished a non-empty reply
+        model_answered = threading.Event()
+        # Set whenever the lookup or the model finishes
+        wake = threading.Event()
+        chunks = queue.Queue()
+
+        def stop():
+            return web_won.is_set() or closed.is_set() or bool(should_stop and should_stop())
+
+        def pump():
+            try:
+                if self.batcher is not None:
+                    stream = self._batched(query, stop)
+                elif self.worker is not None:
+                    stream = self._stream_worker(query, stop, keep=lambda: not web_won.is_set())
+                else:
+                    # A reply that lost to the web is not kept in the conversation
+                    stream = self._stream_model(query, stop, keep=lambda: not web_won.is_set())
+                answered = False
+                for text in stream:
+                    chunks.put(text)
+                    answered = answered or bool(text.strip())
+                if answered:
+                    model_answered.set()
+            except Exception as e:
+                chunks.put(e)
+            finally:
+                chunks.put(None)
+                wake.set()
+
+        def start_model():
+            threading.Thread(target=tracer.wrap(pump), name="nlp-model", daemon=True).start()
+
+        lookup = self.web.submit(query)
+        lookup.add_done_callback(lambda future: wake.set())
+        racing = self.is_model_loaded
+        if racing:
+            start_model()
+        search_results = None
+        while True:
+            if lookup.done():
+                try:
+                    search_results = lookup.result()
+                except Exception:
+                    search_results = None
+                break
+            remaining = self.web_deadline - (time.monotonic() - started)
+            if model_answered.is_set() or remaining <= 0:
+                break
+            wake.wait(remaining)
+            wake.clear()
         if search_results:
+            tracer.count("web_answers")
+            web_won.set()
+            answer = search_results[0]['snippet']
             # Store in knowledge base
-            self.knowledge_base[query] = search_results[0]['snippet']
-            self.save_knowledge_base()
-            return search_results[0]['snippet']
-            
-        # Generate response using DialoGPT
-        input_ids = self.tokenizer.encode(query + self.tokenizer.eos_token, return_tensors='pt')
-        response_ids = self.model.generate(
-            input_ids,
-            max_length=1000,
-            pad_token_id=self.tokenizer.eos_token_id,
-            no_repeat_ngram_size=3,
-            do_sample=True,
-            top_k=100,
-            top_p=0.7,
-            temperature=0.8
-        )
-        
-        response = self.tokenizer.decode(response_ids[:, input_ids.shape[-1]:][0], skip_special_tokens=True)
-        
-        # Store in knowledge base
-        self.knowledge_base[query] = response
-        self.save_knowledge_base()
-        
-        return response
-        
+            self.knowledge_base.put(query, answer)
+            self._remember(query, answer)
+            return iter([answer])
+        lookup.cancel()
+        if not racing:
+            start_model()
+        try:
+            first = chunks.get(timeout=max(0.0, self.deadline - (time.monotonic() - started)))
+        except queue.Empty:
+            closed.set()
+            return None
+        if isinstance(first, Exception):
+            raise first
+        if first is None:
+            return None
+        return self._drain(first, chunks, closed)
+
+    def _drain(self, first, chunks, closed):
+        try:
+            text = first
+            while text is not None:
+                if isinstance(text, Exception):
+                    raise text
+                yield text
+                text = chunks.get()
+        finally:
+            # Also reached when the consumer abandons the stream early
+            closed.set()
+
+    def _batched(self, query, should_stop=None):
+        # One independent reply per query, generated together with whatever
+        # other clients asked at the same time
+        if should_stop and should_stop():
+            return
+        with tracer.span("generate"):
+            response = self.batcher.submit(query, should_stop)
+        if response.strip() and not (should_stop and should_stop()):
+            self.knowledge_base.put(query, response)
+        yield response
+
+    def _remember(self, query, answer):
+        # Answers from the cache or the web are part of the conversation too
+        if self.worker is not None:
+            self.worker.add_text(query, answer)
+        else:
+            self.dialogue.add_text(query, answer)
+
+    def _stream_worker(self, query, should_stop=None, keep=None):
+        # _stream_model with the model in the worker process
+        if should_stop and should_stop():
+            return
+        parts = []
+        with tracer.span("generate"):
+            for text in self.worker.generate(query, should_stop, keep):
+                parts.append(text)
+                yield text
+        response = "".join(parts)
+        if response.strip() and not (should_stop and should_stop()):
+            self.knowledge_base.put(query, response)
+
+    def _stream_model(self, query, should_stop=None, keep=None):
+        # DialoGPT continues the conversation in self.dialogue: only the new
+        # tokens are run through the model, on top of the cached keys/values
+        # of the earlier turns. The decode loop runs on a helper thread and
+        # hands text to this generator through a queue.
+        if should_stop and should_stop():
+            # Lost the race before starting; do not load or run the model
+            return
+        stop_event = threading.Event()
+        tokenizer = self.tokenizer
+        model = self.model
+        chunks = queue.Queue()
+        errors = []
+        request = tracer.current()
+
+        def run():
+            try:
+                with self.dialogue.lock, tracer.span("generate", request):
+                    decode_turn(model, tokenizer, self.dialogue, query, chunks.put,
+                                lambda: stop_event.is_set() or bool(should_stop and should_stop()),
+                                self.max_new_tokens, keep)
+            except Exception as e:
+                errors.append(e)
+            finally:
+                chunks.put(None)
+
+        generation = threading.Thread(target=run, name="nlp-generate", daemon=True)
+        generation.start()
+
+        parts = []
+        try:
+            while True:
+                text = chunks.get()
+                if text is None:
+                    break
+                parts.append(text)
+                yield text
+        finally:
+            # Also reached when the consumer abandons the stream early
+            stop_event.set()
+        generation.join()
+        if errors:
+            raise errors[0]
+
+        response = "".join(parts)
+        if response.strip() and not (should_stop and should_stop()):
+            # Store in knowledge base
+            self.knowledge_base.put(query, response)
+
     def clear_history(self):
-        self.conversation_history = [] 
\ No newline at end of file
+        self.dialogue.clear()
+        if self.worker is not None:
+            self.worker.clear()
+
+class SentenceSplitter:
+    # Collects streamed text and hands back complete sentences as soon as
+    # their terminating punctuation has arrived
+    def __init__(self):
+        self.buffer = ""
+
+    def feed(self, text):
+        self.buffer += text
+        sentences = []
+        while True:
+            match = SENTENCE_END.search(self.buffer)
+            if not match:
+                break
+            sentences.append(self.buffer[:match.end()].strip())
+            self.buffer = self.buffer[match.end():]
+        return [sentence for sentence in sentences if sentence]
+
+    def flush(self):
+        rest = self.buffer.strip()
+        self.buffer = ""
+        return [rest] if rest else []
@@ -0,0 +1,252 @@
+import os
+import sys
+import json
+import time
+import argparse
+from tracing import tracer
+from audio_capture import (AudioCapture, UtteranceSegmenter, VoiceActivityDetector, WavSource,
+                           SAMPLE_RATE, SAMPLE_WIDTH)
+
+DEFAULT_MODEL_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'models', 'vosk-model-small-en-us')
+
+class RecognitionError(Exception):
+    pass
+
+class StreamingRecognizer:
+    # One utterance at a time: start(), accept() audio as it arrives (returns
+    # the current partial hypothesis or None), then finish() for the final text
+    supports_partials = False
+
+    def start(self):
+        raise NotImplementedError
+
+    def accept(self, pcm):
+        raise NotImplementedError
+
+    def finish(self):
+        raise NotImplementedError
+
+class VoskRecognizer(StreamingRecognizer):
+    # Local CPU-only decoding with a Kaldi model loaded from disk
+    supports_partials = True
+
+    def __init__(self, model_path=DEFAULT_MODEL_PATH, sample_rate=SAMPLE_RATE):
+        if not os.path.isdir(model_path):
+            raise RecognitionError(f"Speech model not found at {model_path}")
+        from vosk import Model, SetLogLevel
+        SetLogLevel(-1)
+        self.model = Model(model_path)
+        self.sample_rate = sample_rate
+        self.decoder = None
+        self.segments = []
+
+    def start(self):
+        from vosk import KaldiRecognizer
+        if self.decoder is None:
+            self.decoder = KaldiRecognizer(self.model, self.sample_rate)
+        else:
+            self.decoder.Reset()
+        self.segments = []
+
+    def accept(self, pcm):
+        if self.decoder.AcceptWaveform(pcm):
+            # Vosk found an endpoint of its own inside our utterance
+            text = json.loads(self.decoder.Result()).get("text", "")
+            if text:
+                self.segments.append(text)
+            return " ".join(self.segments) or None
+        partial = json.loads(self.decoder.PartialResult()).get("partial", "")
+        return " ".join(self.segments + [partial]).strip() or None
+
+    def finish(self):
+        text = json.loads(self.decoder.FinalResult()).get("text", "")
+        return " ".join(self.segments + [text]).strip()
+
+class GoogleRecognizer(StreamingRecognizer):
+    # The previous online behaviour: buffer the utterance, send it on finish
+    def __init__(self):
+        import speech_recognition as sr
+        self.sr = sr
+        self.recognizer = sr.Recognizer()
+        self.chunks = []
+
+    def start(self):
+        self.chunks = []
+
+    def accept(self, pcm):
+        self.chunks.append(pcm)
+        return None
+
+    def finish(self):
+        audio = self.sr.AudioData(b"".join(self.chunks), SAMPLE_RATE, SAMPLE_WIDTH)
+        try:
+            return self.recognizer.recognize_google(audio)
+        except self.sr.UnknownValueError:
+            return ""
+        except self.sr.RequestError as e:
+            raise RecognitionError(f"Could not request results: {e}")
+
+def create_recognizer(backend="auto", model_path=DEFAULT_MODEL_PATH):
+    # "auto" stays offline: without a local model it fails rather than sending
+    # the microphone audio to Google, which has to be asked for by name
+    if backend in ("vosk", "auto"):
+        if backend == "auto" and not os.path.isdir(model_path):
+            raise RecognitionError(f"No local speech model at {model_path}; install one "
+                                   "or pass --asr google to use Google's online recognizer")
+        return VoskRecognizer(model_path)
+    if backend == "google":
+        return GoogleRecognizer()
+    raise ValueError(f"Unknown recognizer backend: {backend}")
+
+class StreamingTranscriber:
+    # Feeds VAD-segmented audio from the shared capture into a recognizer as it
+    # arrives, reporting partial hypotheses during speech and a final result at
+    # end of speech. With a keyword spotter the recognizer stays idle until the
+    # keyword fires, then decodes what follows it and any utterance that starts
+    # within awake_seconds of the last one.
+    def __init__(self, capture, recognizer, vad=None, on_partial=None, on_final=None,
+                 on_error=None, on_speech_end=None, batch_frames=3,
+                 spotter=None, on_wake=None, awake_seconds=8.0):
+        self.capture = capture
+        self.recognizer = recognizer
+        self.segmenter = UtteranceSegmenter(capture, vad)
+        self.on_partial = on_partial
+        self.on_final = on_final
+        self.on_error = on_error
+        self.on_speech_end = on_speech_end
+        # Frames handed to the decoder per call (3 x 30 ms)
+        self.batch_frames = batch_frames
+        self.spotter = spotter
+        self.on_wake = on_wake
+        self.awake_frames = int(awake_seconds * SAMPLE_RATE / capture.ring.frame_samples)
+
+    def run(self, should_stop=lambda: False):
+        ring = self.capture.ring
+        in_speech = False
+        decoding = False
+        awake_until = -1
+        fed = 0
+        last_partial = None
+        for seq, event in self.segmenter.events(should_stop):
+            try:
+                if self.spotter is not None and \
+                        self.spotter.process(seq, ring.frame(seq), ring.frame_energy(seq)) is not None:
+                    awake_until = seq + self.awake_frames
+                    if self.on_wake:
+                        self.on_wake()
+                    if in_speech and not decoding:
+                        # Decode only what follows the keyword
+                        decoding = True
+                        last_partial = None
+                        self.recognizer.start()
+                        fed = seq + 1
+                if event and event[0] == "start":
+                    in_speech = True
+                    if self.spotter is None or seq < awake_until:
+                        decoding = True
+                        last_partial = None
+                        self.recognizer.start()
+                        # Pre-roll frames before the trigger are already in the ring
+                        fed = event[1]
+                if decoding and (event is None or event[0] == "start"):
+                    if seq + 1 - fed < self.batch_frames:
+                        continue
+                    partial = self.recognizer.accept(ring.samples(fed, seq + 1).tobytes())
+                    fed = seq + 1
+                    if partial and partial != last_partial and self.on_partial:
+                        last_partial = partial
+                        self.on_partial(partial)
+                elif event and event[0] == "end":
+                    in_speech = False
+                    if not decoding:
+                        continue
+                    decoding = False
+                    if self.on_speech_end:
+                        self.on_speech_end(event[1], event[2])
+                    # A request starts when the user stops speaking
+                    with tracer.use(tracer.new_request()):
+                        with tracer.span("asr"):
+                            if fed < event[2]:
+                                self.recognizer.accept(ring.samples(fed, event[2]).tobytes())
+                            text = self.recognizer.finish()
+                        awake_until = max(awake_until, event[2] + self.awake_frames)
+                        if text and self.on_final:
+                            self.on_final(text, event[1], event[2])
+            except RecognitionError as e:
+                in_speech = False
+                decoding = False
+                if self.on_error:
+                    self.on_error(e)
+            except Exception as e:
+                # Anything else is a bug or a broken decoder; report it and stop
+                # instead of dying silently on the listening thread
+                if self.on_error:
+                    self.on_error(e)
+                else:
+                    print(f"Speech recognition stopped: {e}", file=sys.stderr)
+                return
+
+def replay(paths, backend="auto", model_path=DEFAULT_MODEL_PATH, realtime=False, quiet=False):
+    # Runs WAV files through capture -> VAD -> recognizer and reports latency
+    # and real-time factor for each
+    recognizer = create_recognizer(backend, model_path)
+    results = []
+    for path in paths:
+        source = WavSource(path, realtime=realtime)
+        capture = AudioCapture(source)
+        stats = {"file": path, "finals": [], "partials": 0, "first_partial_ms": None,
+                 "final_latency_ms": []}
+        started = time.perf_counter()
+        speech_ended = []
+
+        def on_partial(text):
+            stats["partials"] += 1
+            if stats["first_partial_ms"] is None:
+                stats["first_partial_ms"] = (time.perf_counter() - started) * 1000
+            if not quiet:
+                print(f"  ... {text}")
+
+        def on_speech_end(start, end):
+            speech_ended.append(time.perf_counter())
+
+        def on_final(text, start, end):
+            # Time from the VAD declaring end of speech to the final transcript
+            stats["finals"].append(text)
+            stats["final_latency_ms"].append((time.perf_counter() - speech_ended[-1]) * 1000)
+            if not quiet:
+                print(f"  >>> {text}")
+
+        transcriber = StreamingTranscriber(capture, recognizer, VoiceActivityDetector(),
+                                           on_partial, on_final,
+                                           on_error=lambda e: print(f"  !!! {e}"),
+                                           on_speech_end=on_speech_end)
+        capture.start()
+        transcriber.run()
+        elapsed = time.perf_counter() - started
+        stats["audio_seconds"] = source.duration
+        stats["processing_seconds"] = elapsed
+        stats["rtf"] = elapsed / source.duration if source.duration else None
+        results.append(stats)
+    return results
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Replay WAV files through the speech recognizer")
+    parser.add_argument("wavs", nargs="+", help="16-bit WAV files to replay")
+    parser.add_argument("--backend", default="auto", choices=["auto", "vosk", "google"])
+    parser.add_argument("--model", default=DEFAULT_MODEL_PATH, help="path to the local speech model")
+    parser.add_argument("--realtime", action="store_true", help="feed audio at real-time speed")
+    parser.add_argument("--json", action="store_true", help="print results as JSON")
+    args = parser.parse_args(argv)
+    results = replay(args.wavs, args.backend, args.model, args.realtime, quiet=args.json)
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    for r in results:
+        latencies = r["final_latency_ms"]
+        print(f"{r['file']}: {r['audio_seconds']:.2f}s audio in {r['processing_seconds']:.2f}s "
+              f"(RTF {r['rtf']:.3f}), first partial "
+              f"{'%.0f ms' % r['first_partial_ms'] if r['first_partial_ms'] is not None else 'n/a'}, "
+              f"final latency {max(latencies) if latencies else 0:.0f} ms max")
+
+if __name__ == '__main__':
+    sys.exit(main())
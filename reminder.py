@@ -1,72 +1,338 @@
-import datetime
-import json
 import os
-from threading import Timer
+import re
+import json
+import heapq
+import datetime
+import itertools
+import threading
+from dateutil import parser as date_parser
+from dateutil.relativedelta import relativedelta
+
+REPEATS = {
+    "hourly": relativedelta(hours=1),
+    "daily": relativedelta(days=1),
+    "weekly": relativedelta(weeks=1),
+    "monthly": relativedelta(months=1),
+}
+# "every day", "each monday", "daily" ... -> (repeat, weekday or None)
+_REPEAT_WORDS = re.compile(
+    r"\b(?:(?:every|each)\s+(hour|day|night|morning|evening|week|month|"
+    r"monday|tuesday|wednesday|thursday|friday|saturday|sunday)|(hourly|daily|nightly|weekly|monthly))\b")
+_WEEKDAY = re.compile(r"\b(mon|tue|wed|thu|fri|sat|sun)[a-z]*\b")
+_DAY_WORDS = re.compile(r"\b(today|tonight|tomorrow)\b")
+_ON_DATE = re.compile(r"\s+on\s+(\S+(?:\s+\S+)?)$")
+_NAMED_TIMES = {"noon": "12:00 pm", "midnight": "12:00 am"}
+_NAMED_TIME = re.compile(r"\b(noon|midnight)\b")
+_RELATIVE = re.compile(r"^in\s+(\d+|an?|one)\s+(second|minute|hour|day|week)s?$")
+# The scheduler re-reads the clock at least this often, so a suspended
+# laptop or a wall-clock change is noticed without waiting out a long timeout
+MAX_SLEEP = 60.0
+
+class SystemClock:
+    def now(self):
+        return datetime.datetime.now()
+
+    def wait(self, cond, timeout):
+        cond.wait(timeout)
+
+class FakeClock:
+    # Time only moves when advance() is called; waiting schedulers are woken so
+    # tests can step through days of reminders without sleeping
+    def __init__(self, start=None):
+        self.current = start or datetime.datetime(2024, 1, 1, 9, 0)
+        self.conditions = []
+
+    def now(self):
+        return self.current
+
+    def wait(self, cond, timeout):
+        # Called with cond held, so an advance() cannot slip in before the wait
+        if cond not in self.conditions:
+            self.conditions.append(cond)
+        cond.wait()
+
+    def advance(self, seconds=0, **kwargs):
+        self.current += datetime.timedelta(seconds=seconds, **kwargs)
+        for cond in self.conditions:
+            with cond:
+                cond.notify_all()
+
+def parse_repeat(text):
+    # Returns (text without the recurrence words, repeat, weekday name or None)
+    m = _REPEAT_WORDS.search(text)
+    if not m:
+        return text, None, None
+    unit = m.group(1) or m.group(2)
+    weekday = None
+    if unit in ("hour", "hourly"):
+        repeat = "hourly"
+    elif unit in ("week", "weekly"):
+        repeat = "weekly"
+    elif unit in ("month", "monthly"):
+        repeat = "monthly"
+    elif unit.endswith("day") and unit not in ("day", "daily"):
+        repeat, weekday = "weekly", unit
+    else:
+        repeat = "daily"
+    rest = (text[:m.start()] + text[m.end():]).strip()
+    return re.sub(r"\s+", " ", rest), repeat, weekday
+
+def _is_date(text):
+    try:
+        date_parser.parse(text)
+    except (ValueError, OverflowError):
+        return False
+    return True
+
+def parse_when(when, now):
+    # "3:00 pm", "5 pm tomorrow", "friday 9am", "october 20 at 17:30",
+    # "2026-03-01 08:00", "noon", "in 10 minutes". A bare time that has
+    # already passed today means tomorrow; a bare weekday means the next one.
+    when = _NAMED_TIME.sub(lambda m: _NAMED_TIMES[m.group(1)], when.strip().lower())
+    m = _RELATIVE.match(when)
+    if m:
+        count = int(m.group(1)) if m.group(1).isdigit() else 1
+        return now.replace(microsecond=0) + relativedelta(**{m.group(2) + "s": count})
+    day_offset = 0
+    day = _DAY_WORDS.search(when)
+    if day:
+        day_offset = 1 if day.group(1) == "tomorrow" else 0
+        when = (when[:day.start()] + when[day.end():]).strip()
+        if day.group(1) == "tonight" and not when:
+            when = "8 pm"
+    when = re.sub(r"\b(at|on|the)\b", " ", when).strip()
+    base = now.replace(second=0, microsecond=0)
+    # Parsing against two different default dates shows whether the text
+    # named a date at all
+    first = date_parser.parse(when, default=base, fuzzy=True)
+    second = date_parser.parse(when, default=base + datetime.timedelta(days=40), fuzzy=True)
+    has_date = first.date() == second.date()
+    when_dt = first + datetime.timedelta(days=day_offset)
+    if not has_date and not day and when_dt <= now:
+        # A named weekday that is today but already past means next week
+        when_dt += datetime.timedelta(days=7 if _WEEKDAY.search(when) else 1)
+    elif has_date and when_dt <= now and not re.search(r"\d{4}", when):
+        # "march 1" in December is next year's
+        when_dt += relativedelta(years=1)
+    return when_dt
+
+def next_occurrence(due, repeat, now):
+    # First repetition strictly after now, stepping from the original time so
+    # a recurring reminder does not drift
+    step = REPEATS[repeat]
+    count = 1
+    while due + step * count <= now:
+        count += 1
+    return due + step * count
+
+def describe(reminder, now=None):
+    due = datetime.datetime.fromisoformat(reminder["due"])
+    text = due.strftime("%I:%M %p")
+    soon = now is not None and datetime.timedelta(0) <= due - now < datetime.timedelta(days=1)
+    if not soon or reminder.get("repeat") == "weekly":
+        text += due.strftime(" on %A, %B %d")
+        if now is not None and due.year != now.year:
+            text += due.strftime(" %Y")
+    if reminder.get("repeat"):
+        text += {"hourly": " every hour", "daily": " every day", "weekly": " every week",
+                 "monthly": " every month"}[reminder["repeat"]]
+    return text
 
 class ReminderManager:
-    def __init__(self):
-        self.reminders = []
-        self.reminders_file = "reminders.json"
+    # One scheduler thread over a min-heap of (due, id). Adding a reminder is
+    # a heap push and a notify; the thread sleeps until the earliest one is due
+    # (re-checking the clock at least every MAX_SLEEP seconds). Cancelled or
+    # rescheduled entries are skipped lazily when they reach the top.
+    # Listeners are called as fn(reminder, message) on the scheduler thread.
+    def __init__(self, reminders_file="reminders.json", clock=None, autostart=True):
+        self.reminders_file = reminders_file
+        self.clock = clock or SystemClock()
+        self.reminders = {}
+        self.heap = []
+        self.ids = itertools.count(1)
+        self.cond = threading.Condition()
+        self.save_lock = threading.Lock()
+        self.listeners = []
+        self.thread = None
+        self.running = False
         self.load_reminders()
-        
+        if autostart:
+            self.start()
+
+    def add_listener(self, fn):
+        self.listeners.append(fn)
+
     def load_reminders(self):
-        if os.path.exists(self.reminders_file):
-            try:
-                with open(self.reminders_file, 'r') as f:
-                    self.reminders = json.load(f)
-            except:
-                self.reminders = []
-                
+        # Reminders saved before a restart are re-armed; ones that came due
+        # while the assistant was not running fire on the first run_pending()
+        if not os.path.exists(self.reminders_file):
+            return
+        try:
+            with open(self.reminders_file, 'r') as f:
+                saved = json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"Could not load reminders: {e}")
+            return
+        loaded = []
+        for reminder in saved:
+            if "due" not in reminder:
+                # Written by the old Timer-based manager: separate date and time
+                try:
+                    due = datetime.datetime.strptime(f"{reminder['date']} {reminder['time']}",
+                                                     "%Y-%m-%d %I:%M %p")
+                except (KeyError, ValueError):
+                    continue
+                reminder = {"text": reminder.get("text", ""), "due": due.isoformat(), "repeat": None}
+            loaded.append(reminder)
+        loaded.sort(key=lambda r: datetime.datetime.fromisoformat(r["due"]))
+        with self.cond:
+            # Renumbered on every start so ids stay small and unique
+            for reminder_id, reminder in enumerate(loaded, 1):
+                reminder["id"] = reminder_id
+                self._schedule(reminder)
+            self.ids = itertools.count(len(loaded) + 1)
+
     def save_reminders(self):
-        with open(self.reminders_file, 'w') as f:
-            json.dump(self.reminders, f)
-            
-    def add_reminder(self, text, time_str):
+        with self.save_lock:
+            with self.cond:
+                data = [dict(r) for r in sorted(self.reminders.values(), key=lambda r: r["id"])]
+            # Written to a temporary file first so a crash never leaves half a file
+            tmp = self.reminders_file + ".tmp"
+            with open(tmp, 'w') as f:
+                json.dump(data, f, indent=1)
+            os.replace(tmp, self.reminders_file)
+
+    def _schedule(self, reminder):
+        self.reminders[reminder["id"]] = reminder
+        heapq.heappush(self.heap, (datetime.datetime.fromisoformat(reminder["due"]), reminder["id"]))
+        self.cond.notify()
+
+    def add_reminder(self, text, time_str, repeat=None):
+        now = self.clock.now()
         try:
-            reminder_time = datetime.datetime.strptime(time_str, "%I:%M %p")
-            now = datetime.datetime.now()
-            reminder_time = now.replace(
-                hour=reminder_time.hour,
-                minute=reminder_time.minute,
-                second=0,
-                microsecond=0
-            )
-            
-            if reminder_time < now:
-                reminder_time = reminder_time + datetime.timedelta(days=1)
-                
-            reminder = {
-                "text": text,
-                "time": reminder_time.strftime("%I:%M %p"),
-                "date": reminder_time.strftime("%Y-%m-%d")
-            }
-            
-            self.reminders.append(reminder)
-            self.save_reminders()
-            
-            # Calculate seconds until reminder
-            seconds_until = (reminder_time - now).total_seconds()
-            
-            # Set timer for reminder
-            Timer(seconds_until, self.trigger_reminder, args=[reminder]).start()
-            
-            return f"Reminder set for {reminder['time']}"
-        except Exception as e:
+            text, text_repeat, text_weekday = parse_repeat(text)
+            time_str, time_repeat, time_weekday = parse_repeat(time_str)
+            repeat = repeat or time_repeat or text_repeat
+            weekday = time_weekday or text_weekday
+            # "call mom tomorrow" / "dentist on 10/20" + "5 pm": the day may
+            # have ended up in the text
+            day = _DAY_WORDS.search(text)
+            if day and day.end() == len(text):
+                time_str = f"{time_str} {day.group(1)}"
+                text = text[:day.start()].strip()
+            on_date = _ON_DATE.search(text)
+            if on_date and _is_date(on_date.group(1)):
+                time_str = f"{on_date.group(1)} {time_str}"
+                text = text[:on_date.start()].strip()
+            if weekday and weekday not in time_str:
+                time_str = f"{weekday} {time_str}"
+            due = parse_when(time_str, now)
+        except (ValueError, OverflowError) as e:
             return f"Error setting reminder: {str(e)}"
-            
-    def trigger_reminder(self, reminder):
-        # Remove the triggered reminder
-        self.reminders = [r for r in self.reminders if r != reminder]
+        if repeat is not None and repeat not in REPEATS:
+            return f"Error setting reminder: unknown repeat '{repeat}'"
+        if due <= now and repeat is None:
+            return "Error setting reminder: that time has already passed"
+        if due <= now:
+            due = next_occurrence(due, repeat, now)
+        reminder = {"text": text, "due": due.isoformat(), "repeat": repeat}
+        with self.cond:
+            reminder["id"] = next(self.ids)
+            self._schedule(reminder)
         self.save_reminders()
-        
-        # Return the reminder text
-        return f"Reminder: {reminder['text']}"
-        
+        return f"Reminder set for {describe(reminder, now)}"
+
+    def remove_reminder(self, reminder_id):
+        with self.cond:
+            removed = self.reminders.pop(reminder_id, None)
+        if removed is not None:
+            self.save_reminders()
+        return removed
+
+    def next_due(self):
+        with self.cond:
+            self._drop_stale()
+            return self.heap[0][0] if self.heap else None
+
+    def _drop_stale(self):
+        while self.heap:
+            due, rid = self.heap[0]
+            reminder = self.reminders.get(rid)
+            if reminder is not None and reminder["due"] == due.isoformat():
+                return
+            heapq.heappop(self.heap)
+
+    def run_pending(self):
+        # Fires everything due by the clock's current time and returns the
+        # messages; recurring reminders are re-armed for their next occurrence
+        now = self.clock.now()
+        fired = []
+        with self.cond:
+            while True:
+                self._drop_stale()
+                if not self.heap or self.heap[0][0] > now:
+                    break
+                due, rid = heapq.heappop(self.heap)
+                reminder = self.reminders[rid]
+                if now - due > datetime.timedelta(minutes=1):
+                    message = f"Missed reminder: {reminder['text']} (was due {due.strftime('%I:%M %p on %A, %B %d')})"
+                else:
+                    message = f"Reminder: {reminder['text']}"
+                fired.append((dict(reminder), message))
+                if reminder.get("repeat"):
+                    # Missed repetitions collapse into one delivery
+                    next_due = next_occurrence(due, reminder["repeat"], now)
+                    reminder["due"] = next_due.isoformat()
+                    heapq.heappush(self.heap, (next_due, rid))
+                else:
+                    del self.reminders[rid]
+        if fired:
+            self.save_reminders()
+        for reminder, message in fired:
+            for fn in self.listeners:
+                try:
+                    fn(reminder, message)
+                except Exception as e:
+                    print(f"Reminder listener failed: {e}")
+        return [message for _, message in fired]
+
+    def start(self):
+        if self.thread is None:
+            self.running = True
+            self.thread = threading.Thread(target=self._run, name="reminders", daemon=True)
+            self.thread.start()
+        return self
+
+    def stop(self):
+        with self.cond:
+            self.running = False
+            self.cond.notify_all()
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+
+    def _run(self):
+        while True:
+            self.run_pending()
+            with self.cond:
+                if not self.running:
+                    return
+                self._drop_stale()
+                timeout = MAX_SLEEP
+                if self.heap:
+                    timeout = min(MAX_SLEEP, max(0.0, (self.heap[0][0] - self.clock.now()).total_seconds()))
+                if timeout > 0:
+                    self.clock.wait(self.cond, timeout)
+                if not self.running:
+                    return
+
     def list_reminders(self):
-        if not self.reminders:
+        with self.cond:
+            pending = sorted(self.reminders.values(), key=lambda r: r["due"])
+        if not pending:
             return "No active reminders"
-            
+        now = self.clock.now()
         reminder_list = "Active reminders:\n"
-        for reminder in self.reminders:
-            reminder_list += f"- {reminder['text']} at {reminder['time']}\n"
-        return reminder_list 
\ No newline at end of file
+        for reminder in pending:
+            reminder_list += f"- {reminder['text']} at {describe(reminder, now)}\n"
+        return reminder_list
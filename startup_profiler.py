@@ -0,0 +1,47 @@
+import sys
+import time
+import threading
+from contextlib import contextmanager
+
+class StartupProfiler:
+    def __init__(self):
+        self.start_time = time.perf_counter()
+        self.phases = []
+        self.lock = threading.Lock()
+
+    @contextmanager
+    def phase(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, start, time.perf_counter())
+
+    def record(self, name, start, end):
+        with self.lock:
+            self.phases.append({
+                "name": name,
+                "thread": threading.current_thread().name,
+                "start": start - self.start_time,
+                "duration": end - start
+            })
+
+    def mark(self, name):
+        # Zero-length phase, used for milestones such as "window shown"
+        now = time.perf_counter()
+        self.record(name, now, now)
+
+    def report(self):
+        with self.lock:
+            phases = sorted(self.phases, key=lambda p: p["start"])
+        lines = ["Startup profile:"]
+        for p in phases:
+            lines.append(f"  {p['start'] * 1000:8.1f} ms  +{p['duration'] * 1000:8.1f} ms  "
+                         f"{p['name']} [{p['thread']}]")
+        return "\n".join(lines)
+
+    def print_report(self, stream=None):
+        print(self.report(), file=stream or sys.stderr)
+
+# Shared instance so every module records into the same timeline
+profiler = StartupProfiler()
@@ -0,0 +1,61 @@
+import os
+import time
+import pytest
+from app_index import AppIndex
+
+DESKTOP_ENTRY = """[Desktop Entry]
+Type=Application
+Name={name}
+Exec={command} %U
+"""
+
+def _executable(directory, name):
+    path = os.path.join(directory, name)
+    with open(path, 'w') as f:
+        f.write("#!/bin/sh\n")
+    os.chmod(path, 0o755)
+
+@pytest.fixture
+def index(tmp_path):
+    applications = tmp_path / "applications"
+    bin_dir = tmp_path / "bin"
+    applications.mkdir()
+    bin_dir.mkdir()
+    (applications / "firefox.desktop").write_text(DESKTOP_ENTRY.format(name="Firefox", command="firefox"))
+    (applications / "settings.desktop").write_text(
+        DESKTOP_ENTRY.format(name="Settings", command="gnome-control-center"))
+    (applications / "power.desktop").write_text(DESKTOP_ENTRY.format(name="Power Off", command="poweroff"))
+    for name in ("firefox", "gsettings", "file", "shutdown", "reboot", "rm", "htop"):
+        _executable(str(bin_dir), name)
+    return AppIndex(path=None, roots=[("desktop", str(applications)), ("path", str(bin_dir))],
+                    background=False, refresh_interval=3600)
+
+def test_menu_entries_match_fuzzily(index):
+    assert index.resolve("fire fox").source == "desktop"
+    assert index.resolve("the settings app").name == "Settings"
+
+def test_path_programs_need_their_exact_name(index):
+    assert index.resolve("htop").source == "path"
+    assert index.resolve("h top") is not None
+    assert index.resolve("htopp") is None
+    assert index.resolve("g settings thing") is None
+    assert index.resolve("a file") is None
+
+@pytest.mark.parametrize("spoken", ["shutdown", "shut down", "reboot", "rm", "power off"])
+def test_denied_programs_are_never_resolved(index, spoken):
+    assert index.resolve(spoken) is None
+
+def test_a_miss_does_not_rescan_on_the_request_thread(index):
+    scanned = index.stats["scanned"]
+    assert index.resolve("start the timer") is None
+    assert index.stats["scanned"] == scanned
+
+def test_new_apps_are_found_after_a_background_check(index, tmp_path):
+    _executable(str(tmp_path / "bin"), "newapp")
+    index.refresh_interval = 0
+    assert index.resolve("newapp") is None
+    for _ in range(100):
+        if not index.checking and index.resolve("newapp") is not None:
+            break
+        time.sleep(0.02)
+    assert index.resolve("newapp").source == "path"
@@ -0,0 +1,66 @@
+import datetime
+import pytest
+from intent_router import normalize
+from commands import CommandProcessor
+from reminder import ReminderManager, FakeClock
+
+class RecordingNLP:
+    # Answers every question with the text it was asked
+    def __init__(self):
+        self.queries = []
+
+    def generate_response_stream(self, query, should_stop=None, check_commands=True):
+        self.queries.append(query)
+        return iter([f"asked: {query}"])
+
+@pytest.fixture
+def nlp():
+    return RecordingNLP()
+
+@pytest.fixture
+def commands(nlp):
+    return CommandProcessor(None, nlp, apps=object())
+
+@pytest.mark.parametrize("text, expected", [
+    ("What is 3.5 times 2?", "what is 3.5 times 2"),
+    ("remind me at 9 a.m. to stretch", "remind me at 9 am to stretch"),
+    ("Jarvis, what is pi to 3.14159 please", "what is pi to 3.14159"),
+    ("set reminder dentist on 10/20 at 5:30 p.m.", "set reminder dentist on 10/20 at 5:30 pm"),
+])
+def test_normalize(text, expected):
+    assert normalize(text) == expected
+
+def test_questions_reach_the_nlp_as_said(commands, nlp):
+    result = commands.handle("  Jarvis, what is 3.5 times 2?  ")
+    assert "".join(result.stream) == "asked: Jarvis, what is 3.5 times 2?"
+    assert nlp.queries == ["Jarvis, what is 3.5 times 2?"]
+
+def test_look_up_is_answered_offline(commands, nlp):
+    result = commands.handle("look up the population of paris")
+    assert "".join(result.stream) == "asked: the population of paris"
+
+# A Sunday
+NOW = datetime.datetime(2026, 10, 18, 9, 0)
+
+@pytest.mark.parametrize("text, task, due", [
+    ("set reminder pay rent at 9am on 2026-11-01", "pay rent", "2026-11-01 09:00"),
+    ("set a reminder for 2026-11-01 at 9am to pay rent", "pay rent", "2026-11-01 09:00"),
+    ("Set a reminder for tomorrow at 9am to call mom", "call mom", "2026-10-19 09:00"),
+    ("remind me at noon to eat", "eat", "2026-10-18 12:00"),
+    ("remind me to eat at noon tomorrow", "eat", "2026-10-19 12:00"),
+    ("remind me to lock up at midnight", "lock up", "2026-10-19 00:00"),
+    ("remind me to call mom at 5 pm on october 20", "call mom", "2026-10-20 17:00"),
+    ("remind me to call mom at 5 pm tomorrow", "call mom", "2026-10-19 17:00"),
+    ("remind me on friday at 9am to pay rent", "pay rent", "2026-10-23 09:00"),
+    ("set reminder dentist on 10/20 at 5:30 pm", "dentist", "2026-10-20 17:30"),
+    ("remind me to take pills every day at 8 am", "take pills", "2026-10-19 08:00"),
+    ("remind me to stretch in 20 minutes", "stretch", "2026-10-18 09:20"),
+])
+def test_reminder_phrases(tmp_path, nlp, text, task, due):
+    manager = ReminderManager(str(tmp_path / "reminders.json"), clock=FakeClock(NOW), autostart=False)
+    commands = CommandProcessor(manager, nlp, apps=object())
+    assert commands.router.match(text).name == "set_reminder"
+    assert commands.handle(text).response.startswith("Reminder set for")
+    (reminder,) = manager.reminders.values()
+    assert reminder["text"] == task
+    assert reminder["due"] == datetime.datetime.strptime(due, "%Y-%m-%d %H:%M").isoformat()
@@ -0,0 +1,93 @@
+import time
+import pytest
+from web_lookup import StandInSearchServer, WebLookup
+from nlp_processor import NLPProcessor
+from benchmark import StandInModel
+
+ANSWERS = {
+    "who wrote hamlet": "Hamlet was written by William Shakespeare around 1600.",
+    "what is the capital of france": "Paris is the capital and largest city of France.",
+}
+
+@pytest.fixture
+def server():
+    server = StandInSearchServer(ANSWERS).start()
+    yield server
+    server.stop()
+
+@pytest.fixture
+def make_nlp(tmp_path, monkeypatch, server):
+    # No knowledge_base.json from the working directory is migrated in
+    monkeypatch.chdir(tmp_path)
+    made = []
+
+    def make(model_delay=0.05, warm=False, web_deadline=0.5, deadline=5.0):
+        nlp = NLPProcessor(kb_path=str(tmp_path / f"kb-{len(made)}.db"), web=WebLookup(server.url),
+                           web_deadline=web_deadline, deadline=deadline)
+        nlp.batcher = StandInModel(model_delay)
+        if warm:
+            # Counts as loaded, so the model races the lookup from the start
+            nlp._model = object()
+        made.append(nlp)
+        return nlp
+
+    yield make
+    for nlp in made:
+        nlp.web.close()
+        nlp.knowledge_base.close()
+
+def ask(nlp, query):
+    started = time.monotonic()
+    stream = nlp.generate_response_stream(query, check_commands=False)
+    return (None if stream is None else "".join(stream)), time.monotonic() - started
+
+def test_web_answer_does_not_load_the_model(make_nlp):
+    nlp = make_nlp()
+    answer, _ = ask(nlp, "who wrote hamlet")
+    assert answer == ANSWERS["who wrote hamlet"]
+    assert nlp.batcher.calls == 0
+    assert nlp.knowledge_base.get("who wrote hamlet") == answer
+
+def test_web_beats_a_slow_warm_model(make_nlp):
+    nlp = make_nlp(model_delay=1.0, warm=True)
+    answer, elapsed = ask(nlp, "who wrote hamlet")
+    assert answer == ANSWERS["who wrote hamlet"]
+    assert elapsed < 1.0
+
+def test_knowledge_base_hit_skips_web_and_model(make_nlp, server):
+    nlp = make_nlp()
+    nlp.knowledge_base.put("what is the capital of france", "Paris.")
+    nlp.kb_index.ready.wait(5.0)
+    assert ask(nlp, "what is the capital of france")[0] == "Paris."
+    assert ask(nlp, "whats the capital of france")[0] == "Paris."
+    assert server.requests == 0
+    assert nlp.batcher.calls == 0
+
+def test_web_miss_falls_back_to_the_model(make_nlp, server):
+    nlp = make_nlp()
+    answer, _ = ask(nlp, "tell me a story")
+    assert answer == StandInModel.REPLY
+    assert server.requests == 1
+    assert nlp.batcher.calls == 1
+
+def test_slow_web_loses_at_the_deadline(make_nlp, server):
+    server.delay = 2.0
+    nlp = make_nlp(web_deadline=0.3)
+    answer, elapsed = ask(nlp, "who wrote hamlet")
+    assert answer == StandInModel.REPLY
+    assert elapsed < 1.5
+    assert nlp.batcher.calls == 1
+
+def test_warm_model_that_finishes_first_wins(make_nlp, server):
+    server.delay = 1.0
+    nlp = make_nlp(warm=True, web_deadline=1.5)
+    answer, elapsed = ask(nlp, "who wrote hamlet")
+    assert answer == StandInModel.REPLY
+    assert elapsed < 0.9
+
+def test_nothing_by_the_overall_deadline(make_nlp, server):
+    server.delay = 2.0
+    nlp = make_nlp(model_delay=2.0, web_deadline=0.2, deadline=0.5)
+    answer, elapsed = ask(nlp, "who wrote hamlet")
+    assert answer is None
+    assert elapsed < 1.5
@@ -0,0 +1,92 @@
+import json
+import datetime
+import threading
+import pytest
+from reminder import ReminderManager, FakeClock
+
+START = datetime.datetime(2026, 3, 2, 9, 0)
+
+@pytest.fixture
+def clock():
+    return FakeClock(START)
+
+@pytest.fixture
+def path(tmp_path):
+    return str(tmp_path / "reminders.json")
+
+def test_fires_when_due(clock, path):
+    manager = ReminderManager(path, clock=clock, autostart=False)
+    heard = []
+    manager.add_listener(lambda reminder, message: heard.append((reminder["text"], message)))
+    assert manager.add_reminder("stretch", "in 10 minutes").startswith("Reminder set for")
+    clock.advance(minutes=9)
+    assert manager.run_pending() == []
+    clock.advance(minutes=1)
+    assert manager.run_pending() == ["Reminder: stretch"]
+    assert heard == [("stretch", "Reminder: stretch")]
+    assert manager.reminders == {}
+    assert manager.run_pending() == []
+
+def test_scheduler_thread_fires_on_fake_clock(clock, path):
+    manager = ReminderManager(path, clock=clock)
+    fired = threading.Event()
+    messages = []
+
+    def listener(reminder, message):
+        messages.append(message)
+        fired.set()
+
+    manager.add_listener(listener)
+    try:
+        manager.add_reminder("call mom", "5 pm")
+        clock.advance(hours=7, minutes=59)
+        assert not fired.wait(0.2)
+        clock.advance(minutes=1)
+        assert fired.wait(2.0)
+        assert messages == ["Reminder: call mom"]
+    finally:
+        manager.stop()
+
+def test_daily_reminder_is_rearmed(clock, path):
+    manager = ReminderManager(path, clock=clock, autostart=False)
+    manager.add_reminder("take pills every day", "8 am")
+    clock.advance(hours=23)
+    assert manager.run_pending() == ["Reminder: take pills"]
+    (reminder,) = manager.reminders.values()
+    assert reminder["due"] == "2026-03-04T08:00:00"
+
+def test_restored_after_restart(clock, path):
+    ReminderManager(path, clock=clock, autostart=False).add_reminder("water the plants", "6:30 pm")
+    restarted = ReminderManager(path, clock=clock, autostart=False)
+    (reminder,) = restarted.reminders.values()
+    assert reminder["text"] == "water the plants"
+    assert restarted.next_due() == datetime.datetime(2026, 3, 2, 18, 30)
+    clock.advance(hours=9, minutes=30)
+    assert restarted.run_pending() == ["Reminder: water the plants"]
+    # Fired reminders are gone from the file too
+    assert ReminderManager(path, clock=clock, autostart=False).reminders == {}
+
+def test_due_while_closed_is_announced_as_missed(clock, path):
+    ReminderManager(path, clock=clock, autostart=False).add_reminder("dentist", "10 am")
+    clock.advance(hours=3)
+    restarted = ReminderManager(path, clock=clock, autostart=False)
+    (message,) = restarted.run_pending()
+    assert message.startswith("Missed reminder: dentist (was due 10:00 AM")
+
+def test_restarted_ids_do_not_collide(clock, path):
+    manager = ReminderManager(path, clock=clock, autostart=False)
+    for text in ("one", "two", "three"):
+        manager.add_reminder(text, "in 1 hour")
+    manager.remove_reminder(1)
+    restarted = ReminderManager(path, clock=clock, autostart=False)
+    restarted.add_reminder("four", "in 2 hours")
+    assert sorted(restarted.reminders) == [1, 2, 3]
+    with open(path) as f:
+        assert [r["text"] for r in json.load(f)] == ["two", "three", "four"]
+
+def test_legacy_file_is_loaded(clock, path):
+    with open(path, 'w') as f:
+        json.dump([{"text": "old style", "date": "2026-03-02", "time": "11:15 AM"}], f)
+    manager = ReminderManager(path, clock=clock, autostart=False)
+    clock.advance(hours=2, minutes=15)
+    assert manager.run_pending() == ["Reminder: old style"]
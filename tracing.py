@@ -0,0 +1,273 @@
+import os
+import sys
+import time
+import argparse
+import itertools
+import threading
+import collections
+
+# Stages of one request, from the end of an utterance to speech:
+#   asr       - final decode of the utterance (Vosk or recognize_google)
+#   route     - intent matching in CommandProcessor
+#   kb        - knowledge-base lookup, exact and near-duplicate
+#   web       - a web search that went to the network
+#   generate  - the language model's reply
+#   tts       - synthesis and playback of one utterance
+# plus first_audio / response, the end-to-end times the command pipeline
+# already measures.
+QUANTILES = (0.5, 0.95, 0.99)
+
+class _NullSpan:
+    # Handed out while tracing is off: no clock reads, no locking
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+_NULL_SPAN = _NullSpan()
+
+class _Span:
+    __slots__ = ("tracer", "name", "request", "start")
+
+    def __init__(self, tracer, name, request):
+        self.tracer = tracer
+        self.name = name
+        self.request = request
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.tracer._finish(self.name, self.request, self.start, time.perf_counter(), exc_type is not None)
+        return False
+
+class _Binding:
+    # Makes `request` the current request of this thread for a block
+    __slots__ = ("local", "request", "previous")
+
+    def __init__(self, local, request):
+        self.local = local
+        self.request = request
+
+    def __enter__(self):
+        self.previous = getattr(self.local, "request", None)
+        self.local.request = self.request
+        return self.request
+
+    def __exit__(self, exc_type, exc, tb):
+        self.local.request = self.previous
+        return False
+
+class RollingHistogram:
+    # Quantiles over the last `window` samples, plus lifetime count and sum
+    def __init__(self, window=1000):
+        self.samples = collections.deque(maxlen=window)
+        self.count = 0
+        self.total = 0.0
+
+    def add(self, seconds):
+        self.samples.append(seconds)
+        self.count += 1
+        self.total += seconds
+
+    def quantiles(self, qs=QUANTILES):
+        values = sorted(self.samples)
+        if not values:
+            return {q: None for q in qs}
+        return {q: values[min(len(values) - 1, int(q * len(values)))] for q in qs}
+
+class Tracer:
+    # Spans around each stage of a request, tagged with a request id. Work
+    # hops threads (recognizer, command workers, model and web threads, the
+    # speech thread), so the id is kept per thread and carried across hops
+    # with use() / wrap() or passed to span() explicitly. Durations feed one
+    # rolling histogram per stage; count() keeps event counters. Everything
+    # returns immediately while tracing is disabled.
+    def __init__(self, enabled=False, window=1000, keep_requests=64):
+        self.enabled = enabled
+        self.window = window
+        self.lock = threading.Lock()
+        self.local = threading.local()
+        self.ids = itertools.count(1)
+        self.histograms = {}
+        self.counters = collections.Counter()
+        # request id -> [(stage, seconds)] for the last few requests
+        self.requests = collections.OrderedDict()
+        self.keep_requests = keep_requests
+        self.exporter = None
+
+    def enable(self, enabled=True):
+        self.enabled = enabled
+
+    def reset(self):
+        with self.lock:
+            self.histograms = {}
+            self.counters = collections.Counter()
+            self.requests = collections.OrderedDict()
+
+    def new_request(self):
+        if not self.enabled:
+            return None
+        return next(self.ids)
+
+    def current(self):
+        return getattr(self.local, "request", None)
+
+    def use(self, request):
+        if not self.enabled:
+            return _NULL_SPAN
+        return _Binding(self.local, request)
+
+    def wrap(self, fn):
+        # fn, run under this thread's current request wherever it is called
+        if not self.enabled:
+            return fn
+        request = self.current()
+
+        def traced(*args, **kwargs):
+            with _Binding(self.local, request):
+                return fn(*args, **kwargs)
+        return traced
+
+    def span(self, name, request=None):
+        if not self.enabled:
+            return _NULL_SPAN
+        return _Span(self, name, request if request is not None else self.current())
+
+    def observe(self, name, seconds, request=None):
+        # A duration measured elsewhere, recorded like a finished span
+        if not self.enabled:
+            return
+        end = time.perf_counter()
+        self._finish(name, request if request is not None else self.current(), end - seconds, end, False)
+
+    def count(self, name, amount=1):
+        if not self.enabled:
+            return
+        with self.lock:
+            self.counters[name] += amount
+
+    def _finish(self, name, request, start, end, failed):
+        duration = end - start
+        with self.lock:
+            histogram = self.histograms.get(name)
+            if histogram is None:
+                histogram = self.histograms[name] = RollingHistogram(self.window)
+            histogram.add(duration)
+            if failed:
+                self.counters[name + "_errors"] += 1
+            if request is not None:
+                stages = self.requests.get(request)
+                if stages is None:
+                    stages = self.requests[request] = []
+                    while len(self.requests) > self.keep_requests:
+                        self.requests.popitem(last=False)
+                stages.append((name, duration))
+
+    def breakdown(self, request):
+        # "asr 412 ms, route 0.2 ms, ..." for one request, in the order the stages finished
+        with self.lock:
+            stages = list(self.requests.get(request, ()))
+        return ", ".join(f"{name} {seconds * 1000:.1f} ms" for name, seconds in stages)
+
+    def snapshot(self):
+        with self.lock:
+            stages = {name: (h.quantiles(), h.count, h.total) for name, h in self.histograms.items()}
+            counters = dict(self.counters)
+        return stages, counters
+
+    def prometheus(self, prefix="jarvis"):
+        # Prometheus text exposition format (version 0.0.4)
+        stages, counters = self.snapshot()
+        lines = [f"# HELP {prefix}_stage_seconds Latency of each request stage "
+                 f"(quantiles over the last {self.window} samples)",
+                 f"# TYPE {prefix}_stage_seconds summary"]
+        for name in sorted(stages):
+            quantiles, count, total = stages[name]
+            for q, value in quantiles.items():
+                if value is not None:
+                    lines.append(f'{prefix}_stage_seconds{{stage="{name}",quantile="{q}"}} {value:.6f}')
+            lines.append(f'{prefix}_stage_seconds_sum{{stage="{name}"}} {total:.6f}')
+            lines.append(f'{prefix}_stage_seconds_count{{stage="{name}"}} {count}')
+        for name in sorted(counters):
+            lines.append(f"# TYPE {prefix}_{name}_total counter")
+            lines.append(f"{prefix}_{name}_total {counters[name]}")
+        return "\n".join(lines) + "\n"
+
+    def summary(self):
+        # A few lines for the GUI overlay and the CLI
+        stages, counters = self.snapshot()
+        lines = []
+        for name in sorted(stages):
+            quantiles, count, _ = stages[name]
+            p50, p95, p99 = (quantiles[q] * 1000 for q in QUANTILES)
+            lines.append(f"{name:<11} p50 {p50:7.1f}  p95 {p95:7.1f}  p99 {p99:7.1f} ms  n={count}")
+        if counters:
+            lines.append("  ".join(f"{name}={value}" for name, value in sorted(counters.items())))
+        return "\n".join(lines) or "No traces yet"
+
+    def write(self, path):
+        # Atomic, so a scraper (e.g. node_exporter's textfile collector) never
+        # reads half a file
+        tmp = path + ".tmp"
+        with open(tmp, 'w', encoding='utf-8') as f:
+            f.write(self.prometheus())
+        os.replace(tmp, path)
+
+    def export_to(self, path, interval=10.0):
+        # Rewrites the metrics file every `interval` seconds on a daemon thread
+        if self.exporter is not None:
+            return self.exporter
+        self.exporter = _FileExporter(self, path, interval)
+        self.exporter.start()
+        return self.exporter
+
+class _FileExporter(threading.Thread):
+    def __init__(self, tracer, path, interval):
+        super().__init__(name="metrics-export", daemon=True)
+        self.tracer = tracer
+        self.path = path
+        self.interval = interval
+        self.stopped = threading.Event()
+
+    def run(self):
+        while not self.stopped.wait(self.interval):
+            self.flush()
+
+    def flush(self):
+        try:
+            self.tracer.write(self.path)
+        except OSError as e:
+            print(f"Could not write metrics to {self.path}: {e}", file=sys.stderr)
+
+    def stop(self):
+        self.stopped.set()
+        self.flush()
+
+# Shared instance, like the startup profiler; JARVIS_TRACE=1 or --trace turns it on
+tracer = Tracer(enabled=os.environ.get("JARVIS_TRACE", "") not in ("", "0"))
+
+def overhead(iterations=200000):
+    # Cost per traced stage in nanoseconds, disabled and enabled
+    results = {}
+    for enabled in (False, True):
+        probe = Tracer(enabled=enabled)
+        with probe.use(probe.new_request()):
+            started = time.perf_counter()
+            for _ in range(iterations):
+                with probe.span("stage"):
+                    pass
+            results[enabled] = (time.perf_counter() - started) / iterations * 1e9
+    return results
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Measure the cost of one traced stage")
+    parser.add_argument("--iterations", type=int, default=200000)
+    args = parser.parse_args(argv)
+    results = overhead(args.iterations)
+    print(f"span disabled: {results[False]:.0f} ns, enabled: {results[True]:.0f} ns")
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,202 @@
+import os
+import sys
+import wave
+import queue
+import shutil
+import hashlib
+import threading
+import subprocess
+from tracing import tracer
+
+class Utterance:
+    def __init__(self, text, on_start=None):
+        self.text = text
+        self.on_start = on_start
+        self.done = threading.Event()
+        # Spoken on the speech thread; traced under the request that queued it
+        self.trace = tracer.current()
+
+    def started(self):
+        if self.on_start:
+            self.on_start()
+            self.on_start = None
+
+    def wait(self, timeout=None):
+        return self.done.wait(timeout)
+
+class PhraseCache:
+    # Pre-rendered WAV files for fixed phrases, keyed by voice, rate and text
+    def __init__(self, cache_dir, phrases=()):
+        self.cache_dir = cache_dir
+        # Longest first so "Hello! How can I help you today?" wins over a shorter prefix
+        self.phrases = sorted(set(phrases), key=len, reverse=True)
+        self.voice_key = ""
+
+    def path_for(self, text):
+        digest = hashlib.sha1(f"{self.voice_key}|{text}".encode("utf-8")).hexdigest()
+        return os.path.join(self.cache_dir, digest + ".wav")
+
+    def missing(self):
+        return [p for p in self.phrases if not os.path.exists(self.path_for(p))]
+
+    def split(self, text):
+        # Returns (cached wav, remaining text to synthesize) or (None, text)
+        for phrase in self.phrases:
+            if text == phrase or (text.startswith(phrase) and not text[len(phrase)].isalnum()):
+                path = self.path_for(phrase)
+                if os.path.exists(path):
+                    return path, text[len(phrase):].strip()
+        return None, text
+
+class WavPlayer:
+    # Plays a cached file without going through the synthesizer; playback can be stopped
+    def __init__(self):
+        self.process = None
+        self.command = None
+        if sys.platform != "win32":
+            for player in ("paplay", "aplay", "afplay"):
+                path = shutil.which(player)
+                if path:
+                    self.command = [path, "-q"] if player == "aplay" else [path]
+                    break
+
+    @property
+    def available(self):
+        return sys.platform == "win32" or self.command is not None
+
+    def play(self, path, interrupted):
+        if sys.platform == "win32":
+            import winsound
+            with wave.open(path, 'rb') as wav:
+                duration = wav.getnframes() / float(wav.getframerate())
+            winsound.PlaySound(path, winsound.SND_FILENAME | winsound.SND_ASYNC)
+            if interrupted.wait(duration):
+                winsound.PlaySound(None, 0)
+            return
+        self.process = subprocess.Popen(self.command + [path],
+                                        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        while self.process.poll() is None:
+            if interrupted.wait(0.02):
+                self.process.terminate()
+                break
+        self.process = None
+
+class SpeechService:
+    # One long-lived pyttsx3 engine owned by a dedicated thread. Callers enqueue
+    # utterances and return immediately; interrupt() flushes the queue and cuts
+    # off whatever is playing. on_state(True/False) is called from the speech
+    # thread when it starts talking and once the queue has run dry.
+    def __init__(self, cache_dir="tts_cache", phrases=(), max_queue=16, rate=None, on_state=None):
+        self.queue = queue.Queue(maxsize=max_queue)
+        self.cache = PhraseCache(cache_dir, phrases)
+        self.rate = rate
+        self.on_state = on_state
+        self.speaking = False
+        self.player = WavPlayer()
+        self.interrupted = threading.Event()
+        self.engine = None
+        self.cache_pending = bool(self.cache.phrases)
+        self.thread = threading.Thread(target=self._run, name="speech", daemon=True)
+        self.running = False
+
+    def start(self):
+        self.running = True
+        self.thread.start()
+        return self
+
+    def say(self, text, on_start=None):
+        utterance = Utterance(text, on_start)
+        while True:
+            try:
+                self.queue.put_nowait(utterance)
+                break
+            except queue.Full:
+                # Drop the oldest queued utterance rather than block the caller
+                try:
+                    self.queue.get_nowait().done.set()
+                except queue.Empty:
+                    pass
+        return utterance
+
+    def interrupt(self):
+        self.interrupted.set()
+        self.flush()
+
+    def flush(self):
+        while True:
+            try:
+                self.queue.get_nowait().done.set()
+            except queue.Empty:
+                break
+
+    def stop(self):
+        self.running = False
+        self.interrupt()
+        self.queue.put(None)
+
+    def _run(self):
+        import pyttsx3
+        self.engine = pyttsx3.init()
+        if self.rate:
+            self.engine.setProperty('rate', self.rate)
+        self.engine.connect('started-word', self._on_word)
+        self.cache.voice_key = f"{self.engine.getProperty('voice')}|{self.engine.getProperty('rate')}"
+        self._render_cache()
+        while self.running:
+            utterance = self.queue.get()
+            if utterance is None:
+                break
+            self.interrupted.clear()
+            self._set_speaking(True)
+            try:
+                with tracer.span("tts", utterance.trace):
+                    self._speak(utterance)
+            except Exception as e:
+                print(f"Speech failed: {e}")
+            finally:
+                utterance.done.set()
+            if self.queue.empty():
+                self._set_speaking(False)
+            if self.cache_pending and self.queue.empty():
+                self._render_cache()
+
+    def _set_speaking(self, speaking):
+        if speaking != self.speaking:
+            self.speaking = speaking
+            if self.on_state:
+                self.on_state(speaking)
+
+    def _render_cache(self):
+        if not self.cache_pending or not self.player.available:
+            self.cache_pending = False
+            return
+        os.makedirs(self.cache.cache_dir, exist_ok=True)
+        for phrase in self.cache.missing():
+            if not self.queue.empty():
+                # Someone is waiting to hear something; render the rest later
+                break
+            path = self.cache.path_for(phrase)
+            partial = path[:-len(".wav")] + ".part.wav"
+            self.engine.save_to_file(phrase, partial)
+            self.engine.runAndWait()
+            if os.path.exists(partial):
+                os.replace(partial, path)
+        else:
+            self.cache_pending = False
+
+    def _speak(self, utterance):
+        text = utterance.text
+        if self.player.available:
+            cached, text = self.cache.split(text)
+            if cached:
+                utterance.started()
+                self.player.play(cached, self.interrupted)
+        if text and not self.interrupted.is_set():
+            utterance.started()
+            self.engine.say(text)
+            self.engine.runAndWait()
+
+    def _on_word(self, name, location, length):
+        # Runs on the speech thread inside runAndWait, where stop() is safe
+        if self.interrupted.is_set():
+            self.engine.stop()
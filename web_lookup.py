@@ -0,0 +1,199 @@
+import os
+import sys
+import time
+import argparse
+import threading
+import collections
+from urllib.parse import quote_plus
+from concurrent.futures import ThreadPoolExecutor
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from tracing import tracer
+
+# DuckDuckGo's HTML endpoint; JARVIS_SEARCH_URL points lookups somewhere else,
+# e.g. a StandInSearchServer in tests and benchmarks
+DEFAULT_SEARCH_URL = os.environ.get("JARVIS_SEARCH_URL", "https://html.duckduckgo.com/html/")
+# (connect, read) seconds: an offline or slow network fails fast instead of
+# holding up the local model
+DEFAULT_TIMEOUT = (1.0, 2.5)
+
+def parse_results(html, limit=3):
+    from bs4 import BeautifulSoup
+    soup = BeautifulSoup(html, 'html.parser')
+    results = []
+    for result in soup.find_all('div', class_='result'):
+        title = result.find('h2')
+        snippet = result.find('a', class_='result__snippet')
+        if title and snippet:
+            results.append({
+                'title': title.text.strip(),
+                'snippet': snippet.text.strip()
+            })
+            if len(results) == limit:
+                break
+    return results
+
+class _TTLCache:
+    # Small LRU with a per-entry expiry
+    def __init__(self, max_entries, ttl):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.entries = collections.OrderedDict()
+
+    def get(self, key, now):
+        entry = self.entries.get(key)
+        if entry is None:
+            return None
+        expires, value = entry
+        if now >= expires:
+            del self.entries[key]
+            return None
+        self.entries.move_to_end(key)
+        return entry
+
+    def put(self, key, value, now):
+        self.entries[key] = (now + self.ttl, value)
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+
+class WebLookup:
+    # Search results over one pooled requests.Session (kept-alive connections,
+    # no retries) with connect/read timeouts. Results are cached for cache_ttl
+    # seconds; queries that failed or found nothing are remembered for
+    # negative_ttl so a flaky network is not asked again on every turn.
+    def __init__(self, base_url=DEFAULT_SEARCH_URL, timeout=DEFAULT_TIMEOUT, cache_ttl=3600.0,
+                 negative_ttl=300.0, max_entries=512, workers=4):
+        self.base_url = base_url
+        self.timeout = timeout
+        self.cache = _TTLCache(max_entries, cache_ttl)
+        self.negative = _TTLCache(max_entries, negative_ttl)
+        self.lock = threading.Lock()
+        self._session = None
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="web-lookup")
+        self.stats = collections.Counter()
+
+    @property
+    def session(self):
+        # requests is imported on first use, like the rest of the network code
+        if self._session is None:
+            import requests
+            from requests.adapters import HTTPAdapter
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=4, pool_maxsize=8, max_retries=0)
+            session.mount("http://", adapter)
+            session.mount("https://", adapter)
+            session.headers['User-Agent'] = 'Mozilla/5.0'
+            self._session = session
+        return self._session
+
+    def search(self, query):
+        key = query.strip().lower()
+        now = time.monotonic()
+        with self.lock:
+            hit = self.cache.get(key, now)
+            if hit is not None:
+                self.stats["hits"] += 1
+                return hit[1]
+            if self.negative.get(key, now) is not None:
+                self.stats["negative_hits"] += 1
+                return []
+        outcome = "fetches"
+        try:
+            with tracer.span("web"):
+                response = self.session.get(f"{self.base_url}?q={quote_plus(query)}", timeout=self.timeout)
+                response.raise_for_status()
+                results = parse_results(response.text)
+        except Exception:
+            outcome = "errors"
+            results = []
+        with self.lock:
+            self.stats[outcome] += 1
+            if results:
+                self.cache.put(key, results, time.monotonic())
+            else:
+                self.negative.put(key, True, time.monotonic())
+        return results
+
+    def submit(self, query):
+        # Future for search(query); cancelling it only drops a lookup that has
+        # not started, a running one still finishes and fills the cache
+        return self.executor.submit(tracer.wrap(self.search), query)
+
+    def close(self):
+        self.executor.shutdown(wait=False)
+        if self._session is not None:
+            self._session.close()
+
+RESULT_HTML = '<div class="result"><h2>{title}</h2><a class="result__snippet">{snippet}</a></div>'
+
+class StandInSearchServer:
+    # Serves canned DuckDuckGo-style result pages on 127.0.0.1 so lookups can
+    # be tested and benchmarked offline. answers maps a query to its snippet;
+    # unknown queries get an empty page. delay simulates a slow network and
+    # status != 200 a failing one.
+    def __init__(self, answers=None, delay=0.0, status=200, port=0):
+        self.answers = answers or {}
+        self.delay = delay
+        self.status = status
+        self.requests = 0
+        stand_in = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, format, *args):
+                pass
+
+            def do_GET(self):
+                from urllib.parse import urlparse, parse_qs
+                stand_in.requests += 1
+                if stand_in.delay:
+                    time.sleep(stand_in.delay)
+                query = parse_qs(urlparse(self.path).query).get("q", [""])[0]
+                snippet = stand_in.answers.get(query)
+                body = RESULT_HTML.format(title=query, snippet=snippet) if snippet else ""
+                data = f"<html><body>{body}</body></html>".encode("utf-8")
+                self.send_response(stand_in.status)
+                self.send_header("Content-Type", "text/html")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                try:
+                    self.wfile.write(data)
+                except (BrokenPipeError, ConnectionResetError):
+                    # The client gave up first, as a timed-out lookup does
+                    pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", port), Handler)
+        self.server.daemon_threads = True
+        self.thread = None
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.server.server_address[1]}/html/"
+
+    def start(self):
+        self.thread = threading.Thread(target=self.server.serve_forever, name="stand-in-search", daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Look up a query the way the assistant does")
+    parser.add_argument("query", nargs="+")
+    parser.add_argument("--base-url", default=DEFAULT_SEARCH_URL)
+    parser.add_argument("--repeat", type=int, default=2, help="lookups to run (later ones hit the cache)")
+    args = parser.parse_args(argv)
+    lookup = WebLookup(args.base_url)
+    query = " ".join(args.query)
+    for i in range(args.repeat):
+        started = time.perf_counter()
+        results = lookup.search(query)
+        print(f"lookup {i + 1}: {len(results)} results in {(time.perf_counter() - started) * 1000:.1f} ms")
+    for r in results:
+        print(f"- {r['title']}: {r['snippet']}")
+    print(dict(lookup.stats))
+    lookup.close()
+
+if __name__ == '__main__':
+    sys.exit(main())